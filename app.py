@@ -1,17 +1,40 @@
 ### app.py
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from routers import auth
-from database.db import init_db
+from core.password_hasher import password_hasher
+from core.rate_limit import RateLimitMiddleware, gemini_overloaded_handler
+from core.request_metrics import MetricsMiddleware
+from database.db import close_db, init_db
+from services.gemini_client import GeminiOverloaded, init_gemini_client, close_gemini_client
+from services.gold_price import gold_price_service
 
 # from routers import ask
-from routers import chat, gold_purchase
+from routers import chat, gold_purchase, metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await gold_price_service.start()
+    yield
+    await gold_price_service.close()
+    close_gemini_client()
+    await close_db()
+    password_hasher.close()
 
 
 def create_app():
-    app = FastAPI(title="Simplify AI Assignment")
+    app = FastAPI(title="Simplify AI Assignment", lifespan=lifespan)
     init_db()
+    init_gemini_client()
     app.include_router(auth.router, prefix="/auth", tags=["auth"])
     app.include_router(chat.router, prefix="", tags=["Chats"])
     app.include_router(gold_purchase.router)
+    app.include_router(metrics.router, tags=["metrics"])
+    app.add_middleware(RateLimitMiddleware)
+    # Outermost, so rate-limited requests are timed and counted too
+    app.add_middleware(MetricsMiddleware)
+    app.add_exception_handler(GeminiOverloaded, gemini_overloaded_handler)
 
     return app
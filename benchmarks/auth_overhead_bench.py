@@ -0,0 +1,71 @@
+# benchmarks/auth_overhead_bench.py
+"""
+Per-request cost of resolving the bearer token: full verification (HS256
+signature + ``User`` lookup) vs a hit in the verified-token cache.
+
+    python -m benchmarks.auth_overhead_bench --requests 5000
+
+Runs ``get_current_user`` directly against a temporary SQLite database, so the
+numbers exclude HTTP parsing and only measure the dependency itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.auth import VerifiedTokenCache, get_current_user
+import core.auth as auth
+from core.security import create_access_token
+from database.db import create_async_db_engine
+from database.models import User
+
+
+async def _time(engine, credentials, requests):
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        start = time.perf_counter()
+        for _ in range(requests):
+            await get_current_user(credentials, session)
+        return round((time.perf_counter() - start) / requests * 1e6, 1)
+
+
+async def run(requests):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_db_engine(f"sqlite:///{directory}/auth.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            user = User(name="bench", email="bench@example.com", password_hash="x")
+            session.add(user)
+            await session.commit()
+        token = create_access_token({"sub": str(user.id), "email": user.email})
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        auth.token_cache = VerifiedTokenCache(max_entries=0)  # every call verifies
+        uncached = await _time(engine, credentials, requests)
+        auth.token_cache = VerifiedTokenCache()
+        cached = await _time(engine, credentials, requests)
+        await engine.dispose()
+    return {
+        "requests": requests,
+        "uncached_us": uncached,
+        "cached_us": cached,
+        "speedup": round(uncached / max(cached, 1e-9), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
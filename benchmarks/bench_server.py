@@ -0,0 +1,50 @@
+# benchmarks/bench_server.py
+"""
+The API as served in production, with Gemini replaced by ``FakeGeminiModel``.
+
+    python -m benchmarks.bench_server --port 8090 --gemini-latency lognormal:800:0.5
+
+Started by ``benchmarks.load_test`` in its own process (so the load driver
+does not share its GIL), with ``DATABASE_URL``, ``GOLD_API_URL`` and the
+other settings passed in the environment.
+"""
+import argparse
+import json
+import logging
+
+import uvicorn
+
+from benchmarks.fakes import FakeGeminiModel, Latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--gemini-latency", default="lognormal:800:0.5")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--gemini-responses", help="JSON file: template name -> canned response object"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    responses = None
+    if args.gemini_responses:
+        with open(args.gemini_responses, encoding="utf-8") as f:
+            responses = json.load(f)
+
+    from app import create_app
+    from services.gemini_client import init_gemini_client
+
+    app = create_app()
+    init_gemini_client(
+        model=FakeGeminiModel(
+            Latency.parse(args.gemini_latency), responses, args.gemini_error_rate
+        )
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
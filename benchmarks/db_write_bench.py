@@ -0,0 +1,112 @@
+# benchmarks/db_write_bench.py
+"""
+Write throughput of the gold order steps: the original bare SQLite engine vs
+the tuned one from ``database.db.create_db_engine``.
+
+    python -m benchmarks.db_write_bench --writers 8 --orders 100
+
+Each writer runs ``orders`` KYC -> quantity -> payment -> vault sequences
+through the real (async) step functions, all writers concurrently on one
+event loop, on a fresh database file per engine.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.auth import CurrentUser
+from database.db import create_async_db_engine
+from routers.gold_purchase import (
+    KYCRequest,
+    PaymentRequest,
+    QuantityRequest,
+    VaultRequest,
+    kyc_step,
+    payment_step,
+    quantity_step,
+    vault_step,
+)
+from services.gold_price import PriceSnapshot
+
+
+class _FixedPrice:
+    async def get_price(self) -> float:
+        return 6500.0
+
+
+def _engines(directory):
+    return {
+        "baseline": create_async_engine(
+            f"sqlite+aiosqlite:///{directory}/baseline.db",
+            connect_args={"check_same_thread": False},
+        ),
+        "tuned": create_async_db_engine(f"sqlite:///{directory}/tuned.db"),
+    }
+
+
+async def _writer(engine, user_id, orders):
+    done = locked = 0
+    user = CurrentUser(id=user_id, email=f"bench{user_id}@example.com")
+    for _ in range(orders):
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await kyc_step(KYCRequest(kyc_details="bench"), session, user)
+                quote = await quantity_step(
+                    QuantityRequest(grams=1.0), session, PriceSnapshot(_FixedPrice()), user
+                )
+                amount = round(1.0 * quote["price_per_gram"], 2)
+                await payment_step(PaymentRequest(payment_method="UPI", amount=amount), session, user)
+                await vault_step(VaultRequest(confirm=True), session, user)
+            done += 1
+        except OperationalError:
+            locked += 1  # "database is locked"
+    return done, locked
+
+
+async def run(writers, orders):
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, engine in _engines(directory).items():
+            async with engine.begin() as conn:
+                await conn.run_sync(SQLModel.metadata.create_all)
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(_writer(engine, uid, orders) for uid in range(1, writers + 1))
+            )
+            elapsed = time.perf_counter() - start
+            done = sum(d for d, _ in results)
+            writes = done * 4
+            async with engine.connect() as conn:
+                journal_mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+            report[name] = {
+                "orders": done,
+                "locked_errors": sum(l for _, l in results),
+                "seconds": round(elapsed, 3),
+                "writes_per_second": round(writes / elapsed, 1),
+                "journal_mode": journal_mode,
+            }
+            await engine.dispose()
+    report["speedup"] = round(
+        report["tuned"]["writes_per_second"] / max(report["baseline"]["writes_per_second"], 1e-9), 2
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=100, help="order sequences per writer")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    print(json.dumps(asyncio.run(run(args.writers, args.orders)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for the two upstreams, so load tests run offline:
+
+* ``FakeGeminiModel`` replaces the SDK model inside ``GeminiClient``
+  (``generate_content_async``, streaming included) and answers each prompt
+  template with canned JSON after a sampled latency.
+* ``GoldApiStub`` is a threaded HTTP server answering like GoldAPI.io.
+
+Latencies are given as specs: ``fixed:800``, ``uniform:200-1200`` or
+``lognormal:800:0.5`` (median ms, sigma), parsed by ``Latency.parse``.
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, NamedTuple, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from core.prompts import CHATBOT_TEMPLATE, FUSED_TEMPLATE, INTENT_TEMPLATE
+
+
+class Latency(NamedTuple):
+    kind: str
+    a: float
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, rest = spec.partition(":")
+        if kind == "fixed":
+            return cls(kind, float(rest))
+        if kind == "uniform":
+            low, _, high = rest.partition("-")
+            return cls(kind, float(low), float(high))
+        if kind == "lognormal":
+            median, _, sigma = rest.partition(":")
+            return cls(kind, float(median), float(sigma or 0.5))
+        raise ValueError(f"unknown latency spec {spec!r}")
+
+    def sample(self) -> float:
+        """One latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.a
+        elif self.kind == "uniform":
+            ms = random.uniform(self.a, self.b)
+        else:
+            ms = random.lognormvariate(math.log(max(self.a, 1e-3)), self.b)
+        return ms / 1000
+
+
+# ---------------- Fake Gemini ----------------
+# Canned answers per prompt template; "{query}" is filled in per call.
+DEFAULT_RESPONSES = {
+    "intent": {
+        "query": "{query}",
+        "source": "gemini",
+        "intent": "gold_related",
+        "category": "gold",
+        "answer": "Gold is a long-term store of value; digital gold lets you start small.",
+        "meta": {"confidence": 0.9},
+    },
+    "chatbot": {
+        "query": "{query}",
+        "source": "gemini",
+        "stage": "exploration",
+        "answer": "You can buy digital gold from 1 gram. Would you like to start?",
+        "buy_link": "",
+        "meta": {"confidence": 0.9},
+    },
+    "fused": {
+        "query": "{query}",
+        "source": "gemini",
+        "intent": "gold_related",
+        "category": "gold",
+        "stage": "exploration",
+        "answer": "Gold is a long-term store of value; digital gold lets you start small.",
+        "buy_link": "",
+        "meta": {"confidence": 0.9},
+    },
+}
+_TEMPLATES = (
+    (FUSED_TEMPLATE.prefix, "fused"),
+    (CHATBOT_TEMPLATE.prefix, "chatbot"),
+    (INTENT_TEMPLATE.prefix, "intent"),
+)
+_QUERY_START, _QUERY_END = 'User Query: "', '"\nResponse:'
+# Share of the latency spent before the first streamed chunk
+_FIRST_CHUNK_SHARE = 0.3
+_STREAM_CHUNKS = 8
+
+
+class _Usage(NamedTuple):
+    prompt_token_count: int
+    candidates_token_count: int
+
+
+class _Response:
+    def __init__(self, text: str, usage: Optional[_Usage] = None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _StreamedResponse(_Response):
+    """Like the SDK's: ``text`` is the first chunk; iteration yields all chunks."""
+
+    def __init__(self, chunks, delays, usage):
+        super().__init__(chunks[0])
+        self._chunks = chunks
+        self._delays = delays
+        self._usage = usage
+
+    async def __aiter__(self):
+        for i, (chunk, delay) in enumerate(zip(self._chunks, self._delays)):
+            await asyncio.sleep(delay)
+            last = i == len(self._chunks) - 1
+            yield _Response(chunk, self._usage if last else None)
+
+
+class FakeGeminiModel:
+    """
+    Stands in for ``genai.GenerativeModel``. The template is recognised from
+    the prompt prefix; ``error_rate`` of the calls fail with a retryable 503.
+    """
+
+    def __init__(
+        self,
+        latency: Latency = Latency("lognormal", 800, 0.5),
+        responses: Optional[Dict[str, dict]] = None,
+        error_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.responses = {**DEFAULT_RESPONSES, **(responses or {})}
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def _answer(self, contents: str) -> str:
+        name = next((n for prefix, n in _TEMPLATES if contents.startswith(prefix)), "intent")
+        start = contents.rfind(_QUERY_START)
+        query = ""
+        if start >= 0:
+            query = contents[start + len(_QUERY_START):].removesuffix(_QUERY_END)
+        body = json.dumps(self.responses[name], ensure_ascii=False)
+        return body.replace("{query}", json.dumps(query, ensure_ascii=False)[1:-1])
+
+    async def generate_content_async(self, contents, stream: bool = False, **options):
+        self.calls += 1
+        text = self._answer(contents)
+        usage = _Usage(len(contents) // 4, len(text) // 4)
+        total = self.latency.sample()
+        if random.random() < self.error_rate:
+            await asyncio.sleep(total * _FIRST_CHUNK_SHARE)
+            raise google_exceptions.ServiceUnavailable("fake Gemini: 503")
+        if not stream:
+            await asyncio.sleep(total)
+            return _Response(text, usage)
+
+        await asyncio.sleep(total * _FIRST_CHUNK_SHARE)
+        size = max(1, math.ceil(len(text) / _STREAM_CHUNKS))
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        gap = total * (1 - _FIRST_CHUNK_SHARE) / max(1, len(chunks) - 1)
+        return _StreamedResponse(chunks, [0.0] + [gap] * (len(chunks) - 1), usage)
+
+
+# ---------------- GoldAPI stub ----------------
+class GoldApiStub:
+    """
+    GoldAPI.io on localhost: GET anything -> ``{"price_gram_24k": price}``.
+    Also the ``gold_api_stub`` test fixture; ``status`` simulates outages.
+    """
+
+    def __init__(self, price: float = 6512.4, latency: Latency = Latency("fixed", 50)):
+        self.price = price
+        self.latency = latency
+        self.status = 200
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                time.sleep(stub.latency.sample())
+                body = json.dumps({"price_gram_24k": stub.price}).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/XAU/INR"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,82 @@
+# benchmarks/intent_classifier_bench.py
+"""
+Accuracy and latency of the local intent fast path against Gemini labels.
+
+    python -m benchmarks.intent_classifier_bench
+    python -m benchmarks.intent_classifier_bench --gemini   # also time live Gemini calls
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+from core.intent_classifier import INTENT_FASTPATH_THRESHOLD, default_pre_classifier
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "intent_eval.jsonl")
+
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+    return {"p50": pct(50), "p95": pct(95), "p99": pct(99), "mean": round(statistics.mean(ordered), 4)}
+
+
+def run_local(rows, threshold):
+    classifier = default_pre_classifier()
+    classifier.threshold = threshold
+    latencies, covered, covered_correct, correct = [], 0, 0, 0
+    sources = Counter()
+    for row in rows:
+        start = time.perf_counter()
+        prediction = classifier.predict(row["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hit = prediction is not None and prediction.intent == row["intent"]
+        correct += hit
+        if prediction is not None and prediction.confidence >= threshold:
+            covered += 1
+            covered_correct += hit
+            sources[prediction.source] += 1
+    return {
+        "threshold": threshold,
+        "samples": len(rows),
+        "top1_accuracy": round(correct / len(rows), 4),
+        "fast_path_coverage": round(covered / len(rows), 4),
+        "fast_path_accuracy": round(covered_correct / covered, 4) if covered else None,
+        "fast_path_sources": dict(sources),
+        "latency_ms": _percentiles(latencies),
+    }
+
+
+async def run_gemini(rows):
+    from core.prompts import build_gemini_prompt
+    from services.gemini_client import call_gemini_api
+
+    latencies, agree = [], 0
+    for row in rows:
+        start = time.perf_counter()
+        response = await call_gemini_api(build_gemini_prompt(row["query"]))
+        latencies.append((time.perf_counter() - start) * 1000)
+        agree += response.get("intent") == row["intent"]
+    return {"agreement": round(agree / len(rows), 4), "latency_ms": _percentiles(latencies)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--threshold", type=float, default=INTENT_FASTPATH_THRESHOLD)
+    parser.add_argument("--gemini", action="store_true", help="needs GOOGLE_API_KEY")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    report = {"local": run_local(rows, args.threshold)}
+    if args.gemini:
+        report["gemini"] = asyncio.run(run_gemini(rows))
+    print(json.dumps(report, indent=2))
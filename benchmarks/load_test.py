@@ -0,0 +1,314 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test of /auth, /chat and the /api/gold purchase flow, offline.
+
+    python -m benchmarks.load_test --users 50 --iterations 2 --output results.json
+    python -m benchmarks.load_test --users 50 --iterations 2 --compare results.json
+
+Starts ``benchmarks.bench_server`` (the real app, Gemini faked) in a
+subprocess on a throwaway SQLite database, with GoldAPI served by a local
+stub. ``users`` simulated users run concurrently: each signs up once, then
+per iteration logs in, sends ``turns`` chat queries and buys gold through
+kyc -> quantity -> payment -> vault -> receipt. The report gives throughput,
+status codes and latency percentiles per endpoint, plus the server's own
+span summaries from /metrics. With ``--compare`` the run is checked against
+an earlier report and exits 1 if any endpoint's p95 or throughput regressed
+by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.fakes import GoldApiStub, Latency
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERIES = (
+    "What is the gold price today?",
+    "Tell me about investing in gold",
+    "Is gold better than mutual funds for the long term?",
+    "How do I start a SIP?",
+    "I want to buy 2 grams of gold",
+    "What's the weather like?",
+)
+PASSWORD = "bench-password"
+GRAMS = 1.0  # bought per purchase
+_SPAN = re.compile(r'^span_duration_seconds\{span="([^"]+)",quantile="([^"]+)"\} (\S+)$')
+_SAMPLE = re.compile(r'^(chat_llm_calls_per_turn|llm_tokens_total)(\{[^}]*\})? (\S+)$')
+
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+    return {
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "mean": round(statistics.mean(ordered), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(status, ms)]
+
+    async def request(self, client, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0  # connection error or client timeout
+        self.samples[endpoint].append((status, (time.perf_counter() - start) * 1000))
+        return response if status and status < 400 else None
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            statuses = defaultdict(int)
+            for status, _ in samples:
+                statuses[str(status)] += 1
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for status, _ in samples if not status or status >= 400),
+                "statuses": dict(statuses),
+                "rps": round(len(samples) / elapsed, 2),
+                "latency_ms": _percentiles([ms for _, ms in samples]),
+            }
+        return endpoints
+
+
+async def _user(client, recorder, index, iterations, turns):
+    email = f"bench-{index}-{uuid.uuid4().hex[:8]}@example.com"
+    signup = await recorder.request(
+        client, "POST /auth/signup", "POST", "/auth/signup",
+        json={"name": f"Bench {index}", "email": email, "password": PASSWORD},
+    )
+    if signup is None:
+        return 0
+    purchases = 0
+    for iteration in range(iterations):
+        login = await recorder.request(
+            client, "POST /auth/login", "POST", "/auth/login",
+            json={"email": email, "password": PASSWORD},
+        )
+        if login is None:
+            continue
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        for turn in range(turns):
+            query = QUERIES[(index + iteration * turns + turn) % len(QUERIES)]
+            await recorder.request(
+                client, "POST /chat", "POST", "/chat", params={"query": query}, headers=headers
+            )
+        purchases += await _purchase(client, recorder, headers)
+    return purchases
+
+
+async def _purchase(client, recorder, headers):
+    async def step(name, body):
+        return await recorder.request(
+            client, f"POST /api/gold/{name}", "POST", f"/api/gold/{name}", json=body,
+            headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+        )
+
+    if await step("kyc", {"kyc_details": "bench"}) is None:
+        return 0
+    quantity = await step("quantity", {"grams": GRAMS})
+    if quantity is None:
+        return 0
+    # Must match the locked quote exactly
+    amount = round(GRAMS * quantity.json()["price_per_gram"], 2)
+    if await step("payment", {"payment_method": "UPI", "amount": amount}) is None:
+        return 0
+    if await step("vault", {"confirm": True}) is None:
+        return 0
+    return int(await step("receipt", {}) is not None)
+
+
+def _server_metrics(text):
+    """Span quantiles (ms) and a few counters from the server's /metrics."""
+    spans, counters = defaultdict(dict), {}
+    for line in text.splitlines():
+        match = _SPAN.match(line)
+        if match:
+            span, quantile, value = match.groups()
+            spans[span][f"p{round(float(quantile) * 100)}"] = round(float(value) * 1000, 2)
+            continue
+        match = _SAMPLE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            counters[f"{name}{labels or ''}"] = float(value)
+    return {"spans_ms": dict(sorted(spans.items())), "counters": counters}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(url, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"bench server exited with code {process.returncode}")
+            try:
+                if (await client.get(f"{url}/metrics")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("bench server did not start in time")
+
+
+async def _drive(url, args):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+
+        async def user(index):
+            await asyncio.sleep(args.ramp_up * index / max(1, args.users))
+            return await _user(client, recorder, index, args.iterations, args.turns)
+
+        start = time.perf_counter()
+        purchases = await asyncio.gather(*(user(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+        server = _server_metrics((await client.get("/metrics")).text)
+
+    endpoints = recorder.report(elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "rps": round(total / elapsed, 2),
+        "purchases_completed": sum(purchases),
+        "endpoints": endpoints,
+        "server": server,
+    }
+
+
+def run(args):
+    stub = GoldApiStub(latency=Latency.parse(args.gold_latency))
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, (REPO_ROOT, os.environ.get("PYTHONPATH")))),
+            "DATABASE_URL": f"sqlite:///{directory}/bench.db",
+            "GOLD_API_URL": stub.url,
+            "GOLD_API_KEY": "bench",
+            "RATE_LIMIT_ENABLED": "1" if args.rate_limit else "0",
+        }
+        if args.bcrypt_rounds:
+            env["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+        command = [
+            sys.executable, "-m", "benchmarks.bench_server",
+            "--port", str(port),
+            "--gemini-latency", args.gemini_latency,
+            "--gemini-error-rate", str(args.gemini_error_rate),
+        ]
+        if args.gemini_responses:
+            command += ["--gemini-responses", os.path.abspath(args.gemini_responses)]
+        # cwd is the temp dir, so relative database paths (history, rate limits) land there
+        process = subprocess.Popen(command, cwd=directory, env=env)
+        try:
+            asyncio.run(_wait_ready(url, process))
+            result = asyncio.run(_drive(url, args))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            stub.close()
+
+    result["gold_api_requests"] = stub.requests
+    result["config"] = {
+        "users": args.users,
+        "iterations": args.iterations,
+        "turns": args.turns,
+        "ramp_up": args.ramp_up,
+        "gemini_latency": args.gemini_latency,
+        "gemini_error_rate": args.gemini_error_rate,
+        "gold_latency": args.gold_latency,
+        "bcrypt_rounds": args.bcrypt_rounds,
+        "rate_limit": args.rate_limit,
+    }
+    return result
+
+
+def compare(current, baseline, tolerance):
+    """Per-endpoint p95 and throughput changes vs ``baseline``, and the regressions."""
+    changes, regressions = {}, []
+    for endpoint, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            continue
+        p95 = now["latency_ms"]["p95"] / max(before["latency_ms"]["p95"], 1e-9) - 1
+        rps = now["rps"] / max(before["rps"], 1e-9) - 1
+        changes[endpoint] = {"p95_change": round(p95, 4), "rps_change": round(rps, 4)}
+        if p95 > tolerance:
+            regressions.append(f"{endpoint}: p95 {p95:+.1%}")
+        if rps < -tolerance:
+            regressions.append(f"{endpoint}: throughput {rps:+.1%}")
+    return changes, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument(
+        "--iterations", type=int, default=2, help="login + chat + purchase rounds per user"
+    )
+    parser.add_argument("--turns", type=int, default=3, help="chat queries per iteration")
+    parser.add_argument(
+        "--ramp-up", type=float, default=0.0, help="seconds to stagger user starts over"
+    )
+    parser.add_argument("--gemini-latency", default="lognormal:800:0.5")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-responses", help="JSON file: template name -> canned response")
+    parser.add_argument("--gold-latency", default="fixed:50")
+    parser.add_argument("--bcrypt-rounds", type=int, help="default: the server's BCRYPT_ROUNDS")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting on")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to check for regressions")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed p95 / throughput change"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    report = run(args)
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"], regressions = compare(report, baseline, args.tolerance)
+        report["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
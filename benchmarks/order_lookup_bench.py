@@ -0,0 +1,89 @@
+# benchmarks/order_lookup_bench.py
+"""
+Open-purchase lookup latency (the query every purchase step and chat turn in
+a purchase runs) as the purchase table grows, with and without the
+(user_id, id) composite index.
+
+    python -m benchmarks.order_lookup_bench --sizes 10000 100000 1000000
+
+Rows are spread over ``rows / 10`` users; each size is timed on the same data
+before and after ``migrate_db`` creates the index.
+"""
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+
+from sqlmodel import Session, SQLModel
+
+from database.db import create_db_engine, migrate_db
+from routers.gold_purchase import LATEST_PURCHASE_QUERY
+
+STEPS = ("OFFERED", "KYC", "QUANTITY", "PAYMENT", "VAULT_CONFIRM", "POST_BUY")
+
+
+def _drop_indexes(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_purchasesession_user_id_id")
+
+
+def _fill(engine, rows, start):
+    users = max(1, rows // 10)
+    now = "2025-01-01 00:00:00"
+    batch = [
+        (random.randint(1, users), STEPS[i % len(STEPS)], now, now)
+        for i in range(start, rows)
+    ]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO purchasesession (user_id, step, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            batch,
+        )
+    return users
+
+
+def _time_lookups(engine, users, lookups):
+    with Session(engine) as session:
+        start = time.perf_counter()
+        for _ in range(lookups):
+            session.exec(
+                LATEST_PURCHASE_QUERY, params={"user_id": random.randint(1, users)}
+            ).first()
+        return round((time.perf_counter() - start) / lookups * 1e6, 1)
+
+
+def run(sizes, lookups):
+    random.seed(7)
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/orders.db")
+        SQLModel.metadata.create_all(engine)
+        _drop_indexes(engine)
+
+        filled = 0
+        for rows in sorted(sizes):
+            users = _fill(engine, rows, filled)
+            filled = rows
+            no_index = _time_lookups(engine, users, max(10, lookups // 10))
+            migrate_db(engine)
+            indexed = _time_lookups(engine, users, lookups)
+            _drop_indexes(engine)
+            report[rows] = {"no_index_us": no_index, "indexed_us": indexed}
+        engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    print(json.dumps(run(args.sizes, args.lookups), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/prompt_build_bench.py
+"""
+Prompt build time and tokens sent per request.
+
+    python -m benchmarks.prompt_build_bench
+    python -m benchmarks.prompt_build_bench --compare /tmp/old_prompts.py
+
+``--compare`` loads another prompts module (e.g. ``git show <rev>:core/prompts.py``)
+and times its builders on the same inputs.
+"""
+import argparse
+import importlib.util
+import json
+import time
+
+from core import prompts
+from core.history_window import estimate_tokens
+
+HISTORY = [
+    {"role": "user", "content": "I want to buy gold"},
+    {"role": "assistant", "content": "Great! Step 1: complete KYC here."},
+    {"role": "user", "content": "done"},
+    {"role": "assistant", "content": "Step 2: choose quantity in grams or rupees."},
+    {"role": "user", "content": "2 grams please"},
+    {"role": "assistant", "content": "Step 3: pay via UPI to confirm."},
+]
+QUERY = "OK, payment done"
+
+
+def _time_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+
+def _builders(module):
+    return {
+        "intent": lambda: module.build_gemini_prompt(QUERY),
+        "chatbot": lambda: module.build_chatbot_prompt(QUERY, HISTORY),
+        "fused": lambda: module.build_fused_prompt(QUERY, HISTORY),
+    }
+
+
+def run(iterations, compare_path=None):
+    templates = {
+        "intent": prompts.INTENT_TEMPLATE,
+        "chatbot": prompts.CHATBOT_TEMPLATE,
+        "fused": prompts.FUSED_TEMPLATE,
+    }
+    baseline = None
+    if compare_path:
+        spec = importlib.util.spec_from_file_location("baseline_prompts", compare_path)
+        baseline = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(baseline)
+
+    report = {}
+    for name, build in _builders(prompts).items():
+        prompt = build()
+        prefix = templates[name].prefix
+        entry = {
+            "build_us": _time_us(build, iterations),
+            "tokens_full_prompt": estimate_tokens(prompt),
+            "tokens_static_prefix": estimate_tokens(prefix),
+            "tokens_sent_with_context_cache": estimate_tokens(prompt[len(prefix):]),
+        }
+        if baseline is not None and hasattr(baseline, f"build_{name}_prompt".replace("intent", "gemini")):
+            entry["baseline_build_us"] = _time_us(_builders(baseline)[name], iterations)
+        report[name] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--compare", help="path to another prompts.py to time")
+    args = parser.parse_args()
+    print(json.dumps(run(args.iterations, args.compare), indent=2))
@@ -0,0 +1,123 @@
+# core/auth.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core import metrics
+from core.security import decode_access_token
+from database.db import get_session
+from database.models import User
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# A cached token is re-verified after this long even if ``exp`` is later, so a
+# deleted user stops being accepted within this window.
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    email: str
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of verified tokens: sha256(token) -> (user, expiry). An entry
+    never outlives the token's ``exp`` (nor ``ttl_seconds``), so expiry is
+    still enforced without decoding the token again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = AUTH_TOKEN_CACHE_SIZE,
+        ttl_seconds: float = AUTH_TOKEN_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[CurrentUser, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, token: str, user: CurrentUser, exp: float):
+        if self.max_entries <= 0:
+            return
+        key = self._key(token)
+        expires_at = min(exp, time.time() + self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = VerifiedTokenCache()
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+    session: AsyncSession = Depends(get_session),
+) -> CurrentUser:
+    """
+    FastAPI dependency: the user named by the request's ``Authorization:
+    Bearer`` access token. Verified tokens are cached, so repeat requests in
+    a session skip both the signature check and the ``User`` lookup.
+    """
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    token = credentials.credentials
+
+    user = token_cache.get(token)
+    if user is not None:
+        metrics.incr("auth_token_cache_total", outcome="hit")
+        return user
+    metrics.incr("auth_token_cache_total", outcome="miss")
+
+    try:
+        claims = decode_access_token(token)
+        user_id = int(claims["sub"])
+        exp = float(claims["exp"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _unauthorized("Invalid or expired token")
+
+    row = await session.get(User, user_id)
+    if row is None:
+        raise _unauthorized("User no longer exists")
+    user = CurrentUser(id=row.id, email=row.email)
+    token_cache.put(token, user, exp)
+    return user
@@ -1,11 +1,47 @@
 # core/chat_flow.py
+import asyncio
 import logging
-from core.prompts import build_gemini_prompt, build_chatbot_prompt
-from services.gemini_client import call_gemini_api
-from core.chat_manager import add_to_history, get_history
-from services.gold_price import get_live_gold_price
-from sqlmodel import Session
+import os
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from core import metrics, purchase_fsm, structured_output
+from core.json_stream import JsonFieldStream
+from core.prompts import (
+    CHATBOT_TEMPLATE,
+    FUSED_TEMPLATE,
+    INTENT_TEMPLATE,
+    PromptTemplate,
+    build_gemini_prompt,
+    build_chatbot_prompt,
+    build_fused_prompt,
+)
+from services.gemini_client import (
+    GeminiOverloaded,
+    call_gemini_api,
+    degraded_response,
+    fallback_response,
+    last_good_answers,
+    stream_gemini_api,
+)
+from core.chat_manager import add_to_history_async, get_history_async
+from core.history_window import conversation_summaries, history_window
+from core.intent_cache import intent_cache, normalize_query
+from core.intent_classifier import build_local_response, default_pre_classifier
+from services.gold_price import PriceSnapshot
+from fastapi import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.auth import CurrentUser
+from database.db import async_session_maker
 from routers.gold_purchase import (
+    KYCRequest,
+    QuantityRequest,
+    PaymentRequest,
+    VaultRequest,
+    ReceiptRequest,
+    get_open_purchase,
     kyc_step,
     quantity_step,
     payment_step,
@@ -13,96 +49,637 @@ from routers.gold_purchase import (
     receipt_step,
 )
 
+# Local intent stage run before Gemini; set to None to always ask Gemini.
+pre_classifier = default_pre_classifier()
+
+# "two_call" (intent prompt, then chatbot prompt) or "fused" (one combined call).
+CHAT_PROMPT_MODE = os.getenv("CHAT_PROMPT_MODE", "two_call")
+# A/B split: share of users (0.0-1.0, stable per user_id) put on the fused path.
+CHAT_FUSED_SHARE = float(os.getenv("CHAT_FUSED_SHARE", "0"))
+
+TWO_CALL, FUSED = "two_call", "fused"
+
+# When to send the chatbot prompt alongside the intent prompt:
+# "off", "in_journey" (recent assistant turns reached a buy stage) or "always".
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "in_journey")
+SPECULATIVE_LOOKBACK_TURNS = int(os.getenv("SPECULATIVE_LOOKBACK_TURNS", "4"))
+JOURNEY_STAGES = {"ready_to_buy", "buy_step_1", "buy_step_2", "buy_step_3", "buy_step_4"}
+
+# Batch turns processed at once; the Gemini client's own limit still applies.
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "16"))
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+
+
+def prompt_mode_for(user_id: str) -> str:
+    if CHAT_PROMPT_MODE == FUSED:
+        return FUSED
+    if CHAT_FUSED_SHARE > 0 and zlib.crc32(str(user_id).encode()) % 10000 < (
+        CHAT_FUSED_SHARE * 10000
+    ):
+        return FUSED
+    return TWO_CALL
+
+
+def should_speculate(history: list) -> bool:
+    """Is the chatbot prompt likely to be needed for this turn?"""
+    if SPECULATIVE_MODE == "always":
+        return True
+    if SPECULATIVE_MODE != "in_journey":
+        return False
+    recent = history[-SPECULATIVE_LOOKBACK_TURNS:]
+    return any(turn.get("stage") in JOURNEY_STAGES for turn in recent)
+
+
+# LLM calls of the current turn. A list, so that tasks started by the turn
+# (which run in a copy of its context) add to the same count.
+_turn_llm_calls: ContextVar[Optional[List[int]]] = ContextVar("turn_llm_calls", default=None)
+
+
+def _count_llm_call(mode: str):
+    metrics.incr("chat_llm_calls_total", mode=mode)
+    calls = _turn_llm_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+@contextmanager
+def _measure_turn():
+    """Time a whole turn and record how many LLM calls it made."""
+    calls = [0]
+    _turn_llm_calls.set(calls)
+    try:
+        with metrics.span("span_duration_seconds", span="turn"):
+            yield
+    finally:
+        metrics.observe("chat_llm_calls_per_turn", calls[0])
+
+
+async def _call_llm(prompt: str, mode: str, template: PromptTemplate) -> dict:
+    _count_llm_call(mode)
+    return await call_gemini_api(prompt, cache_prefix=template.prefix, schema=template.name)
+
+
+async def _apply_purchase_stage(
+    result: dict,
+    stage: str,
+    user_id: str,
+    session: AsyncSession,
+    price: PriceSnapshot,
+    mode: str,
+):
+    """Simulate the gold purchase API call for ``stage`` and annotate ``result``."""
+    if not stage.startswith("buy_step_"):
+        return
+    user = CurrentUser(id=int(user_id), email="")
+    try:
+        with metrics.span("span_duration_seconds", span="purchase_step"):
+            if stage == "buy_step_1":
+                resp = await kyc_step(KYCRequest(kyc_details="Dummy KYC"), session, user)
+                suffix = f" ✅ KYC done. Next: {resp['next_endpoint']}"
+            elif stage == "buy_step_2":
+                # Priced from this request's snapshot; the quote is locked for payment
+                grams, amount = 1.0, None  # example default, could be dynamic
+                resp = await quantity_step(
+                    QuantityRequest(grams=grams, amount=amount), session, price, user
+                )
+                suffix = f" ✅ Quantity set. Next: {resp['next_endpoint']}"
+            elif stage == "buy_step_3":
+                # Pay the amount quoted at the quantity step
+                purchase = await get_open_purchase(session, user.id)
+                amount = purchase.amount if purchase and purchase.amount else 5000
+                resp = await payment_step(
+                    PaymentRequest(payment_method="UPI", amount=amount), session, user
+                )
+                suffix = f" ✅ Payment confirmed. Next: {resp['next_endpoint']}"
+            elif stage == "buy_step_4":
+                resp = await vault_step(VaultRequest(confirm=True), session, user)
+                suffix = f" ✅ Vault confirmed. Next: {resp['next_endpoint']}"
+            elif stage == "buy_step_5":
+                resp = await receipt_step(ReceiptRequest(), session, user)
+                suffix = " ✅ Purchase complete. Receipt generated."
+                resp = {**resp, "next_endpoint": ""}
+            else:
+                return
+    except HTTPException:
+        # Refused by the purchase API, e.g. a stage the order log disallows
+        metrics.incr("chat_purchase_steps_total", mode=mode, stage=stage, outcome="rejected")
+        raise
+    metrics.incr("chat_purchase_steps_total", mode=mode, stage=stage, outcome="ok")
+    result["answer"] = result.get("answer", "") + suffix
+    result["buy_link"] = resp["next_endpoint"]
+
+
+def _purchase_user(user_id: str) -> Optional[int]:
+    """Account id owning purchases, or None for ids that are not accounts."""
+    return int(user_id) if str(user_id).isdigit() else None
+
+
+async def _confirmation_turn(user_id: str, user_query: str, session: AsyncSession):
+    account = _purchase_user(user_id)
+    if account is None:
+        return None
+    return await purchase_fsm.confirmation_turn(session, account, user_query)
 
-async def process_user_query(user_id: str, user_query: str, session: Session) -> dict:
+
+def history_key_for(user_id: str, conversation: Optional[str] = None) -> str:
+    """History is kept per user, or per (user, conversation) when one is named."""
+    return f"{user_id}:{conversation}" if conversation else str(user_id)
+
+
+async def _record_user_turn(user_id: str, user_query: str):
+    """Save the user turn; return ``(history, running summary)``."""
+    with metrics.span("span_duration_seconds", span="history"):
+        await add_to_history_async(user_id, "user", user_query)
+        history = await get_history_async(user_id)
+
+        # Turns that do not fit the prompt's history window feed the running
+        # summary; the prompt builders pack the window themselves
+        dropped, _ = history_window.split(history)
+        summary = (
+            conversation_summaries.update(user_id, dropped)
+            if conversation_summaries is not None
+            else ""
+        )
+    return history, summary
+
+
+async def _fetch_live_price(user_query: str, price: PriceSnapshot) -> Optional[float]:
+    # 🔹 Safe gold price fetch
+    if "gold" not in user_query.lower():
+        return None
+    try:
+        with metrics.span("span_duration_seconds", span="gold_price"):
+            return await price.get()
+    except Exception as e:
+        logging.error(f"[ERROR] Failed to fetch gold price: {e}")
+        return None
+
+
+def _local_intent(user_query: str, live_price: Optional[float]) -> Optional[dict]:
+    """Intent response from the cache or the local fast path, if either knows."""
+    intent_response = intent_cache.get(user_query, live_price)
+    prediction = None
+    if intent_response is None and pre_classifier is not None:
+        prediction = pre_classifier.classify(user_query)
+    if prediction is not None:
+        intent_response = build_local_response(user_query, prediction, live_price)
+    return intent_response
+
+
+async def _finish_turn(
+    result: dict,
+    intent: str,
+    user_id: str,
+    history_key: str,
+    session: AsyncSession,
+    price: PriceSnapshot,
+    mode: str,
+    batch: bool = False,
+) -> dict:
+    # Step 3: Simulate gold purchase API calls based on stage; the purchase
+    # state machine decides which step a buy stage actually runs
+    if intent == "ready_to_invest":
+        stage = result.get("stage") or "exploration"
+        account = None if batch else _purchase_user(user_id)
+        if account is not None:
+            stage = await purchase_fsm.resolve_stage(session, account, stage, mode)
+            result["stage"] = stage
+            if stage == "ready_to_buy":
+                await purchase_fsm.offer(session, account)
+        metrics.incr("chat_stages_total", mode=mode, stage=stage)
+        try:
+            if account is not None:
+                await _apply_purchase_stage(result, stage, user_id, session, price, mode)
+        except HTTPException as e:
+            # A refused step is part of the conversation, not a failed request
+            await session.rollback()
+            result["answer"] = f"{result.get('answer', '')} ⚠️ {e.detail}".strip()
+            result["buy_link"] = ""
+
+    # Save assistant response (with the purchase stage, used for speculation)
+    if history_key is not None:
+        stage = result.get("stage") if intent == "ready_to_invest" else None
+        await add_to_history_async(history_key, "assistant", result.get("answer", ""), stage)
+
+    return result
+
+
+async def process_user_query(
+    user_id: str,
+    user_query: str,
+    session: AsyncSession,
+    price: Optional[PriceSnapshot] = None,
+    conversation: Optional[str] = None,
+    batch: bool = False,
+) -> dict:
     """
     Process a user query:
-    1. Detect intent using Gemini.
+    0. A confirmation ("ok", "done") inside an open purchase advances the
+       purchase state machine directly, with no Gemini call.
+    1. Detect intent (intent cache, then local fast-path classifier, then Gemini).
     2. If intent is 'ready_to_invest', use stepwise chatbot prompt with embedded endpoints.
     3. Save the responses to conversation history.
+
+    ``price`` is the request's gold price snapshot; it is resolved at most once
+    and shared with the purchase steps. ``conversation`` keeps a separate
+    history for the same user; purchases always belong to ``user_id``.
+
+    ``batch`` turns never touch purchases (no confirmation shortcut, no
+    purchase steps), and without a ``conversation`` they neither read nor
+    write history, so each is answered on its own.
     """
+    with _measure_turn():
+        return await _process_turn(user_id, user_query, session, price, conversation, batch)
+
+
+async def _process_turn(
+    user_id: str,
+    user_query: str,
+    session: AsyncSession,
+    price: Optional[PriceSnapshot],
+    conversation: Optional[str],
+    batch: bool = False,
+) -> dict:
+    price = price or PriceSnapshot()
+    history_key = history_key_for(user_id, conversation)
+    if batch and not conversation:
+        history_key = None
 
     logging.info(f"[DEBUG] Processing query for user {user_id}: {user_query}")
 
-    # Add user query to history
-    add_to_history(user_id, "user", user_query)
-    history = get_history(user_id)
+    if history_key is None:
+        history, summary = [], ""
+    else:
+        history, summary = await _record_user_turn(history_key, user_query)
 
-    # Helper: format conversation history into string
-    def format_history(history: list) -> str:
-        chat_text = ""
-        for turn in history[-5:]:  # last 10 exchanges for context
-            role = "User" if turn["role"] == "user" else "Assistant"
-            chat_text += f"{role}: {turn['content']}\n"
-        return chat_text
+    confirmed = None if batch else await _confirmation_turn(user_id, user_query, session)
+    if confirmed is not None:
+        metrics.incr("chat_turns_total", mode="fsm")
+        return await _finish_turn(
+            confirmed, "ready_to_invest", user_id, history_key, session, price, "fsm"
+        )
 
-    chat_text = format_history(history)
+    # Quoted by cached and local answers; the LLM prompts do not carry it
+    live_price = await _fetch_live_price(user_query, price)
 
-    # 🔹 Safe gold price fetch
-    live_price = None
-    if "gold" in user_query.lower():
+    mode = prompt_mode_for(user_id)
+    metrics.incr("chat_turns_total", mode=mode)
+
+    # Step 1: Intent detection (cache, then local fast path, then Gemini)
+    intent_response = _local_intent(user_query, live_price)
+
+    if intent_response is None and mode == FUSED:
+        # Intent, stage and answer from a single round trip
+        fused = await _call_llm(
+            build_fused_prompt(user_query, history, summary), mode, FUSED_TEMPLATE
+        )
         try:
-            live_price = await get_live_gold_price()
-        except Exception as e:
-            logging.error(f"[ERROR] Failed to fetch gold price: {e}")
-            live_price = None
+            result = structured_output.validate(fused, "fused")
+        except ValueError as e:
+            logging.warning(f"[WARN] Invalid fused response: {e}")
+            metrics.incr("chat_fused_invalid_total", mode=mode)
+            result = fused
+        intent = result.get("intent", "irrelevant")
+        logging.info(f"[DEBUG] Detected intent (fused): {intent}")
+    else:
+        chatbot_task = None
+        if intent_response is None:
+            intent_prompt = build_gemini_prompt(user_query)
+            if should_speculate(history):
+                # In a purchase journey: start the chatbot prompt now so a
+                # ready_to_invest turn costs one round trip instead of two.
+                chatbot_task = asyncio.create_task(
+                    _call_llm(
+                        build_chatbot_prompt(user_query, history, summary),
+                        mode,
+                        CHATBOT_TEMPLATE,
+                    )
+                )
+            try:
+                intent_response = await _call_llm(
+                    intent_prompt, mode, INTENT_TEMPLATE
+                )
+            except BaseException:
+                if chatbot_task is not None:
+                    chatbot_task.cancel()
+                raise
+            intent_cache.put(user_query, intent_response)
+        intent = intent_response.get("intent", "irrelevant")
+        logging.info(f"[DEBUG] Detected intent: {intent}")
+
+        if chatbot_task is not None and intent != "ready_to_invest":
+            outcome = "wasted_completed" if chatbot_task.done() else "wasted_cancelled"
+            chatbot_task.cancel()
+            if chatbot_task.done() and not chatbot_task.cancelled():
+                chatbot_task.exception()  # e.g. shed by admission control; not needed
+            metrics.incr("chat_speculative_total", outcome=outcome)
+            chatbot_task = None
 
-        if live_price:
-            chat_text += f"\n[System]: The current live gold price is {live_price} INR per gram. Use this for all calculations and advice.\n"
+        # Step 2: If ready_to_invest, switch to chatbot prompt
+        if intent == "ready_to_invest":
+            if chatbot_task is not None:
+                metrics.incr("chat_speculative_total", outcome="used")
+                result = await chatbot_task
+            else:
+                chatbot_prompt = build_chatbot_prompt(user_query, history, summary)
+                result = await _call_llm(chatbot_prompt, mode, CHATBOT_TEMPLATE)
         else:
-            chat_text += "\n[System]: Gold price is currently unavailable. Do not guess, just explain general strategies.\n"
+            # For other intents, just return Gemini’s answer
+            result = intent_response
 
-    # Step 1: Intent detection using Gemini
-    intent_prompt = build_gemini_prompt(user_query)
-    intent_response = await call_gemini_api(intent_prompt)
-    intent = intent_response.get("intent", "irrelevant")
-    logging.info(f"[DEBUG] Detected intent: {intent}")
+    return await _finish_turn(
+        result, intent, user_id, history_key, session, price, mode, batch
+    )
 
-    # Step 2: If ready_to_invest, switch to chatbot prompt
-    if intent == "ready_to_invest":
-        chatbot_prompt = build_chatbot_prompt(user_query, history)
-        result = await call_gemini_api(chatbot_prompt)
-        stage = result.get("stage", "exploration")
-
-        # Step 3: Simulate gold purchase API calls based on stage
-        if stage == "buy_step_1":
-            resp = kyc_step(
-                {"user_id": int(user_id), "kyc_details": "Dummy KYC"}, session
-            )
-            result["answer"] += f" ✅ KYC done. Next: {resp['next_endpoint']}"
-            result["buy_link"] = resp["next_endpoint"]
-
-        elif stage == "buy_step_2":
-            # Use live gold price if available
-            grams, amount = 1.0, None  # example default, could be dynamic
-            resp = quantity_step(
-                {"user_id": int(user_id), "grams": grams, "amount": amount}, session
-            )
-            result["answer"] += f" ✅ Quantity set. Next: {resp['next_endpoint']}"
-            result["buy_link"] = resp["next_endpoint"]
 
-        elif stage == "buy_step_3":
-            resp = payment_step(
-                {"user_id": int(user_id), "payment_method": "UPI", "amount": 5000},
-                session,
-            )
-            result["answer"] += f" ✅ Payment confirmed. Next: {resp['next_endpoint']}"
-            result["buy_link"] = resp["next_endpoint"]
+class BatchTurn(NamedTuple):
+    user_id: str
+    query: str
+    conversation: Optional[str] = None
 
-        elif stage == "buy_step_4":
-            resp = vault_step({"user_id": int(user_id), "confirm": True}, session)
-            result["answer"] += f" ✅ Vault confirmed. Next: {resp['next_endpoint']}"
-            result["buy_link"] = resp["next_endpoint"]
 
-        elif stage == "buy_step_5":
-            resp = receipt_step({"user_id": int(user_id)}, session)
-            result["answer"] += f" ✅ Purchase complete. Receipt generated."
-            result["buy_link"] = ""
+async def process_batch(
+    items: Iterable[Tuple],
+    price: Optional[PriceSnapshot] = None,
+    concurrency: int = CHAT_BATCH_CONCURRENCY,
+    session_factory=async_session_maker,
+) -> List[dict]:
+    """
+    Run ``process_user_query`` for many ``(user_id, query[, conversation])``
+    items (see ``BatchTurn``) as batch turns: no purchase side effects, and
+    items without a conversation are independent of any history.
+
+    Up to ``concurrency`` turns run at once; turns sharing a conversation run
+    in item order so each sees the previous one. Identical queries (after
+    normalization) of one user are answered once, but only among items
+    without a conversation: in a conversation a repeated "ok" is a new turn. Results come back in item order as ``{"ok": True, "response": ...}``
+    or ``{"ok": False, "error": ..., "status_code"?: ...}``; one failing item
+    never fails the batch. All items share one gold price snapshot; each
+    gets its own session from ``session_factory``, since a session cannot
+    be used by concurrent turns.
+    """
+    price = price or PriceSnapshot()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    history_locks: Dict[str, asyncio.Lock] = {}
+    runs: Dict[Tuple[str, str], Tuple[int, asyncio.Future]] = {}
+
+    async def run(turn: BatchTurn, history_key: str) -> dict:
+        # Locks are FIFO, so turns on one conversation start in item order;
+        # turns without one share no history and need no lock
+        lock = nullcontext()
+        if turn.conversation:
+            lock = history_locks.setdefault(history_key, asyncio.Lock())
+        async with lock:
+            async with semaphore, session_factory() as session:
+                try:
+                    response = await process_user_query(
+                        turn.user_id, turn.query, session, price, turn.conversation, batch=True
+                    )
+                except HTTPException as e:
+                    outcome = {"ok": False, "error": e.detail, "status_code": e.status_code}
+                except GeminiOverloaded as e:
+                    outcome = {"ok": False, "error": str(e), "status_code": 429}
+                except Exception as e:
+                    logging.exception(f"[ERROR] Batch item failed for user {turn.user_id}")
+                    outcome = {"ok": False, "error": str(e)}
+                else:
+                    metrics.incr("chat_batch_items_total", outcome="ok")
+                    return {"ok": True, "response": response}
+                metrics.incr("chat_batch_items_total", outcome="error")
+                return outcome
+
+    futures, duplicates = [], {}
+    for index, item in enumerate(items):
+        turn = BatchTurn(*item)
+        turn = turn._replace(user_id=str(turn.user_id))
+        history_key = history_key_for(turn.user_id, turn.conversation)
+        key = None if turn.conversation else (history_key, normalize_query(turn.query))
+        if key is not None and key in runs:
+            first, future = runs[key]
+            duplicates[index] = first
+            metrics.incr("chat_batch_items_total", outcome="duplicate")
+        else:
+            future = asyncio.ensure_future(run(turn, history_key))
+            if key is not None:
+                runs[key] = (index, future)
+        futures.append(future)
+
+    results = await asyncio.gather(*futures)
+    return [
+        {**result, "duplicate_of": duplicates[i]} if i in duplicates else result
+        for i, result in enumerate(results)
+    ]
+
 
+class _StreamedCall:
+    """
+    One streamed LLM call. ``chunks()`` yields the newly generated ``answer``
+    text per received chunk ("" when a chunk carried none); ``result()`` parses
+    the whole response once the stream is over.
+    """
+
+    def __init__(self, prompt: str, mode: str, template: PromptTemplate):
+        _count_llm_call(mode)
+        self.prompt = prompt
+        self.parser = JsonFieldStream()
+        self.failed = False
+        self.schema = template.name
+        self._source = stream_gemini_api(
+            prompt, cache_prefix=template.prefix, schema=template.name
+        )
+        self._chunks = None
+
+    def chunks(self) -> AsyncIterator[str]:
+        self._chunks = self._read()
+        return self._chunks
+
+    async def _read(self) -> AsyncIterator[str]:
+        try:
+            async for text in self._source:
+                yield "".join(d for key, d in self.parser.feed(text) if key == "answer")
+        except GeminiOverloaded:
+            raise
+        except Exception:
+            # Open circuit, timeout or SDK error: the user sees the same
+            # degraded answer as on the non-streaming path
+            logging.warning("Gemini stream failed", exc_info=True)
+            self.failed = True
+
+    def result(self) -> dict:
+        if self.parser.done:
+            try:
+                parsed = structured_output.parse(self.parser.text, self.schema)
+            except ValueError:
+                pass  # fall back to the fields read incrementally
+            else:
+                last_good_answers.put(self.prompt, parsed)
+                return parsed
+        if self.failed and not self.parser.partial("answer"):
+            return degraded_response(self.prompt)
+        # Cut short or malformed: keep whatever fields arrived
+        result = fallback_response("")
+        result.update(self.parser.fields)
+        result["answer"] = self.parser.partial("answer")
+        return result
+
+    async def close(self):
+        if self._chunks is not None:
+            await self._chunks.aclose()
+        await self._source.aclose()
+
+
+async def stream_user_query(
+    user_id: str,
+    user_query: str,
+    session: AsyncSession,
+    price: Optional[PriceSnapshot] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming variant of ``process_user_query``.
+
+    Yields ``("token", {"text": ...})`` events as the answer is generated, then
+    one ``("final", result)`` event carrying the structured fields (intent,
+    stage, buy_link) after the purchase-step side effects have run, plus
+    ``ttft_ms``. An LLM call shed by admission control ends the stream with
+    an ``("error", ...)`` event instead, since the status line has already
+    been sent.
+    """
+    try:
+        with _measure_turn():
+            async for event in _stream_turn(user_id, user_query, session, price):
+                yield event
+    except GeminiOverloaded as e:
+        yield "error", {"status_code": 429, "detail": str(e), "retry_after": e.retry_after}
+
+
+async def _stream_turn(
+    user_id: str,
+    user_query: str,
+    session: AsyncSession,
+    price: Optional[PriceSnapshot] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
+    price = price or PriceSnapshot()
+    started = time.perf_counter()
+    ttft_ms = None
+    streamed = []
+
+    def token(text: str) -> Tuple[str, dict]:
+        nonlocal ttft_ms
+        if ttft_ms is None:
+            ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+        streamed.append(text)
+        return "token", {"text": text}
+
+    logging.info(f"[DEBUG] Streaming query for user {user_id}: {user_query}")
+    history, summary = await _record_user_turn(user_id, user_query)
+    live_price = await _fetch_live_price(user_query, price)
+    result = await _confirmation_turn(user_id, user_query, session)
+    mode = "fsm" if result is not None else prompt_mode_for(user_id)
+    metrics.incr("chat_turns_total", mode=mode)
+
+    intent_response = _local_intent(user_query, live_price) if result is None else None
+    if result is not None:
+        intent = "ready_to_invest"
+    elif intent_response is None and mode == FUSED:
+        call = _StreamedCall(
+            build_fused_prompt(user_query, history, summary), mode, FUSED_TEMPLATE
+        )
+        try:
+            async for text in call.chunks():
+                if text:
+                    yield token(text)
+        finally:
+            await call.close()
+        result = call.result()
+        try:
+            result = structured_output.validate(result, "fused")
+        except ValueError as e:
+            logging.warning(f"[WARN] Invalid fused response: {e}")
+            metrics.incr("chat_fused_invalid_total", mode=mode)
+        intent = result.get("intent", "irrelevant")
     else:
-        # For other intents, just return Gemini’s answer
-        result = intent_response
-        # Save assistant response
-    add_to_history(user_id, "assistant", result.get("answer", ""))
+        if intent_response is None:
+            # The prompt puts intent before answer (streams carry no schema
+            # that could reorder them): hold answer text until the intent is
+            # known, and drop this stream for ready_to_invest.
+            call = _StreamedCall(build_gemini_prompt(user_query), mode, INTENT_TEMPLATE)
+            held, switched = [], False
+            try:
+                async for text in call.chunks():
+                    intent = call.parser.fields.get("intent")
+                    if intent is None:
+                        held.append(text)
+                        continue
+                    if intent == "ready_to_invest":
+                        switched = True
+                        break
+                    text = "".join(held) + text
+                    held = []
+                    if text:
+                        yield token(text)
+            finally:
+                await call.close()
+            if switched:
+                intent_response = {"intent": "ready_to_invest"}
+            else:
+                intent_response = call.result()
+                if not call.failed:
+                    intent_cache.put(user_query, intent_response)
+        intent = intent_response.get("intent", "irrelevant")
 
-    return result
+        if intent == "ready_to_invest":
+            call = _StreamedCall(
+                build_chatbot_prompt(user_query, history, summary),
+                mode,
+                CHATBOT_TEMPLATE,
+            )
+            try:
+                async for text in call.chunks():
+                    if text:
+                        yield token(text)
+            finally:
+                await call.close()
+            result = call.result()
+        else:
+            result = intent_response
+    logging.info(f"[DEBUG] Detected intent (stream): {intent}")
+
+    result = await _finish_turn(result, intent, user_id, user_id, session, price, mode)
+
+    # Whatever was not streamed yet: local answers, fallbacks, step confirmations
+    answer, sent = result.get("answer", ""), "".join(streamed)
+    if answer.startswith(sent) and len(answer) > len(sent):
+        yield token(answer[len(sent):])
+    yield "final", {**result, "ttft_ms": ttft_ms}
+
+
+def prompt_ab_summary() -> dict:
+    """
+    Per-mode turn, LLM-call and purchase-stage-correction counts for
+    comparing fused vs two-call.
+    """
+    summary = {}
+    for mode in (TWO_CALL, FUSED):
+        turns = metrics.get_counter("chat_turns_total", mode=mode)
+        calls = metrics.get_counter("chat_llm_calls_total", mode=mode)
+        corrected = metrics.get_counter("chat_fsm_total", mode=mode, outcome="stage_corrected")
+        summary[mode] = {
+            "turns": turns,
+            "llm_calls": calls,
+            "llm_calls_per_turn": round(calls / turns, 3) if turns else 0.0,
+            "stages_corrected": corrected,
+        }
+    used = metrics.get_counter("chat_speculative_total", outcome="used")
+    wasted = metrics.get_counter(
+        "chat_speculative_total", outcome="wasted_cancelled"
+    ) + metrics.get_counter("chat_speculative_total", outcome="wasted_completed")
+    summary["speculative"] = {
+        "mode": SPECULATIVE_MODE,
+        "used": used,
+        "wasted": wasted,
+        "waste_rate": round(wasted / (used + wasted), 3) if used + wasted else 0.0,
+    }
+    summary["counters"] = {
+        k: v for k, v in metrics.counters_snapshot().items() if k.startswith("chat_")
+    }
+    return summary
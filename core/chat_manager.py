@@ -1,19 +1,226 @@
 # core/chat_manager.py
-from typing import Dict, List
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
 
-# Simple in-memory storage: { user_id: [ {"role": "user/assistant", "content": "..."} ] }
-chat_histories: Dict[str, List[Dict[str, str]]] = {}
+from core.history_window import conversation_summaries
 
+logger = logging.getLogger(__name__)
 
-def get_history(user_id: str) -> List[Dict[str, str]]:
-    return chat_histories.get(user_id, [])
+# "memory" (per-worker ring buffers) or "sqlite" (shared by all workers on a host)
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "memory")
+# Turns kept per user; prompts only read the tail of this.
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "20"))
+HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", "10000"))
+HISTORY_MAX_BYTES = int(os.getenv("HISTORY_MAX_BYTES", str(64 * 1024 * 1024)))
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "./chat_history.db")
 
+# Rough per-turn overhead of the dict/deque slot, on top of the text itself.
+_TURN_OVERHEAD_BYTES = 200
 
-def add_to_history(user_id: str, role: str, content: str):
-    if user_id not in chat_histories:
-        chat_histories[user_id] = []
-    chat_histories[user_id].append({"role": role, "content": content})
+
+class HistoryStore(ABC):
+    """Conversation history: [ {"role": "user/assistant", "content": "...", "stage"?: "..."} ]"""
+
+    # Whether calls do I/O; async callers then run them in a thread
+    blocking = False
+
+    @abstractmethod
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Most recent ``limit`` turns (all kept turns if None), oldest first."""
+
+    @abstractmethod
+    def add(self, user_id: str, role: str, content: str, stage: Optional[str] = None):
+        pass
+
+    @abstractmethod
+    def clear(self, user_id: str):
+        pass
+
+
+def _make_turn(role: str, content: str, stage: Optional[str]) -> Dict[str, str]:
+    turn = {"role": role, "content": content}
+    if stage:
+        turn["stage"] = stage  # purchase stage reached on an assistant turn
+    return turn
+
+
+def _turn_size(turn: Dict[str, str]) -> int:
+    return len(turn["content"]) + _TURN_OVERHEAD_BYTES
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """
+    Fixed-size ring buffer per user, with least-recently-active users evicted
+    once ``max_users`` or the approximate ``max_bytes`` budget is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = HISTORY_MAX_TURNS,
+        max_users: int = HISTORY_MAX_USERS,
+        max_bytes: int = HISTORY_MAX_BYTES,
+    ):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._histories: "OrderedDict[str, Deque[Dict[str, str]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted_users = 0
+
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        with self._lock:
+            turns = self._histories.get(user_id)
+            if turns is None:
+                return []
+            self._histories.move_to_end(user_id)
+            history = list(turns)
+        return history[-limit:] if limit else history
+
+    def add(self, user_id: str, role: str, content: str, stage: Optional[str] = None):
+        turn = _make_turn(role, content, stage)
+        with self._lock:
+            turns = self._histories.get(user_id)
+            if turns is None:
+                turns = self._histories[user_id] = deque(maxlen=self.max_turns)
+            self._histories.move_to_end(user_id)
+            if len(turns) == turns.maxlen:
+                self._bytes -= _turn_size(turns[0])  # about to fall off the ring
+            turns.append(turn)
+            self._bytes += _turn_size(turn)
+
+            while len(self._histories) > 1 and (
+                len(self._histories) > self.max_users or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._histories.popitem(last=False)
+                self._bytes -= sum(_turn_size(t) for t in evicted)
+                self.evicted_users += 1
+
+    def clear(self, user_id: str):
+        with self._lock:
+            turns = self._histories.pop(user_id, None)
+            if turns:
+                self._bytes -= sum(_turn_size(t) for t in turns)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "users": len(self._histories),
+            "approx_bytes": self._bytes,
+            "evicted_users": self.evicted_users,
+        }
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Append-only SQLite log shared by every worker on the host. Reads are an
+    indexed tail scan on (user_id, id), so memory stays flat however many
+    users there are.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = HISTORY_DB_PATH, max_turns: int = HISTORY_MAX_TURNS):
+        self.path = path
+        self.max_turns = max_turns
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, stage TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chat_history_user_id_id "
+            "ON chat_history (user_id, id)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside the writer.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        rows = self._conn().execute(
+            "SELECT role, content, stage FROM chat_history "
+            "WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit or self.max_turns),
+        ).fetchall()
+        return [_make_turn(role, content, stage) for role, content, stage in reversed(rows)]
+
+    def add(self, user_id: str, role: str, content: str, stage: Optional[str] = None):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO chat_history (user_id, role, content, stage, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, role, content, stage, time.time()),
+        )
+        conn.commit()
+
+    def clear(self, user_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+        conn.commit()
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "path": self.path}
+
+
+def create_history_store(backend: str = HISTORY_BACKEND) -> HistoryStore:
+    if backend == "sqlite":
+        logger.info(f"Using SQLite chat history at {HISTORY_DB_PATH}")
+        return SQLiteHistoryStore()
+    return InMemoryHistoryStore()
+
+
+history_store: HistoryStore = create_history_store()
+
+
+def get_history(user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    return history_store.get_history(user_id, limit)
+
+
+def add_to_history(user_id: str, role: str, content: str, stage: Optional[str] = None):
+    history_store.add(user_id, role, content, stage)
 
 
 def clear_history(user_id: str):
-    chat_histories[user_id] = []
+    history_store.clear(user_id)
+    if conversation_summaries is not None:
+        conversation_summaries.clear(user_id)
+
+
+# Async variants for request handlers: a blocking store (SQLite) is run in a
+# thread so a busy database file never stalls the event loop.
+async def _run(function, *args):
+    if history_store.blocking:
+        return await asyncio.to_thread(function, *args)
+    return function(*args)
+
+
+async def get_history_async(user_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    return await _run(get_history, user_id, limit)
+
+
+async def add_to_history_async(
+    user_id: str, role: str, content: str, stage: Optional[str] = None
+):
+    await _run(add_to_history, user_id, role, content, stage)
+
+
+async def clear_history_async(user_id: str):
+    await _run(clear_history, user_id)
@@ -0,0 +1,135 @@
+# core/history_window.py
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Prompt budget for the conversation history block, in estimated tokens.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+# A single turn is truncated to this many tokens before packing.
+HISTORY_TURN_MAX_TOKENS = int(os.getenv("HISTORY_TURN_MAX_TOKENS", "200"))
+HISTORY_WINDOW_MAX_TURNS = int(os.getenv("HISTORY_WINDOW_MAX_TURNS", "5"))
+# Running summary of turns that fell out of the window.
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "1") == "1"
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "120"))
+HISTORY_SUMMARY_MAX_USERS = int(os.getenv("HISTORY_SUMMARY_MAX_USERS", "10000"))
+
+_CHARS_PER_TOKEN = 4
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token for English)."""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[: max(0, max_chars - 1)].rstrip() + "…"
+
+
+class HistoryWindow:
+    """
+    Packs the most recent turns into a token budget: newest first, each turn
+    capped at ``turn_max_tokens``, stopping once the budget is spent.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = HISTORY_TOKEN_BUDGET,
+        turn_max_tokens: int = HISTORY_TURN_MAX_TOKENS,
+        max_turns: int = HISTORY_WINDOW_MAX_TURNS,
+    ):
+        self.budget_tokens = budget_tokens
+        self.turn_max_tokens = turn_max_tokens
+        self.max_turns = max_turns
+
+    def split(self, history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """Return ``(older turns left out, packed window)``, both oldest first."""
+        packed: List[Dict[str, str]] = []
+        remaining = self.budget_tokens
+        cut = len(history)
+        for turn in reversed(history):
+            if len(packed) == self.max_turns or remaining <= 0:
+                break
+            content = truncate_to_tokens(turn["content"], min(self.turn_max_tokens, remaining))
+            remaining -= estimate_tokens(content)
+            packed.append({**turn, "content": content})
+            cut -= 1
+        packed.reverse()
+        return history[:cut], packed
+
+    def pack(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return self.split(history)[1]
+
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(text.strip(), 1)[0]
+
+
+class ConversationSummaries:
+    """
+    Per-user running summary of turns that fell out of the window.
+
+    Extractive and incremental: each newly dropped turn contributes its first
+    sentence (truncated), and the oldest lines are discarded once the summary
+    exceeds ``max_tokens``. Idle users are evicted LRU.
+
+    Kept in this worker's memory only. Another worker, or this one after a
+    restart, rebuilds a summary from the older turns still in the history
+    store, so lines for turns the store has already dropped
+    (``HISTORY_MAX_TURNS``) are lost.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = HISTORY_SUMMARY_TOKENS,
+        max_users: int = HISTORY_SUMMARY_MAX_USERS,
+        line_max_tokens: int = 30,
+    ):
+        self.max_tokens = max_tokens
+        self.max_users = max_users
+        self.line_max_tokens = line_max_tokens
+        # user_id -> (summary lines, fingerprints of turns already summarized)
+        self._users: "OrderedDict[str, Tuple[Deque[str], Deque[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, user_id: str, dropped: List[Dict[str, str]]) -> str:
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                state = self._users[user_id] = (deque(), deque(maxlen=256))
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+            lines, seen = state
+            for turn in dropped:
+                fingerprint = hash((turn["role"], turn["content"]))
+                if fingerprint in seen:
+                    continue
+                seen.append(fingerprint)
+                role = "User" if turn["role"] == "user" else "Bot"
+                sentence = truncate_to_tokens(_first_sentence(turn["content"]), self.line_max_tokens)
+                lines.append(f"{role}: {sentence}")
+
+            while lines and sum(estimate_tokens(line) + 1 for line in lines) > self.max_tokens:
+                lines.popleft()
+            return " | ".join(lines)
+
+    def get(self, user_id: str) -> str:
+        state = self._users.get(user_id)
+        return " | ".join(state[0]) if state else ""
+
+    def clear(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+history_window = HistoryWindow()
+conversation_summaries: Optional[ConversationSummaries] = (
+    ConversationSummaries() if HISTORY_SUMMARY_ENABLED else None
+)
@@ -0,0 +1,240 @@
+# core/idempotency.py
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Header, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, delete
+
+from core import metrics
+from database.db import async_session_maker
+from database.models import IdempotencyRecord
+
+# A stored response is replayed for retries with the same key for this long.
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A claimed key whose request never finished (worker died) is free again after this.
+IDEMPOTENCY_PENDING_SECONDS = float(os.getenv("IDEMPOTENCY_PENDING_SECONDS", "60"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+_Key = Tuple[int, str]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite drops the offset of stored datetimes
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class IdempotencyStore:
+    """
+    Responses of completed requests keyed by ``(user_id, Idempotency-Key)``,
+    kept in the database so a retry is recognised on any worker.
+
+    A request first claims its key by inserting the row (the primary key lets
+    only one worker win), runs the step, then stores the response on the row.
+    A retry with a stored key gets the stored response without running the
+    step again. A duplicate arriving while the first request is still running
+    waits for it on the same worker, and gets 409 with ``Retry-After`` on
+    another. Only successful responses are stored: every step rejects before
+    it writes, so a failed request releases its key and can simply be
+    retried. Each key is bound to a fingerprint of the request, and reusing
+    it for a different request is refused with 422.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL_SECONDS,
+        pending_ttl: float = IDEMPOTENCY_PENDING_SECONDS,
+        session_factory=async_session_maker,
+    ):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.session_factory = session_factory
+        self._inflight: Dict[_Key, Tuple[str, asyncio.Future]] = {}
+
+    def _expired(self, record: IdempotencyRecord, now: datetime) -> bool:
+        ttl = self.ttl if record.response is not None else self.pending_ttl
+        return now - _as_utc(record.created_at) > timedelta(seconds=ttl)
+
+    async def _claim(self, key: _Key, fingerprint: str) -> Optional[IdempotencyRecord]:
+        """Claim ``key`` for this request: None on success, else the live record."""
+        user_id, idempotency_key = key
+        async with self.session_factory() as session:
+            while True:
+                now = datetime.now(timezone.utc)
+                record = await session.get(IdempotencyRecord, key)
+                if record is not None and not self._expired(record, now):
+                    return record
+                # Expired rows of this user go in the same commit as the claim
+                await session.exec(
+                    delete(IdempotencyRecord).where(
+                        col(IdempotencyRecord.user_id) == user_id,
+                        col(IdempotencyRecord.created_at) < now - timedelta(seconds=self.ttl),
+                    )
+                )
+                if record is not None:
+                    await session.exec(
+                        delete(IdempotencyRecord).where(
+                            col(IdempotencyRecord.user_id) == user_id,
+                            col(IdempotencyRecord.key) == idempotency_key,
+                            col(IdempotencyRecord.created_at) == record.created_at,
+                        )
+                    )
+                session.expunge_all()
+                session.add(
+                    IdempotencyRecord(user_id=user_id, key=idempotency_key, fingerprint=fingerprint)
+                )
+                try:
+                    await session.commit()
+                    return None
+                except IntegrityError:
+                    await session.rollback()  # claimed by a concurrent request; read it
+
+    async def _store(self, key: _Key, fingerprint: str, response: Any):
+        async with self.session_factory() as session:
+            record = await session.get(IdempotencyRecord, key)
+            if record is None:  # taken over as abandoned meanwhile
+                record = IdempotencyRecord(user_id=key[0], key=key[1], fingerprint=fingerprint)
+            record.response = json.dumps(response, default=str)
+            session.add(record)
+            await session.commit()
+
+    async def _release(self, key: _Key):
+        async with self.session_factory() as session:
+            await session.exec(
+                delete(IdempotencyRecord).where(
+                    col(IdempotencyRecord.user_id) == key[0],
+                    col(IdempotencyRecord.key) == key[1],
+                    col(IdempotencyRecord.response).is_(None),
+                )
+            )
+            await session.commit()
+
+    @staticmethod
+    def _check(fingerprint: str, stored: str):
+        if fingerprint != stored:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request",
+            )
+
+    async def run(
+        self,
+        user_id: int,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[Any]],
+        step: str = "",
+    ) -> Any:
+        slot = (user_id, key)
+        while True:
+            inflight = self._inflight.get(slot)
+            if inflight is None:
+                break
+            self._check(fingerprint, inflight[0])
+            metrics.incr("idempotency_requests_total", step=step, outcome="coalesced")
+            try:
+                return await asyncio.shield(inflight[1])
+            except asyncio.CancelledError:
+                if not inflight[1].cancelled():
+                    raise
+                # The first request was cancelled before finishing; take over
+
+        # Registered before the first await, so duplicates on this worker wait
+        # for this request instead of racing it for the row
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[slot] = (fingerprint, future)
+        try:
+            response = await self._run_claimed(slot, fingerprint, execute, step)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # retrieved: waiters are optional
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            self._inflight.pop(slot, None)
+
+    async def _run_claimed(
+        self, slot: _Key, fingerprint: str, execute: Callable[[], Awaitable[Any]], step: str
+    ) -> Any:
+        record = await self._claim(slot, fingerprint)
+        if record is not None:
+            self._check(fingerprint, record.fingerprint)
+            if record.response is not None:
+                metrics.incr("idempotency_requests_total", step=step, outcome="replayed")
+                return json.loads(record.response)
+            metrics.incr("idempotency_requests_total", step=step, outcome="in_progress")
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "1"},
+            )
+
+        metrics.incr("idempotency_requests_total", step=step, outcome="executed")
+        try:
+            response = await execute()
+        except BaseException:
+            await asyncio.shield(self._release(slot))
+            raise
+        await self._store(slot, fingerprint, response)
+        return response
+
+
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(step: str):
+    """
+    Make a purchase step honour the ``Idempotency-Key`` header.
+
+    Adds the header to the endpoint's signature, so FastAPI resolves it like
+    any other parameter; direct calls (the chat flow, benchmarks) pass no key
+    and run the step unchanged. The endpoint must take ``req`` (a pydantic
+    model) and ``user`` (a ``CurrentUser``).
+    """
+
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, idempotency_key: Optional[str] = None, **kwargs):
+            if idempotency_key is None:
+                return await endpoint(*args, **kwargs)
+            if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters",
+                )
+            arguments = signature.bind(*args, **kwargs).arguments
+            body = arguments["req"].model_dump_json()
+            fingerprint = hashlib.sha256(f"{step}:{body}".encode()).hexdigest()
+            return await idempotency_store.run(
+                arguments["user"].id,
+                idempotency_key,
+                fingerprint,
+                lambda: endpoint(*args, **kwargs),
+                step=step,
+            )
+
+        header = inspect.Parameter(
+            "idempotency_key",
+            inspect.Parameter.KEYWORD_ONLY,
+            default=Header(None, alias="Idempotency-Key"),
+            annotation=Optional[str],
+        )
+        wrapper.__signature__ = signature.replace(
+            parameters=[*signature.parameters.values(), header]
+        )
+        return wrapper
+
+    return decorator
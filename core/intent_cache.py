@@ -0,0 +1,213 @@
+# core/intent_cache.py
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "5000"))
+INTENT_CACHE_TTL_SECONDS = float(os.getenv("INTENT_CACHE_TTL_SECONDS", "3600"))
+# Set to a file path (e.g. ./intent_cache.db) to keep the cache across restarts.
+INTENT_CACHE_DB_PATH = os.getenv("INTENT_CACHE_DB_PATH")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace; digits are kept."""
+    query = _PUNCTUATION.sub(" ", query.lower())
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _price_variants(price: float) -> list:
+    return [f"{price:,.2f}", f"{price:.2f}", f"{price:,.0f}", f"{price:.0f}", str(price)]
+
+
+def _refresh_price(response: dict, live_price: Optional[float]) -> Optional[dict]:
+    """
+    Swap the price quoted when the entry was cached for the current one.
+    None when the answer quotes the cached price and there is no live price
+    to put in its place: serving it would pass an old price off as current.
+    """
+    meta = response.setdefault("meta", {})
+    cached_price = meta.pop("gold_price", None)
+    if cached_price is None:
+        return response
+    answer = response.get("answer")
+    answer = answer if isinstance(answer, str) else ""
+    quoted = next((old for old in _price_variants(cached_price) if old in answer), None)
+    if not live_price or live_price <= 0:
+        return None if quoted is not None else response
+
+    meta["gold_price"] = live_price
+    if quoted is not None:
+        new = _price_variants(live_price)[_price_variants(cached_price).index(quoted)]
+        response["answer"] = answer.replace(quoted, new)
+    return response
+
+
+class _SQLiteBackend:
+    """On-disk second level so cached intents survive restarts."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS intent_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_intent_cache_last_access "
+            "ON intent_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM intent_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM intent_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE intent_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str, expires_at: float, now: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO intent_cache VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._conn.execute(
+                "DELETE FROM intent_cache WHERE key IN ("
+                "SELECT key FROM intent_cache ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM intent_cache")
+            self._conn.commit()
+
+
+class IntentCache:
+    """
+    LRU + TTL cache of intent-classification responses keyed on normalized
+    query text, optionally backed by SQLite.
+
+    Entries are stored as JSON so every hit returns a fresh copy the flow can
+    mutate. Any ``meta.gold_price`` quoted by Gemini is re-stamped with the
+    caller's live price on each hit so a cached answer never carries a stale
+    price.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = INTENT_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = INTENT_CACHE_TTL_SECONDS,
+        db_path: Optional[str] = INTENT_CACHE_DB_PATH,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = _SQLiteBackend(db_path, max_entries) if db_path else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, query: str, live_price: Optional[float] = None) -> Optional[dict]:
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None and self._disk is not None:
+            value = self._disk.get(key, now)
+            if value is not None:
+                entry = (value, now + self.ttl_seconds)
+                self._store(key, entry)
+
+        response = None
+        if entry is not None:
+            response = _refresh_price(json.loads(entry[0]), live_price)
+        if response is None:
+            self.misses += 1
+            metrics.incr("cache_lookups_total", cache="intent", outcome="miss")
+            return None
+
+        self.hits += 1
+        metrics.incr("cache_lookups_total", cache="intent", outcome="hit")
+        response["query"] = query
+        return response
+
+    def put(self, query: str, response: dict):
+        # Only cache real classifications, never SDK error fallbacks or
+        # answers replayed while Gemini was failing.
+        if not response.get("intent") or (response.get("meta") or {}).get("degraded"):
+            return
+        key = normalize_query(query)
+        now = time.time()
+        entry = (json.dumps(response), now + self.ttl_seconds)
+        self._store(key, entry)
+        if self._disk is not None:
+            self._disk.put(key, entry[0], entry[1], now)
+
+    def _store(self, key: str, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self._disk is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+intent_cache = IntentCache()
@@ -0,0 +1,335 @@
+# core/intent_classifier.py
+"""
+Local fast-path intent classification.
+
+Runs before Gemini in ``core.chat_flow``: a compiled keyword/regex rule set
+first, then a small TF-IDF + softmax-regression model trained offline from
+logged queries. A prediction is only used when its confidence clears the
+threshold; everything else still goes to Gemini.
+
+Train a model from a JSONL file of ``{"query": ..., "intent": ...}`` lines:
+
+    python -m core.intent_classifier benchmarks/data/intent_train.jsonl
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+from core.intent_cache import normalize_query
+from core.prompts import INTENTS
+
+logger = logging.getLogger(__name__)
+
+INTENT_FASTPATH_ENABLED = os.getenv("INTENT_FASTPATH_ENABLED", "1") == "1"
+INTENT_FASTPATH_THRESHOLD = float(os.getenv("INTENT_FASTPATH_THRESHOLD", "0.85"))
+# Intents the TF-IDF model may not decide alone: a wrong ready_to_invest starts
+# a purchase and a wrong irrelevant brushes the user off, and the model is
+# overconfident on phrasings outside its training set ("sell my gold",
+# "buy a house"). Rules may still return them.
+INTENT_TFIDF_EXCLUDED = tuple(
+    i for i in os.getenv("INTENT_TFIDF_EXCLUDED", "ready_to_invest,irrelevant").split(",") if i
+)
+INTENT_MODEL_PATH = os.getenv(
+    "INTENT_MODEL_PATH", os.path.join(os.path.dirname(__file__), "intent_model.json")
+)
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    source: str
+
+
+# ---------------- Rules ----------------
+# Evaluated in order; the first match wins. ``exclude`` vetoes a rule so that
+# e.g. "sell stocks and buy gold" is not labelled other_investments.
+_GOLD = r"\b(digital\s+)?gold\b"
+_RULES: List[Tuple[str, str, Optional[str], float]] = [
+    (
+        "ready_to_invest",
+        r"\b(i\s+want|i\s+would\s+like|i\s+d\s+like|i\s+am\s+ready|i\s+m\s+ready|"
+        r"help\s+me|let\s+me|let\s+s|please)\s+(to\s+)?(buy|purchase|invest)\b.*" + _GOLD,
+        None,
+        0.95,
+    ),
+    (
+        "ready_to_invest",
+        r"\b(buy|purchase|book)\s+(\d+(\.\d+)?\s*(g|gm|gms|grams?)\s+(of\s+)?"
+        + _GOLD
+        + r"|gold\s+worth\b)",
+        None,
+        0.95,
+    ),
+    (
+        "ready_to_invest",
+        r"\b(buy|purchase|invest)\s+(\d+\s+(rupees\s+)?in\s+)?(digital\s+)?gold\s+(now|today)\b",
+        None,
+        0.9,
+    ),
+    (
+        "gold_related",
+        r"\bgold\s+(price|prices|rate|rates)\b|\b(price|rate)\s+of\s+gold\b",
+        None,
+        0.95,
+    ),
+    (
+        "gold_related",
+        r"\b(should\s+i|is\s+it\s+(a\s+)?good(\s+time)?\s+to)\s+(buy|invest\s+in)\s+gold\b"
+        r"|\bis\s+(digital\s+)?gold\s+(a\s+)?(good|safe|better)\b",
+        None,
+        0.9,
+    ),
+    (
+        "other_investments",
+        r"\b(crypto|bitcoin|ethereum|stocks?|shares|mutual\s+funds?|sip|"
+        r"fixed\s+deposits?|real\s+estate|bonds?|etfs?|index\s+funds?|demat|ppf|nfts?)\b",
+        r"\bgold\b",
+        0.9,
+    ),
+    (
+        "general_finance",
+        r"\b(budget|emergency\s+fund|credit\s+(score|card)|emi|personal\s+loan|"
+        r"home\s+loan|income\s+tax|insurance|retirement)\b",
+        r"\bgold\b|\b(crypto|stocks?|mutual\s+funds?)\b",
+        0.9,
+    ),
+    (
+        "irrelevant",
+        r"^(hi|hello|hey|hey\s+there|thanks|thank\s+you|ok\s+thanks)$",
+        None,
+        0.95,
+    ),
+]
+
+
+class RuleClassifier:
+    """Compiled keyword/regex rules; high precision, low recall."""
+
+    def __init__(self, rules: Sequence[Tuple[str, str, Optional[str], float]] = _RULES):
+        self._rules: List[Tuple[str, Pattern, Optional[Pattern], float]] = [
+            (intent, re.compile(pattern), re.compile(exclude) if exclude else None, conf)
+            for intent, pattern, exclude, conf in rules
+        ]
+
+    def classify(self, query: str) -> Optional[IntentPrediction]:
+        text = normalize_query(query)
+        for intent, pattern, exclude, confidence in self._rules:
+            if pattern.search(text) and not (exclude and exclude.search(text)):
+                return IntentPrediction(intent, confidence, "rules")
+        return None
+
+
+# ---------------- TF-IDF + softmax regression ----------------
+def _features(text: str) -> List[str]:
+    tokens = normalize_query(text).split()
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _vectorize(text: str, idf: Dict[str, float]) -> Dict[str, float]:
+    counts = Counter(f for f in _features(text) if f in idf)
+    vec = {f: (1 + math.log(c)) * idf[f] for f, c in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {f: v / norm for f, v in vec.items()} if norm else {}
+
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+def train_tfidf_model(
+    samples: Sequence[Tuple[str, str]],
+    epochs: int = 60,
+    learning_rate: float = 0.5,
+    l2: float = 1e-4,
+) -> dict:
+    """
+    Fit a TF-IDF + multinomial logistic regression model with plain SGD.
+
+    Args:
+        samples: ``(query, intent)`` pairs, e.g. logged queries with Gemini labels.
+
+    Returns:
+        dict: JSON-serializable model consumed by ``TfidfClassifier``.
+    """
+    labels = [intent for intent in INTENTS if any(s[1] == intent for s in samples)]
+    doc_freq = Counter()
+    for query, _ in samples:
+        doc_freq.update(set(_features(query)))
+    n_docs = len(samples)
+    idf = {f: math.log((1 + n_docs) / (1 + df)) + 1 for f, df in doc_freq.items()}
+
+    data = [(_vectorize(q, idf), labels.index(intent)) for q, intent in samples]
+    weights: List[Dict[str, float]] = [{} for _ in labels]
+    bias = [0.0] * len(labels)
+
+    for epoch in range(epochs):
+        lr = learning_rate / (1 + epoch * 0.05)
+        for vec, target in data:
+            scores = [
+                bias[k] + sum(weights[k].get(f, 0.0) * v for f, v in vec.items())
+                for k in range(len(labels))
+            ]
+            probs = _softmax(scores)
+            for k in range(len(labels)):
+                grad = probs[k] - (1.0 if k == target else 0.0)
+                bias[k] -= lr * grad
+                w = weights[k]
+                for f, v in vec.items():
+                    w[f] = w.get(f, 0.0) * (1 - lr * l2) - lr * grad * v
+
+    return {
+        "labels": labels,
+        "idf": {f: round(v, 6) for f, v in idf.items()},
+        "bias": [round(b, 6) for b in bias],
+        "weights": [
+            {f: round(v, 6) for f, v in w.items() if abs(v) > 1e-4} for w in weights
+        ],
+    }
+
+
+class TfidfClassifier:
+    """
+    Pure-Python scorer for a model produced by ``train_tfidf_model``. A query
+    whose best label is in ``excluded`` gets no prediction (goes to Gemini).
+    """
+
+    def __init__(self, model: dict, excluded: Sequence[str] = INTENT_TFIDF_EXCLUDED):
+        self.excluded = frozenset(excluded)
+        self.labels: List[str] = model["labels"]
+        self.idf: Dict[str, float] = model["idf"]
+        self.bias: List[float] = model["bias"]
+        self.weights: List[Dict[str, float]] = model["weights"]
+
+    @classmethod
+    def load(cls, path: str) -> Optional["TfidfClassifier"]:
+        if not os.path.exists(path):
+            logger.info(f"No intent model at {path}; fast path uses rules only")
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def classify(self, query: str) -> Optional[IntentPrediction]:
+        vec = _vectorize(query, self.idf)
+        if not vec:
+            return None
+        scores = [
+            self.bias[k] + sum(self.weights[k].get(f, 0.0) * v for f, v in vec.items())
+            for k in range(len(self.labels))
+        ]
+        probs = _softmax(scores)
+        best = max(range(len(probs)), key=probs.__getitem__)
+        if self.labels[best] in self.excluded:
+            return None
+        return IntentPrediction(self.labels[best], probs[best], "tfidf")
+
+
+class PreClassifier:
+    """
+    Pluggable stage run before ``call_gemini_api``: the first classifier that
+    is confident enough wins, otherwise ``classify`` returns None and the
+    caller falls back to Gemini.
+    """
+
+    def __init__(self, classifiers: Sequence, threshold: float = INTENT_FASTPATH_THRESHOLD):
+        self.classifiers = [c for c in classifiers if c is not None]
+        self.threshold = threshold
+
+    def predict(self, query: str) -> Optional[IntentPrediction]:
+        """Best available prediction, regardless of threshold."""
+        best = None
+        for classifier in self.classifiers:
+            prediction = classifier.classify(query)
+            if prediction and (best is None or prediction.confidence > best.confidence):
+                best = prediction
+            if best and best.confidence >= self.threshold:
+                break
+        return best
+
+    def classify(self, query: str) -> Optional[IntentPrediction]:
+        prediction = self.predict(query)
+        if prediction and prediction.confidence >= self.threshold:
+            return prediction
+        return None
+
+
+def default_pre_classifier() -> Optional[PreClassifier]:
+    if not INTENT_FASTPATH_ENABLED:
+        return None
+    return PreClassifier([RuleClassifier(), TfidfClassifier.load(INTENT_MODEL_PATH)])
+
+
+# ---------------- Local responses ----------------
+_CATEGORIES = {
+    "gold_related": "gold",
+    "ready_to_invest": "gold",
+    "general_finance": "finance",
+    "other_investments": "finance",
+    "irrelevant": "irrelevant",
+}
+
+_ANSWERS = {
+    "gold_related": (
+        "Gold has historically been a safe-haven asset, and digital gold lets you "
+        "start small while it is stored securely for you."
+    ),
+    "ready_to_invest": "Great! I can guide you step by step to buy digital gold.",
+    "general_finance": (
+        "That feature is under development. Meanwhile, digital gold is a simple, "
+        "stable way to start building your savings today."
+    ),
+    "other_investments": (
+        "These investments are under development. Meanwhile, gold is a stable "
+        "option you can start today."
+    ),
+    "irrelevant": (
+        "That’s interesting, but let’s talk about how you can secure your future "
+        "with investments in gold."
+    ),
+}
+
+
+def build_local_response(
+    user_query: str, prediction: IntentPrediction, live_price: Optional[float] = None
+) -> dict:
+    """Build a response in the intent prompt's output format without Gemini."""
+    answer = _ANSWERS[prediction.intent]
+    meta = {"confidence": round(prediction.confidence, 4)}
+    if prediction.intent == "gold_related" and live_price and live_price > 0:
+        answer += f" The current live gold price is ₹{live_price} per gram."
+        meta["gold_price"] = live_price
+    return {
+        "query": user_query,
+        "source": f"local:{prediction.source}",
+        "intent": prediction.intent,
+        "category": _CATEGORIES[prediction.intent],
+        "answer": answer,
+        "meta": meta,
+    }
+
+
+def _load_samples(path: str) -> List[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["query"], row["intent"]) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local intent model.")
+    parser.add_argument("corpus", help="JSONL file of {query, intent} records")
+    parser.add_argument("--out", default=INTENT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=60)
+    args = parser.parse_args()
+
+    samples = _load_samples(args.corpus)
+    model = train_tfidf_model(samples, epochs=args.epochs)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(model, f, separators=(",", ":"), sort_keys=True)
+    print(f"Trained on {len(samples)} samples -> {args.out}")
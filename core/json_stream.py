@@ -0,0 +1,176 @@
+# core/json_stream.py
+import re
+from typing import Dict, List, Optional, Tuple
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Parser states
+_BEFORE, _KEY_OR_END, _COLON, _VALUE, _STRING, _SCALAR, _NESTED, _DONE = range(8)
+
+
+class JsonFieldStream:
+    """
+    Incremental reader for the top-level string fields of a streamed JSON object.
+
+    ``feed`` takes raw chunks as they arrive and returns the newly decoded text
+    of each top-level string value as ``(key, text)`` pairs, so a field such as
+    ``answer`` can be shown before the object is complete. Finished string
+    fields are collected in ``fields``. Anything before the first ``{`` (code
+    fences, preambles) is skipped, as are nested objects, arrays and scalars.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self._chunks: List[str] = []
+        self._state = _BEFORE
+        self._in_key = False
+        self._key = ""
+        self._buf: List[str] = []
+        self._escape: Optional[str] = None  # "" after a backslash, "uXXXX" while reading \u
+        self._high_surrogate: Optional[int] = None
+        self._depth = 0
+        self._nested_string = False
+        self._nested_escape = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._chunks)
+
+    def partial(self, key: str) -> str:
+        """Text of ``key`` so far, whether or not it is complete."""
+        if key in self.fields:
+            return self.fields[key]
+        if self._state == _STRING and not self._in_key and self._key == key:
+            return "".join(self._buf)
+        return ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self._chunks.append(chunk)
+        deltas: List[Tuple[str, str]] = []
+        i, n = 0, len(chunk)
+        while i < n and self._state != _DONE:
+            state = self._state
+            if state == _STRING and self._escape is None:
+                # Copy plain runs in one go; only quotes and escapes need care
+                match = _STRING_SPECIAL.search(chunk, i)
+                end = match.start() if match else n
+                if end > i:
+                    self._append(chunk[i:end], deltas)
+                if match is None:
+                    break
+                i = end + 1
+                if chunk[end] == '"':
+                    self._end_string()
+                else:
+                    self._escape = ""
+                continue
+
+            ch = chunk[i]
+            i += 1
+            if state == _STRING:
+                self._read_escape(ch, deltas)
+            elif state == _BEFORE:
+                if ch == "{":
+                    self._state = _KEY_OR_END
+            elif state == _KEY_OR_END:
+                if ch == '"':
+                    self._start_string(in_key=True)
+                elif ch == "}":
+                    self._state = _DONE
+            elif state == _COLON:
+                if ch == ":":
+                    self._state = _VALUE
+            elif state == _VALUE:
+                if ch == '"':
+                    self._start_string(in_key=False)
+                elif ch in "{[":
+                    self._state, self._depth = _NESTED, 1
+                elif not ch.isspace():
+                    self._state = _SCALAR
+            elif state == _SCALAR:
+                if ch == ",":
+                    self._state = _KEY_OR_END
+                elif ch == "}":
+                    self._state = _DONE
+            elif state == _NESTED:
+                self._skip_nested(ch)
+        return _merge(deltas)
+
+    def _start_string(self, in_key: bool):
+        self._state = _STRING
+        self._in_key = in_key
+        self._buf = []
+
+    def _end_string(self):
+        text = "".join(self._buf)
+        if self._in_key:
+            self._key = text
+            self._state = _COLON
+        else:
+            self.fields[self._key] = text
+            self._state = _KEY_OR_END
+
+    def _append(self, text: str, deltas: List[Tuple[str, str]]):
+        self._high_surrogate = None
+        self._buf.append(text)
+        if not self._in_key:
+            deltas.append((self._key, text))
+
+    def _read_escape(self, ch: str, deltas: List[Tuple[str, str]]):
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return
+            self._escape = None
+            self._append(_ESCAPES.get(ch, ch), deltas)
+            return
+
+        self._escape += ch
+        if len(self._escape) < 5:
+            return
+        try:
+            code = int(self._escape[1:], 16)
+        except ValueError:
+            code = 0xFFFD
+        self._escape = None
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code  # wait for the low half
+        elif 0xDC00 <= code < 0xE000:
+            high, self._high_surrogate = self._high_surrogate, None
+            if high is not None:
+                self._append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)), deltas)
+        else:
+            self._append(chr(code), deltas)
+
+    def _skip_nested(self, ch: str):
+        if self._nested_string:
+            if self._nested_escape:
+                self._nested_escape = False
+            elif ch == "\\":
+                self._nested_escape = True
+            elif ch == '"':
+                self._nested_string = False
+        elif ch == '"':
+            self._nested_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._state = _KEY_OR_END
+
+
+def _merge(deltas: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    merged: List[Tuple[str, str]] = []
+    for key, text in deltas:
+        if merged and merged[-1][0] == key:
+            merged[-1] = (key, merged[-1][1] + text)
+        else:
+            merged.append((key, text))
+    return merged
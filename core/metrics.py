@@ -0,0 +1,135 @@
+# core/metrics.py
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Tuple
+
+# Observations kept per histogram series for quantiles (sliding window)
+METRICS_WINDOW_SIZE = int(os.getenv("METRICS_WINDOW_SIZE", "1024"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+# In-process counters keyed by (name, sorted label pairs).
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+
+
+class _Series:
+    """One histogram series: lifetime count and sum, recent samples."""
+
+    __slots__ = ("count", "sum", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=METRICS_WINDOW_SIZE)
+
+
+_histograms: Dict[Tuple[str, tuple], _Series] = {}
+
+
+def incr(name: str, value: float = 1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += value
+
+
+def get_counter(name: str, **labels) -> float:
+    return _counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def observe(name: str, value: float, **labels):
+    """Record one observation (e.g. a duration in seconds) in a histogram."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = _Series()
+        series.count += 1
+        series.sum += value
+        series.samples.append(value)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time the block and ``observe`` its duration in seconds, even if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _quantiles(samples: List[float]) -> Dict[float, float]:
+    ordered = sorted(samples)
+    return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+def get_histogram(name: str, **labels) -> dict:
+    """``count``, ``sum`` and p50/p95/p99 of the recent window ({} if unobserved)."""
+    with _lock:
+        series = _histograms.get((name, tuple(sorted(labels.items()))))
+        if series is None:
+            return {}
+        count, total, samples = series.count, series.sum, list(series.samples)
+    stats = {"count": count, "sum": total}
+    for q, value in _quantiles(samples).items():
+        stats[f"p{int(q * 100)}"] = value
+    return stats
+
+
+def counters_snapshot() -> Dict[str, float]:
+    """Flat ``name{label="value"}`` -> value view of every counter."""
+    with _lock:
+        items = list(_counters.items())
+    snapshot = {}
+    for (name, labels), value in sorted(items):
+        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+        snapshot[f"{name}{{{label_text}}}" if labels else name] = value
+    return snapshot
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Every counter and histogram in the Prometheus text format (0.0.4).
+    Histograms are exposed as summaries: quantiles over the recent window,
+    ``_count`` and ``_sum`` over the process lifetime.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (key, (s.count, s.sum, list(s.samples))) for key, s in _histograms.items()
+        )
+
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_label_text(labels)} {value:g}")
+    for (name, labels), (count, total, samples) in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} summary")
+        for q, value in _quantiles(samples).items():
+            lines.append(f"{name}{_label_text(labels + (('quantile', str(q)),))} {value:g}")
+        lines.append(f"{name}_count{_label_text(labels)} {count}")
+        lines.append(f"{name}_sum{_label_text(labels)} {total:g}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
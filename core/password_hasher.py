@@ -0,0 +1,114 @@
+# core/password_hasher.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from core import metrics
+from core.security import BCRYPT_ROUNDS, hash_password, verify_and_rehash
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for bcrypt; 0 runs it on a thread instead (tests, tiny hosts).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to wait beyond the ones running; more are rejected at once.
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+
+class HasherSaturated(Exception):
+    """The hashing queue is full; the caller should ask the client to retry."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated, size-limited process pool so hashing uses
+    every core and never occupies the event loop or Starlette's threadpool.
+
+    At most ``workers + max_queue`` jobs are pending at once; beyond that new
+    jobs fail fast with ``HasherSaturated`` instead of queueing behind a burst.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.peak_pending = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    def _admit(self, op: str):
+        with self._lock:
+            if self._pending >= max(1, self.workers) + self.max_queue:
+                self.rejected += 1
+                metrics.incr("auth_hash_jobs_total", op=op, outcome="rejected")
+                raise HasherSaturated(f"{self._pending} password jobs pending")
+            self._pending += 1
+            self.peak_pending = max(self.peak_pending, self._pending)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def _run(self, op: str, fn, *args):
+        self._admit(op)
+        executor = self._get_executor()
+        if executor is None:
+            try:
+                result = await asyncio.to_thread(fn, *args)
+            finally:
+                self._release()
+        else:
+            # Released when the job finishes, even if the request was cancelled
+            future: Future = executor.submit(fn, *args)
+            future.add_done_callback(self._release)
+            result = await asyncio.wrap_future(future)
+        metrics.incr("auth_hash_jobs_total", op=op, outcome="ok")
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """``(matches, new hash to store if the cost changed else None)``."""
+        return await self._run("verify", verify_and_rehash, password, hashed, self.rounds)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "peak_pending": self.peak_pending,
+            "max_pending": max(1, self.workers) + self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -1,36 +1,81 @@
 # core/prompts.py
+from dataclasses import dataclass
 
+from core import metrics
+from core.history_window import history_window
 
-def build_gemini_prompt(user_query: str) -> str:
-    """
-    Constructs a prompt for Gemini Pro with proper prompt strategy:
-    Instruction, Context, Examples, Role, Output Format.
+INTENTS = (
+    "gold_related",
+    "ready_to_invest",
+    "general_finance",
+    "other_investments",
+    "irrelevant",
+)
+STAGES = (
+    "exploration",
+    "ready_to_buy",
+    "buy_step_1",
+    "buy_step_2",
+    "buy_step_3",
+    "buy_step_4",
+    "buy_step_5",
+)
+CATEGORIES = ("gold", "finance", "irrelevant")
 
-    Args:
-        user_query (str): The query from the user.
 
-    Returns:
-        str: The formatted prompt ready to send to Gemini.
+@dataclass(frozen=True)
+class PromptTemplate:
     """
+    A prompt split into an immutable static prefix (instruction, role,
+    examples, output format), built once at import, and a small dynamic
+    suffix assembled per call with a single join.
 
-    instruction = (
-        "You are a professional financial guide for beginners. "
-        "Classify the user query into one of these intents: "
-        "'gold_related', 'ready_to_invest', 'general_finance', 'other_investments', or 'irrelevant'. "
-        "If the query is related to gold, provide a convincing response encouraging digital gold investment. "
-        "Include the current gold price if the user asks about it. "
-        "If the query is finance-related but not gold, reply that the feature is under development and encourage them to consider gold. "
-        "If the query is irrelevant, politely redirect the conversation towards finance or gold investment. "
-        "Always return a JSON object ONLY in the specified format."
-        "Do not use Markdown or code block formatting (do not use triple backticks). Return only raw JSON."
-    )
+    The prefix is identical for every request, so it can be sent once as a
+    server-side cached context (see ``services.gemini_client``) and only the
+    suffix shipped per call.
+    """
 
-    context = (
-        "Simplify Money app helps beginners invest digitally, especially in gold. "
-        "Provide concise, professional, and friendly advice."
-    )
+    name: str
+    prefix: str
+
+    def render(self, *suffix_parts: str) -> str:
+        return "".join((self.prefix, *suffix_parts))
+
+
+_HISTORY_LABELS = {"user": "User", "assistant": "Bot"}
+
+
+def _format_history(conversation_history: list, summary: str = "") -> str:
+    parts = ["Conversation History:\n"]
+    if summary:
+        parts.append(f"Earlier (summary): {summary}\n")
+    # Most recent turns that fit the history token budget
+    for turn in history_window.pack(conversation_history):
+        label = _HISTORY_LABELS.get(turn["role"])
+        if label:
+            parts.append(f"{label}: {turn['content']}\n")
+    return "".join(parts)
+
+
+# ---------------- Intent classification prompt ----------------
+_INTENT_INSTRUCTION = (
+    "You are a professional financial guide for beginners. "
+    "Classify the user query into one of these intents: "
+    "'gold_related', 'ready_to_invest', 'general_finance', 'other_investments', or 'irrelevant'. "
+    "If the query is related to gold, provide a convincing response encouraging digital gold investment. "
+    "Include the current gold price if the user asks about it. "
+    "If the query is finance-related but not gold, reply that the feature is under development and encourage them to consider gold. "
+    "If the query is irrelevant, politely redirect the conversation towards finance or gold investment. "
+    "Always return a JSON object ONLY in the specified format."
+    "Do not use Markdown or code block formatting (do not use triple backticks). Return only raw JSON."
+)
 
-    examples = """
+_INTENT_CONTEXT = (
+    "Simplify Money app helps beginners invest digitally, especially in gold. "
+    "Provide concise, professional, and friendly advice."
+)
+
+_INTENT_EXAMPLES = """
 Examples:
 
 Q: Should I buy gold now?
@@ -81,7 +126,7 @@ Response:
 }
 """
 
-    output_format = """
+_INTENT_OUTPUT_FORMAT = """
 Output Format:
 {
   "query": "<user query>",
@@ -96,63 +141,40 @@ Output Format:
 }
 """
 
-    role = "Role: You are a friendly and professional financial mentor."
+_INTENT_ROLE = "Role: You are a friendly and professional financial mentor."
 
-    prompt = f'{instruction}\n\n{context}\n\n{role}\n\n{examples}\n\n{output_format}\n\nUser Query: "{user_query}"\nResponse:'
-    return prompt
 
+# ---------------- Chatbot prompt ----------------
+_CHATBOT_INSTRUCTION = (
+    "You are a professional, friendly financial chatbot embedded in a digital gold app. "
+    "Your job is to guide users naturally and step-by-step in buying digital gold. "
+    "Always respond concisely, positively, and naturally, as if chatting inside the app. "
+    "Embed clickable links in the text for each step using dummy endpoints, e.g., "
+    "[Create Account](http://127.0.0.1:8000/api/gold/kyc). "
+    "Do NOT provide explanations, convincing, or unnecessary details unless the user explicitly asks. "
+    "Focus entirely on guiding the user through the buying journey."
+    "Always return a JSON object ONLY in the specified format."
+    "Do not use Markdown or code block formatting (do not use triple backticks). Return only raw JSON."
+)
 
-def build_chatbot_prompt(user_query: str, conversation_history: list) -> str:
-    """
-    Builds a chatbot-style prompt with conversation memory and step-based flow.
-    Gemini thinks like it's guiding the user inside an app/website and provides
-    natural stepwise instructions with embedded links for each step.
+_CHATBOT_ROLE = (
+    "Role: You are a trusted financial mentor and assistant, fully integrated into the app. "
+    "Encourage digital gold investment in a beginner-friendly way, using app-like step guidance."
+)
 
-    Args:
-        user_query (str): The latest query from the user.
-        conversation_history (list): List of dicts with {"user": str, "bot": str}.
-
-    Returns:
-        str: The formatted prompt for Gemini.
-    """
-
-    instruction = (
-        "You are a professional, friendly financial chatbot embedded in a digital gold app. "
-        "Your job is to guide users naturally and step-by-step in buying digital gold. "
-        "Always respond concisely, positively, and naturally, as if chatting inside the app. "
-        "Embed clickable links in the text for each step using dummy endpoints, e.g., "
-        "[Create Account](http://127.0.0.1:8000/api/gold/kyc). "
-        "Do NOT provide explanations, convincing, or unnecessary details unless the user explicitly asks. "
-        "Focus entirely on guiding the user through the buying journey."
-        "Always return a JSON object ONLY in the specified format."
-        "Do not use Markdown or code block formatting (do not use triple backticks). Return only raw JSON."
-    )
-
-    role = (
-        "Role: You are a trusted financial mentor and assistant, fully integrated into the app. "
-        "Encourage digital gold investment in a beginner-friendly way, using app-like step guidance."
-    )
-
-    context = "Conversation History:\n"
-    for turn in conversation_history[-5:]:  # last 5 exchanges
-        if turn["role"] == "user":
-            context += f"User: {turn['content']}\n"
-        elif turn["role"] == "assistant":
-            context += f"Bot: {turn['content']}\n"
-
-    output_format = (
-        "Output Format:\n"
-        "{\n"
-        '  "query": "<user query>",\n'
-        '  "source": "gemini",\n'
-        '  "stage": "exploration" | "ready_to_buy" | "buy_step_1" | "buy_step_2" | "buy_step_3" | "buy_step_4" | "buy_step_5",\n'
-        '  "answer": "<chatbot response with embedded links where applicable>",\n'
-        '  "buy_link": "<URL to proceed with purchase for this step>",\n'
-        '  "meta": { "confidence": <0.0-1.0> }\n'
-        "}"
-    )
+_CHATBOT_OUTPUT_FORMAT = (
+    "Output Format:\n"
+    "{\n"
+    '  "query": "<user query>",\n'
+    '  "source": "gemini",\n'
+    '  "stage": "exploration" | "ready_to_buy" | "buy_step_1" | "buy_step_2" | "buy_step_3" | "buy_step_4" | "buy_step_5",\n'
+    '  "answer": "<chatbot response with embedded links where applicable>",\n'
+    '  "buy_link": "<URL to proceed with purchase for this step>",\n'
+    '  "meta": { "confidence": <0.0-1.0> }\n'
+    "}"
+)
 
-    examples = """
+_CHATBOT_EXAMPLES = """
 Examples:
 
 Q: I’m interested in digital gold
@@ -222,9 +244,193 @@ Response:
 }
 """
 
-    prompt = (
-        f"{instruction}\n\n{role}\n\n{context}\n\n{examples}\n\n{output_format}\n\n"
-        f'User Query: "{user_query}"\nResponse:'
+
+# ---------------- Fused intent + stage prompt ----------------
+_FUSED_INSTRUCTION = (
+    "You are a professional, friendly financial chatbot embedded in a digital gold app. "
+    "First classify the user query into one of these intents: "
+    "'gold_related', 'ready_to_invest', 'general_finance', 'other_investments', or 'irrelevant'. "
+    "If the intent is 'ready_to_invest', guide the user step-by-step through buying digital gold, "
+    "pick the purchase stage from the conversation, and embed clickable links for each step using "
+    "dummy endpoints, e.g., [Create Account](http://127.0.0.1:8000/api/gold/kyc). "
+    "If the query is related to gold, provide a convincing response encouraging digital gold investment. "
+    "If the query is finance-related but not gold, reply that the feature is under development and encourage them to consider gold. "
+    "If the query is irrelevant, politely redirect the conversation towards finance or gold investment. "
+    "For every intent other than 'ready_to_invest', use stage 'exploration' and an empty buy_link. "
+    "Always return a JSON object ONLY in the specified format."
+    "Do not use Markdown or code block formatting (do not use triple backticks). Return only raw JSON."
+)
+
+_FUSED_ROLE = (
+    "Role: You are a trusted financial mentor and assistant, fully integrated into the app. "
+    "Encourage digital gold investment in a beginner-friendly way, using app-like step guidance."
+)
+
+_FUSED_OUTPUT_FORMAT = (
+    "Output Format:\n"
+    "{\n"
+    '  "query": "<user query>",\n'
+    '  "source": "gemini",\n'
+    '  "intent": "gold_related" | "ready_to_invest" | "general_finance" | "other_investments" | "irrelevant",\n'
+    '  "category": "gold" | "finance" | "irrelevant",\n'
+    '  "stage": "exploration" | "ready_to_buy" | "buy_step_1" | "buy_step_2" | "buy_step_3" | "buy_step_4" | "buy_step_5",\n'
+    '  "answer": "<chatbot response with embedded links where applicable>",\n'
+    '  "buy_link": "<URL to proceed with purchase for this step, or empty>",\n'
+    '  "meta": { "confidence": <0.0-1.0> }\n'
+    "}"
+)
+
+_FUSED_EXAMPLES = """
+Examples:
+
+Q: Should I buy gold now?
+Response:
+{
+  "query": "Should I buy gold now?",
+  "source": "gemini",
+  "intent": "gold_related",
+  "category": "gold",
+  "stage": "exploration",
+  "answer": "Gold historically serves as a safe-haven asset; consider digital gold for small ticket investments.",
+  "buy_link": "",
+  "meta": { "confidence": 0.9 }
+}
+
+Q: I want to invest in crypto
+Response:
+{
+  "query": "I want to invest in crypto",
+  "source": "gemini",
+  "intent": "other_investments",
+  "category": "finance",
+  "stage": "exploration",
+  "answer": "Crypto investments are under development. Meanwhile, gold is a stable option you can start today.",
+  "buy_link": "",
+  "meta": { "confidence": 0.85 }
+}
+
+Q: Yes, I want to buy now
+Response:
+{
+  "query": "Yes, I want to buy now",
+  "source": "gemini",
+  "intent": "ready_to_invest",
+  "category": "gold",
+  "stage": "ready_to_buy",
+  "answer": "Awesome! Step 1: Create your account with our partner (KYC required). Start here: [Create Account](https://dummy-partner-api.com/api/gold/kyc). Shall I continue?",
+  "buy_link": "http://127.0.0.1:8000/api/gold/kyc",
+  "meta": { "confidence": 0.95 }
+}
+
+Q: OK
+Response:
+{
+  "query": "OK",
+  "source": "gemini",
+  "intent": "ready_to_invest",
+  "category": "gold",
+  "stage": "buy_step_2",
+  "answer": "Step 2: Choose the quantity in grams or amount in ₹. Proceed here: [Choose Quantity](https://dummy-partner-api.com/api/gold/quantity)",
+  "buy_link": "http://127.0.0.1:8000/api/gold/quantity",
+  "meta": { "confidence": 0.95 }
+}
+
+Q: Golden retriever dog price?
+Response:
+{
+  "query": "Golden retriever dog price?",
+  "source": "gemini",
+  "intent": "irrelevant",
+  "category": "irrelevant",
+  "stage": "exploration",
+  "answer": "That’s interesting, but let’s talk about how you can secure your future with investments in gold.",
+  "buy_link": "",
+  "meta": { "confidence": 0.1 }
+}
+"""
+
+
+# ---------------- Precompiled templates ----------------
+INTENT_TEMPLATE = PromptTemplate(
+    "intent",
+    f"{_INTENT_INSTRUCTION}\n\n{_INTENT_CONTEXT}\n\n{_INTENT_ROLE}\n\n"
+    f"{_INTENT_EXAMPLES}\n\n{_INTENT_OUTPUT_FORMAT}\n\n",
+)
+CHATBOT_TEMPLATE = PromptTemplate(
+    "chatbot",
+    f"{_CHATBOT_INSTRUCTION}\n\n{_CHATBOT_ROLE}\n\n{_CHATBOT_EXAMPLES}\n\n"
+    f"{_CHATBOT_OUTPUT_FORMAT}\n\n",
+)
+FUSED_TEMPLATE = PromptTemplate(
+    "fused",
+    f"{_FUSED_INSTRUCTION}\n\n{_FUSED_ROLE}\n\n{_FUSED_EXAMPLES}\n\n"
+    f"{_FUSED_OUTPUT_FORMAT}\n\n",
+)
+
+
+@metrics.span("span_duration_seconds", span="prompt_build")
+def build_gemini_prompt(user_query: str) -> str:
+    """
+    Constructs a prompt for Gemini Pro with proper prompt strategy:
+    Instruction, Context, Examples, Role, Output Format.
+
+    Args:
+        user_query (str): The query from the user.
+
+    Returns:
+        str: The formatted prompt ready to send to Gemini.
+    """
+    return INTENT_TEMPLATE.render('User Query: "', user_query, '"\nResponse:')
+
+
+@metrics.span("span_duration_seconds", span="prompt_build")
+def build_chatbot_prompt(
+    user_query: str, conversation_history: list, summary: str = ""
+) -> str:
+    """
+    Builds a chatbot-style prompt with conversation memory and step-based flow.
+    Gemini thinks like it's guiding the user inside an app/website and provides
+    natural stepwise instructions with embedded links for each step.
+
+    The conversation history follows the static prefix so the prefix can be
+    reused across requests.
+
+    Args:
+        user_query (str): The latest query from the user.
+        conversation_history (list): List of dicts with {"role": str, "content": str}.
+        summary (str): Optional running summary of turns older than the window.
+
+    Returns:
+        str: The formatted prompt for Gemini.
+    """
+    return CHATBOT_TEMPLATE.render(
+        _format_history(conversation_history, summary),
+        '\n\nUser Query: "',
+        user_query,
+        '"\nResponse:',
     )
 
-    return prompt
+
+@metrics.span("span_duration_seconds", span="prompt_build")
+def build_fused_prompt(
+    user_query: str, conversation_history: list, summary: str = ""
+) -> str:
+    """
+    Builds a single prompt that classifies intent AND, for 'ready_to_invest',
+    picks the purchase stage, so one Gemini call replaces the
+    build_gemini_prompt -> build_chatbot_prompt pair.
+
+    Args:
+        user_query (str): The latest query from the user.
+        conversation_history (list): List of dicts with {"role": str, "content": str}.
+        summary (str): Optional running summary of turns older than the window.
+
+    Returns:
+        str: The formatted prompt for Gemini.
+    """
+    return FUSED_TEMPLATE.render(
+        _format_history(conversation_history, summary),
+        '\n\nUser Query: "',
+        user_query,
+        '"\nResponse:',
+    )
@@ -0,0 +1,139 @@
+# core/purchase_fsm.py
+"""
+Purchase journey state machine.
+
+The state is the ``step`` of the user's open ``PurchaseSession``, so it is
+stored in the same table as the order data and survives restarts and
+workers:
+
+    (none) -> OFFERED -> KYC -> QUANTITY -> PAYMENT -> VAULT_CONFIRM -> POST_BUY
+
+``OFFERED`` is written when the chat offers to start a purchase
+(``ready_to_buy``); each later state is written by its gold purchase step.
+From any state the only forward move is the next step, so a confirmation
+("ok", "done", "yes") can be acted on without asking Gemini which step the
+user meant. The one exception: at ``QUANTITY`` with the price quote expired,
+the quantity step runs again for a fresh quote before payment.
+"""
+import os
+import re
+from typing import Optional
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core import metrics
+from core.intent_cache import normalize_query
+from database.models import PurchaseSession
+from routers.gold_purchase import get_open_purchase, quote_expired
+
+PURCHASE_FSM_ENABLED = os.getenv("PURCHASE_FSM_ENABLED", "1") == "1"
+
+OFFERED = "OFFERED"
+# State -> chat stage that advances it (the stage runs the matching step)
+NEXT_STAGE = {
+    OFFERED: "buy_step_1",
+    "KYC": "buy_step_2",
+    "QUANTITY": "buy_step_3",
+    "PAYMENT": "buy_step_4",
+    "VAULT_CONFIRM": "buy_step_5",
+}
+# Without an open purchase the journey starts at KYC
+FIRST_STAGE = "buy_step_1"
+
+_STAGE_ANSWERS = {
+    "buy_step_1": "Step 1: Creating your account (KYC).",
+    "buy_step_2": "Step 2: Setting the quantity of gold.",
+    "buy_step_3": "Step 3: Processing your payment.",
+    "buy_step_4": "Step 4: Confirming vault storage.",
+    "buy_step_5": "Step 5: Generating your receipt.",
+}
+
+# A confirmation is a short message made only of these words, at least one
+# of which says yes. Anything else ("ok but what is the price?", "no",
+# "wait") is a free-form turn and goes to the usual intent flow.
+_YES = {
+    "ok", "okay", "k", "kk", "done", "yes", "y", "yep", "yeah", "yup", "sure",
+    "continue", "next", "proceed", "confirm", "confirmed", "paid", "complete",
+    "completed", "finished", "go",
+}
+_FILLER = {
+    "ahead", "please", "pls", "it", "with", "the", "is", "i", "have", "ve", "am",
+    "m", "thanks", "thank", "you", "and", "now", "step", "payment", "vault",
+    "kyc", "quantity", "receipt", "let", "s", "lets", "all", "good", "great",
+}
+_MAX_CONFIRMATION_WORDS = 6
+_WORD = re.compile(r"[a-z]+")
+
+
+def is_confirmation(query: str) -> bool:
+    words = _WORD.findall(normalize_query(query))
+    if not words or len(words) > _MAX_CONFIRMATION_WORDS:
+        return False
+    return all(w in _YES or w in _FILLER for w in words) and any(w in _YES for w in words)
+
+
+async def next_stage(session: AsyncSession, user_id: int) -> Optional[str]:
+    """The stage that advances the user's open purchase, or None if there is none."""
+    purchase = await get_open_purchase(session, user_id)
+    if purchase is None:
+        return None
+    if purchase.step == "QUANTITY" and quote_expired(purchase):
+        metrics.incr("chat_fsm_total", outcome="requoted")
+        return NEXT_STAGE["KYC"]  # payment would be refused: quote again
+    return NEXT_STAGE.get(purchase.step)
+
+
+async def resolve_stage(
+    session: AsyncSession, user_id: int, stage: str, mode: str
+) -> str:
+    """
+    Replace a model-chosen ``buy_step_N`` with the one the persisted state
+    allows. The model still decides *whether* the user is moving on; the
+    state machine decides *which* step that is. Other stages pass through.
+    Corrections are counted per prompt ``mode``, to compare how often each
+    mode's model picks the wrong step.
+    """
+    if not stage.startswith("buy_step_"):
+        return stage
+    expected = await next_stage(session, user_id) or FIRST_STAGE
+    if expected != stage:
+        metrics.incr("chat_fsm_total", mode=mode, outcome="stage_corrected")
+    return expected
+
+
+async def offer(session: AsyncSession, user_id: int):
+    """Record that a purchase was offered, unless one is already open."""
+    if await get_open_purchase(session, user_id) is not None:
+        return
+    session.add(PurchaseSession(user_id=user_id, step=OFFERED))
+    await session.commit()
+
+
+def stage_response(query: str, stage: str) -> dict:
+    """Chat response for a turn the state machine answered on its own."""
+    return {
+        "query": query,
+        "source": "fsm",
+        "intent": "ready_to_invest",
+        "stage": stage,
+        "answer": _STAGE_ANSWERS[stage],
+        "buy_link": "",
+        "meta": {"confidence": 1.0},
+    }
+
+
+async def confirmation_turn(
+    session: AsyncSession, user_id: int, query: str
+) -> Optional[dict]:
+    """
+    Response for ``query`` if it is a confirmation in an open purchase;
+    None means the turn needs the regular (LLM) flow.
+    """
+    if not PURCHASE_FSM_ENABLED or not is_confirmation(query):
+        return None
+    stage = await next_stage(session, user_id)
+    if stage is None:
+        metrics.incr("chat_fsm_total", outcome="no_open_purchase")
+        return None
+    metrics.incr("chat_fsm_total", outcome="advanced")
+    return stage_response(query, stage)
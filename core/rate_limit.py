@@ -0,0 +1,221 @@
+# core/rate_limit.py
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from jose import JWTError
+
+from core import metrics
+from core.auth import token_cache
+from core.security import decode_access_token
+from services.gemini_client import GeminiOverloaded
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# "memory" (per worker) or "sqlite" (buckets shared by all workers on a host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "./rate_limit.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Per route: "<requests>/<seconds>[:<burst>]"; empty disables the route's limit.
+RATE_LIMIT_CHAT = os.getenv("RATE_LIMIT_CHAT", "30/60:10")
+RATE_LIMIT_CHAT_BATCH = os.getenv("RATE_LIMIT_CHAT_BATCH", "5/60:2")
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/60:5")
+
+
+class Limit(NamedTuple):
+    """Token bucket: holds up to ``burst`` tokens, refilled at ``rate`` per second."""
+
+    rate: float
+    burst: float
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    """``"30/60:10"`` -> 30 requests per 60 s with bursts of 10 (burst defaults to 30)."""
+    spec = spec.strip()
+    if not spec:
+        return None
+    quota, _, burst = spec.partition(":")
+    requests, _, seconds = quota.partition("/")
+    requests = float(requests)
+    if requests <= 0:
+        return None
+    return Limit(rate=requests / float(seconds or 1), burst=float(burst or requests))
+
+
+class InMemoryBuckets:
+    """Buckets for this worker; least recently used keys are dropped beyond ``max_keys``."""
+
+    blocking = False  # take() is cheap enough to run on the event loop
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, cost: float = 1, now: Optional[float] = None) -> float:
+        """Spend ``cost`` tokens; 0 if admitted, else seconds until they are available."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            wait = _spend(tokens, cost, limit)
+            self._buckets[key] = (tokens - cost if wait == 0 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBuckets:
+    """
+    Buckets in a SQLite file shared by every worker on the host. Each take is
+    one ``BEGIN IMMEDIATE`` transaction, so concurrent workers never both
+    spend the same token. That may wait on the file lock, so the middleware
+    runs it in a thread (one connection per thread).
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_bucket ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, cost: float = 1, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (limit.burst, now)
+            tokens = min(limit.burst, tokens + max(0.0, now - updated) * limit.rate)
+            wait = _spend(tokens, cost, limit)
+            conn.execute(
+                "INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated_at = excluded.updated_at",
+                (key, tokens - cost if wait == 0 else tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def _spend(tokens: float, cost: float, limit: Limit) -> float:
+    if tokens >= cost:
+        return 0.0
+    return (cost - tokens) / limit.rate
+
+
+def create_buckets(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "sqlite":
+        logger.info(f"Using SQLite rate limit buckets at {RATE_LIMIT_DB_PATH}")
+        return SQLiteBuckets()
+    return InMemoryBuckets()
+
+
+def default_rules() -> Dict[str, Tuple[str, Optional[Limit]]]:
+    """Path -> (bucket name, limit). /chat/stream shares the /chat bucket."""
+    chat = parse_limit(RATE_LIMIT_CHAT)
+    return {
+        "/chat": ("chat", chat),
+        "/chat/stream": ("chat", chat),
+        "/chat/batch": ("chat_batch", parse_limit(RATE_LIMIT_CHAT_BATCH)),
+        "/auth/login": ("login", parse_limit(RATE_LIMIT_LOGIN)),
+    }
+
+
+def _client_identity(scope: dict, by_user: bool) -> str:
+    """``user:<id>`` for a valid bearer token (when ``by_user``), else ``ip:<addr>``."""
+    if by_user:
+        for name, value in scope.get("headers", ()):
+            if name != b"authorization":
+                continue
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                break
+            user = token_cache.get(token)
+            if user is not None:
+                return f"user:{user.id}"
+            try:
+                return f"user:{int(decode_access_token(token)['sub'])}"
+            except (JWTError, KeyError, TypeError, ValueError):
+                break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def too_many_requests(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a per-client token bucket to selected routes.
+
+    Chat routes are limited per user (by bearer token) and fall back to the
+    client address; login is always limited per address, since it is the
+    credential-stuffing target. Rejected requests get 429 with Retry-After
+    before any handler, dependency or LLM call runs.
+    """
+
+    def __init__(self, app, rules=None, buckets=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.rules = default_rules() if rules is None else rules
+        self.buckets = buckets if buckets is not None else create_buckets()
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rules.get(scope.get("path")) if scope["type"] == "http" else None
+        if not self.enabled or rule is None or rule[1] is None:
+            await self.app(scope, receive, send)
+            return
+        name, limit = rule
+        identity = _client_identity(scope, by_user=name != "login")
+        if self.buckets.blocking:
+            wait = await asyncio.to_thread(self.buckets.take, f"{name}:{identity}", limit)
+        else:
+            wait = self.buckets.take(f"{name}:{identity}", limit)
+        if wait:
+            metrics.incr("rate_limit_requests_total", route=name, outcome="limited")
+            response = too_many_requests("Rate limit exceeded, please slow down", wait)
+            await response(scope, receive, send)
+            return
+        metrics.incr("rate_limit_requests_total", route=name, outcome="allowed")
+        await self.app(scope, receive, send)
+
+
+async def gemini_overloaded_handler(request: Request, exc: GeminiOverloaded) -> JSONResponse:
+    """Admission control shed the request's LLM call: tell the client to back off."""
+    return too_many_requests(str(exc), exc.retry_after)
@@ -0,0 +1,62 @@
+# core/request_metrics.py
+"""
+Request-level latency for every HTTP route.
+
+``MetricsMiddleware`` times each request from its first byte in to its last
+byte out (so streamed answers count in full) into
+``http_request_duration_seconds{method, route}`` and counts it in
+``http_requests_total{method, route, status}``. ``route`` is the route's path
+template (``/api/gold/kyc``), never the raw path, so the label set stays
+small. Everything is served in Prometheus format by ``routers.metrics``.
+"""
+import os
+import time
+
+from starlette.routing import Match
+
+from core import metrics
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        # Answered before routing (e.g. rate limited): match it ourselves
+        app = scope.get("app")
+        for candidate in getattr(app, "routes", ()):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    def __init__(self, app, enabled: bool = METRICS_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500  # unless a response starts
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route, method = _route_label(scope), scope["method"]
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                method=method,
+                route=route,
+            )
+            metrics.incr("http_requests_total", method=method, route=route, status=str(status))
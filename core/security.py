@@ -2,11 +2,17 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import jwt
+from functools import lru_cache
+from typing import Optional, Tuple
 import logging
+import os
 
+# bcrypt work factor for new hashes; existing hashes at another cost are
+# rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = "change_this_secret_for_production"
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change_this_secret_for_production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
@@ -14,9 +20,16 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def hash_password(password: str) -> str:
+@lru_cache(maxsize=None)
+def _context_for(rounds: int) -> CryptContext:
+    if rounds == BCRYPT_ROUNDS:
+        return pwd_context
+    return pwd_context.copy(bcrypt__rounds=rounds)
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
     logger.debug("Hashing password.")
-    return pwd_context.hash(password)
+    return _context_for(rounds).hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,6 +37,28 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def bcrypt_cost(hashed_password: str) -> Optional[int]:
+    """Work factor of a ``$2b$12$...`` hash, or None if it is not bcrypt."""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def verify_and_rehash(
+    plain_password: str, hashed_password: str, rounds: int = BCRYPT_ROUNDS
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify, and if the password matches a hash made at a different cost than
+    ``rounds``, also return a fresh hash to store (else None).
+    """
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if bcrypt_cost(hashed_password) == rounds:
+        return True, None
+    return True, hash_password(plain_password, rounds)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     logger.info(f"Creating access token for: {data}")
     to_encode = data.copy()
@@ -36,3 +71,12 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify an HS256 access token (signature and ``exp``) and return its claims.
+
+    Raises ``JWTError`` if the token is invalid or expired.
+    """
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
@@ -0,0 +1,266 @@
+# core/structured_output.py
+"""
+Structured (JSON) output for the chat prompts.
+
+Each prompt template has a response model here, keyed by the template name
+("intent", "chatbot", "fused"):
+
+* ``response_schema(name)`` is the JSON schema sent to Gemini, together with
+  ``response_mime_type="application/json"``, so the model emits bare JSON.
+* ``parse(text, name)`` turns response text into a dict even when the model
+  wraps it in code fences or surrounds it with prose, then validates and
+  normalises it against the model. Every parse is counted in
+  ``llm_parse_total{schema, outcome}``.
+* ``validate(data, name)`` is the strict check on its own, for callers that
+  must reject a response rather than use it as extracted.
+"""
+import json
+import re
+from typing import Any, Dict, Literal, Optional, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+from core import metrics
+from core.prompts import CATEGORIES, INTENTS, STAGES
+
+# outcome label: how the JSON was found, or why it was not usable
+DIRECT, FENCED, SCANNED, INVALID, FAILED = "direct", "fenced", "scanned", "invalid", "failed"
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+# Candidate "{" positions tried by the object scan before giving up
+_MAX_SCAN_STARTS = 20
+_decoder = json.JSONDecoder()
+
+_CATEGORY_INTENTS = {"gold": "gold_related", "finance": "general_finance", "irrelevant": "irrelevant"}
+_INTENT_CATEGORIES = {
+    "gold_related": "gold",
+    "ready_to_invest": "gold",
+    "general_finance": "finance",
+    "other_investments": "finance",
+    "irrelevant": "irrelevant",
+}
+
+
+class _Output(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    query: str = ""
+    source: str = "gemini"
+    answer: str
+    meta: Dict[str, Any] = {}
+
+    @field_validator("intent", "category", "stage", mode="before", check_fields=False)
+    @classmethod
+    def _lowercase(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator("meta", mode="before")
+    @classmethod
+    def _meta_object(cls, value):
+        return value if isinstance(value, dict) else {}
+
+
+class IntentOutput(_Output):
+    intent: Optional[Literal[INTENTS]] = None
+    category: Optional[Literal[CATEGORIES]] = None
+
+    @model_validator(mode="after")
+    def _intent_from_category(self):
+        # The prompt's own examples sometimes give only a category
+        if self.intent is None and self.category is not None:
+            self.intent = _CATEGORY_INTENTS[self.category]
+        return self
+
+
+class ChatbotOutput(_Output):
+    stage: Literal[STAGES] = "exploration"
+    buy_link: str = ""
+
+    @field_validator("stage", "buy_link", mode="before")
+    @classmethod
+    def _empty_is_default(cls, value, info):
+        if value is None or value == "":
+            return "exploration" if info.field_name == "stage" else ""
+        return value
+
+
+class FusedOutput(ChatbotOutput):
+    intent: Literal[INTENTS]
+    category: Optional[Literal[CATEGORIES]] = None
+
+    @field_validator("answer")
+    @classmethod
+    def _answer_not_blank(cls, value):
+        if not value.strip():
+            raise ValueError("answer must be a non-empty string")
+        return value
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _unknown_category_is_derived(cls, value):
+        value = value.strip().lower() if isinstance(value, str) else value
+        return value if value in CATEGORIES else None
+
+    @model_validator(mode="after")
+    def _purchase_fields_only_when_investing(self):
+        # Only a ready_to_invest turn moves through the purchase stages
+        if self.intent != "ready_to_invest":
+            self.stage, self.buy_link = "exploration", ""
+        if self.category is None:
+            self.category = _INTENT_CATEGORIES[self.intent]
+        return self
+
+
+SCHEMAS: Dict[str, Type[_Output]] = {
+    "intent": IntentOutput,
+    "chatbot": ChatbotOutput,
+    "fused": FusedOutput,
+}
+
+
+def _string(*enum: str) -> dict:
+    return {"type": "string", "enum": list(enum)} if enum else {"type": "string"}
+
+
+_META = {
+    "type": "object",
+    "properties": {"confidence": {"type": "number"}, "gold_price": {"type": "number"}},
+}
+_RESPONSE_SCHEMAS = {
+    "intent": {
+        "type": "object",
+        "properties": {
+            "query": _string(),
+            "source": _string(),
+            "intent": _string(*INTENTS),
+            "category": _string(*CATEGORIES),
+            "answer": _string(),
+            "meta": _META,
+        },
+        "required": ["intent", "answer"],
+    },
+    "chatbot": {
+        "type": "object",
+        "properties": {
+            "query": _string(),
+            "source": _string(),
+            "stage": _string(*STAGES),
+            "answer": _string(),
+            "buy_link": _string(),
+            "meta": _META,
+        },
+        "required": ["stage", "answer"],
+    },
+    "fused": {
+        "type": "object",
+        "properties": {
+            "query": _string(),
+            "source": _string(),
+            "intent": _string(*INTENTS),
+            "category": _string(*CATEGORIES),
+            "stage": _string(*STAGES),
+            "answer": _string(),
+            "buy_link": _string(),
+            "meta": _META,
+        },
+        "required": ["intent", "stage", "answer"],
+    },
+}
+
+
+def response_schema(name: Optional[str]) -> Optional[dict]:
+    """Gemini ``response_schema`` for the prompt ``name``, if it has one."""
+    return _RESPONSE_SCHEMAS.get(name) if name else None
+
+
+def validate(data: Any, schema: str) -> dict:
+    """
+    ``data`` validated and normalised against the ``schema`` model.
+
+    Raises:
+        ValueError: If ``data`` is not an object or does not fit the model.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"{schema} response must be a JSON object")
+    return SCHEMAS[schema].model_validate(data).model_dump(exclude_none=True)
+
+
+def extract_json(text: str) -> Tuple[Any, str]:
+    """
+    First JSON value in ``text`` and how it was found: the whole text, the
+    body of a ```json fence, or the first ``{`` from which a complete object
+    decodes (trailing prose ignored).
+
+    Raises:
+        ValueError: If ``text`` holds no decodable JSON object.
+    """
+    stripped = text.strip()
+    try:
+        return json.loads(stripped), DIRECT
+    except ValueError:
+        pass
+
+    for body in _FENCE.findall(stripped):
+        try:
+            return json.loads(body), FENCED
+        except ValueError:
+            continue
+
+    start = stripped.find("{")
+    for _ in range(_MAX_SCAN_STARTS):
+        if start < 0:
+            break
+        try:
+            return _decoder.raw_decode(stripped, start)[0], SCANNED
+        except ValueError:
+            start = stripped.find("{", start + 1)
+    raise ValueError("no JSON object in response")
+
+
+def parse(text: str, schema: Optional[str] = None) -> dict:
+    """
+    Parsed response object for prompt ``schema``. A response that fails its
+    model is still returned as extracted (counted as ``invalid``), since a
+    partly valid answer beats a fallback.
+
+    Raises:
+        ValueError: If no JSON object could be extracted.
+    """
+    label = schema or "none"
+    with metrics.span("span_duration_seconds", span="llm_parse"):
+        return _parse(text, schema, label)
+
+
+def _parse(text: str, schema: Optional[str], label: str) -> dict:
+    try:
+        data, how = extract_json(text)
+    except ValueError:
+        metrics.incr("llm_parse_total", schema=label, outcome=FAILED)
+        raise
+    if not isinstance(data, dict):
+        metrics.incr("llm_parse_total", schema=label, outcome=FAILED)
+        raise ValueError("response JSON is not an object")
+
+    if schema in SCHEMAS:
+        try:
+            data = validate(data, schema)
+        except ValidationError:
+            metrics.incr("llm_parse_total", schema=label, outcome=INVALID)
+            return data
+    metrics.incr("llm_parse_total", schema=label, outcome=how)
+    return data
+
+
+def parse_stats() -> dict:
+    """Per-schema parse outcomes and failure rate (failed or invalid / total)."""
+    stats = {}
+    for name in (*SCHEMAS, "none"):
+        counts = {
+            outcome: metrics.get_counter("llm_parse_total", schema=name, outcome=outcome)
+            for outcome in (DIRECT, FENCED, SCANNED, INVALID, FAILED)
+        }
+        total = sum(counts.values())
+        if total:
+            bad = counts[INVALID] + counts[FAILED]
+            stats[name] = {**counts, "total": total, "failure_rate": round(bad / total, 4)}
+    return stats
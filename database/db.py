@@ -1,21 +1,145 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 import logging
+import os
 
-DATABASE_URL = "sqlite:///./dev.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
+# Connection pool (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# SQLite only: how long a writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+def _is_memory_sqlite(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:") or "mode=memory" in url
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: readers never block the writer and a commit appends to the log
+    # instead of rewriting pages; NORMAL only fsyncs at checkpoints.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL, **kwargs):
+    """
+    Engine for ``url``. SQLite gets the connect-time pragmas above and a
+    QueuePool (StaticPool for in-memory databases, which live and die with
+    their single connection); other backends get a pre-pinged QueuePool.
+    """
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if _is_memory_sqlite(url):
+            kwargs.setdefault("poolclass", StaticPool)
+        else:
+            kwargs.setdefault("poolclass", QueuePool)
+            kwargs.setdefault("pool_size", DB_POOL_SIZE)
+            kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        db_engine = create_engine(url, connect_args=connect_args, **kwargs)
+        event.listen(db_engine, "connect", _sqlite_pragmas)
+        return db_engine
+
+    kwargs.setdefault("pool_size", DB_POOL_SIZE)
+    kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    return create_engine(url, pool_pre_ping=True, **kwargs)
+
+
+# Async drivers for the plain URLs accepted in DATABASE_URL
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else url
+
+
+def create_async_db_engine(url: str = DATABASE_URL, **kwargs):
+    """Async counterpart of ``create_db_engine``, with the same SQLite pragmas."""
+    url = async_database_url(url)
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if _is_memory_sqlite(url):
+            kwargs.setdefault("poolclass", StaticPool)
+        else:
+            kwargs.setdefault("pool_size", DB_POOL_SIZE)
+            kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        db_engine = create_async_engine(url, connect_args=connect_args, **kwargs)
+        event.listen(db_engine.sync_engine, "connect", _sqlite_pragmas)
+        return db_engine
+
+    kwargs.setdefault("pool_size", DB_POOL_SIZE)
+    kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    return create_async_engine(url, pool_pre_ping=True, **kwargs)
+
+
+# Sync engine: schema management, scripts and benchmarks
+engine = create_db_engine()
+# Async engine: every request handler
+async_engine = create_async_db_engine()
+async_session_maker = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
 def init_db():
     """Initialize database and create tables if they do not exist."""
     logger.info("Initializing database and creating tables...")
     SQLModel.metadata.create_all(engine)
+    migrate_db()
+
+
+def migrate_db(db_engine=None):
+    """
+    Bring an existing database up to the current models. ``create_all`` skips
+    tables that already exist, so nullable columns and indexes added to a
+    model later are created here (idempotently).
+    """
+    db_engine = db_engine or engine
+    with db_engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspect(conn).has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                )
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
 
 
-def get_session():
-    """Get a DB session generator for dependency injection."""
+async def get_session():
+    """Get an async DB session for dependency injection."""
     logger.debug("Creating new DB session.")
+    async with async_session_maker() as session:
+        yield session
+
+
+def get_sync_session():
+    """Blocking session, for code that runs outside the event loop."""
     with Session(engine) as session:
         yield session
+
+
+async def close_db():
+    await async_engine.dispose()
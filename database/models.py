@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 import logging
 
@@ -20,6 +21,12 @@ class User(SQLModel, table=True):
 
 
 class GoldOrder(SQLModel, table=True):
+    __table_args__ = (
+        # Latest order / full history of a user, and "has this user done step X"
+        Index("ix_goldorder_user_id_id", "user_id", "id"),
+        Index("ix_goldorder_user_id_step", "user_id", "step"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     step: str  # KYC, QUANTITY, PAYMENT, VAULT_CONFIRM, POST_BUY
@@ -33,3 +40,50 @@ class GoldOrder(SQLModel, table=True):
             f"GoldOrder __repr__ called for user_id: {self.user_id}, step: {self.step}"
         )
         return f"<GoldOrder id={self.id} user_id={self.user_id} step={self.step}>"
+
+
+class PurchaseSession(SQLModel, table=True):
+    """
+    Current state of one purchase, updated in place by each step. The
+    per-step GoldOrder rows remain the append-only audit log.
+    """
+
+    __table_args__ = (Index("ix_purchasesession_user_id_id", "user_id", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    # Last completed step, same names as GoldOrder.step; OFFERED before KYC
+    # when the chat started the journey (see core.purchase_fsm)
+    step: str
+    kyc_details: Optional[str] = None
+    quantity_grams: Optional[float] = None
+    # Set by the quantity step: the price ``amount`` was quoted at, honoured
+    # by the payment step until ``quote_expires_at``
+    amount: Optional[float] = None
+    quote_price: Optional[float] = None
+    quote_expires_at: Optional[datetime] = None
+    payment_method: Optional[str] = None
+    transaction_id: Optional[str] = None
+    wallet_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<PurchaseSession id={self.id} user_id={self.user_id} step={self.step}>"
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    """
+    Response of a gold purchase step, replayed for retries with the same
+    ``Idempotency-Key`` (see core.idempotency). The row is claimed before the
+    step runs, so ``response`` is NULL while the first request is running.
+    """
+
+    user_id: int = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    fingerprint: str  # hash of the step and request body the key was first used for
+    response: Optional[str] = None  # JSON
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<IdempotencyRecord user_id={self.user_id} key={self.key}>"
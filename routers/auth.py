@@ -1,10 +1,12 @@
 ### routers/auth.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from database.models import User
-from database.db import engine
-from core.security import hash_password, verify_password, create_access_token
+from database.db import get_session
+from core.password_hasher import HasherSaturated, password_hasher
+from core.security import create_access_token
 from sqlalchemy.exc import IntegrityError
 import logging
 
@@ -15,6 +17,15 @@ logging.basicConfig(level=logging.INFO)
 router = APIRouter()
 
 
+def _busy() -> HTTPException:
+    # Hashing queue full: shed load now rather than time out later
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 class SignupRequest(BaseModel):
     name: str
     email: EmailStr
@@ -32,40 +43,56 @@ class LoginRequest(BaseModel):
 
 
 @router.post("/signup", response_model=AuthResponse)
-def signup(payload: SignupRequest):
+async def signup(payload: SignupRequest, session: AsyncSession = Depends(get_session)):
     logger.info(f"Signup attempt for email: {payload.email}")
+    try:
+        password_hash = await password_hasher.hash(payload.password)
+    except HasherSaturated:
+        raise _busy()
     user = User(
         name=payload.name,
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=password_hash,
     )
-    from sqlmodel import Session
-
-    with Session(engine) as session:
-        try:
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-            logger.info(f"User created: {user}")
-        except IntegrityError:
-            logger.warning(f"Signup failed: Email already registered - {payload.email}")
-            raise HTTPException(status_code=400, detail="Email already registered")
-        access_token = create_access_token({"sub": str(user.id), "email": user.email})
+    try:
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+        logger.info(f"User created: {user}")
+    except IntegrityError:
+        logger.warning(f"Signup failed: Email already registered - {payload.email}")
+        raise HTTPException(status_code=400, detail="Email already registered")
+    access_token = create_access_token({"sub": str(user.id), "email": user.email})
     logger.info(f"Signup successful, token issued for: {user.email}")
     return {"access_token": access_token}
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(payload: LoginRequest):
+async def login(payload: LoginRequest, session: AsyncSession = Depends(get_session)):
     logger.info(f"Login attempt for email: {payload.email}")
-    from sqlmodel import Session
-
-    with Session(engine) as session:
-        statement = select(User).where(User.email == payload.email)
-        user = session.exec(statement).first()
-        if not user or not verify_password(payload.password, user.password_hash):
-            logger.warning(f"Login failed for email: {payload.email}")
-            raise HTTPException(status_code=401, detail="Invalid credentials")
+    statement = select(User).where(User.email == payload.email)
+    user = (await session.exec(statement)).first()
+    if not user:
+        logger.warning(f"Login failed for email: {payload.email}")
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        valid, new_hash = await password_hasher.verify(payload.password, user.password_hash)
+    except HasherSaturated:
+        raise _busy()
+    if not valid:
+        logger.warning(f"Login failed for email: {payload.email}")
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # bcrypt cost changed since this hash was made
+        user.password_hash = new_hash
+        session.add(user)
+        await session.commit()
     access_token = create_access_token({"sub": str(user.id), "email": user.email})
     logger.info(f"Login successful, token issued for: {user.email}")
     return {"access_token": access_token}
+
+
+@router.get("/stats")
+async def auth_stats():
+    """Password hashing pool: queue depth and rejections."""
+    return password_hasher.stats()
@@ -1,29 +1,135 @@
-from fastapi import APIRouter, Query, Depends
-from sqlmodel import Session
+import json
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Query, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from core.auth import CurrentUser, get_current_user
 from database.db import get_session
-from core.chat_flow import process_user_query
-from core.chat_manager import clear_history
+from core.chat_flow import (
+    CHAT_BATCH_CONCURRENCY,
+    CHAT_BATCH_MAX_ITEMS,
+    process_batch,
+    process_user_query,
+    prompt_ab_summary,
+    stream_user_query,
+)
+from core.chat_manager import clear_history_async, history_store
+from core.intent_cache import intent_cache
+from core.structured_output import parse_stats
+from services.gemini_client import get_gemini_client
+from services.gold_price import PriceSnapshot, get_price_snapshot
 
 router = APIRouter()
 
 
+class BatchItem(BaseModel):
+    query: str
+    # Items naming the same conversation share its history and run in order;
+    # items without one are answered independently, with no history.
+    conversation: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: Optional[int] = None  # may lower, never raise, the server limit
+
+
 @router.post("/chat")
 async def chat(
-    user_id: str = Query(...),
     query: str = Query(...),
-    session: Session = Depends(get_session),  # <-- inject DB session
+    user: CurrentUser = Depends(get_current_user),  # identity from the bearer token
+    session: AsyncSession = Depends(get_session),  # <-- inject DB session
+    price: PriceSnapshot = Depends(get_price_snapshot),  # fetched at most once
 ):
     """
     Chat endpoint with history support.
     """
-    response = await process_user_query(user_id, query, session)  # pass session here
+    response = await process_user_query(str(user.id), query, session, price)
     return response
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    query: str = Query(...),
+    user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+    price: PriceSnapshot = Depends(get_price_snapshot),
+):
+    """
+    Same as /chat, streamed as Server-Sent Events: ``token`` events carry
+    answer text as it is generated, then one ``final`` event carries the
+    structured response (intent, stage, buy_link, ...).
+    """
+
+    async def events():
+        async for event, data in stream_user_query(str(user.id), query, session, price):
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/chat/batch")
+async def chat_batch(
+    req: ChatBatchRequest,
+    user: CurrentUser = Depends(get_current_user),
+    price: PriceSnapshot = Depends(get_price_snapshot),
+):
+    """
+    Run many chat queries in one request. Results are returned in item
+    order; a failed item is reported in place without failing the batch.
+    Batch items never run purchase steps.
+    """
+    if len(req.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {CHAT_BATCH_MAX_ITEMS} items per batch"
+        )
+    start = time.perf_counter()
+    concurrency = CHAT_BATCH_CONCURRENCY
+    if req.concurrency:
+        concurrency = max(1, min(req.concurrency, CHAT_BATCH_CONCURRENCY))
+    results = await process_batch(
+        [(str(user.id), item.query, item.conversation) for item in req.items],
+        price,
+        concurrency,
+    )
+    return {
+        "results": results,
+        "items": len(results),
+        "unique": sum(1 for r in results if "duplicate_of" not in r),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
 @router.post("/chat/clear")
-async def clear_chat(user_id: str = Query(...)):
+async def clear_chat(user: CurrentUser = Depends(get_current_user)):
     """
     Clear conversation history for a user.
     """
-    clear_history(user_id)
-    return {"message": f"Chat history cleared for user {user_id}"}
+    await clear_history_async(str(user.id))
+    return {"message": f"Chat history cleared for user {user.id}"}
+
+
+@router.get("/chat/stats")
+async def chat_stats():
+    """
+    Cache and flow counters for the chat pipeline.
+    """
+    return {
+        "intent_cache": intent_cache.stats(),
+        "history": history_store.stats(),
+        "prompt_ab": prompt_ab_summary(),
+        "llm_admission": get_gemini_client().stats(),
+        "llm_parsing": parse_stats(),
+    }
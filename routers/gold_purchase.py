@@ -1,69 +1,158 @@
 # routers/gold_purchase.py
 from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from sqlalchemy import bindparam
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import uuid
 import logging
+import os
 
+from core.auth import CurrentUser, get_current_user
+from core.idempotency import idempotent
 from database.db import get_session
-from database.models import User, GoldOrder
-from services.gold_price import get_live_gold_price  # assumes you have this function
+from database.models import User, GoldOrder, PurchaseSession
+from services.gold_price import QUOTE_LOCK_SECONDS, PriceSnapshot, get_price_snapshot
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/gold", tags=["gold_purchase"])
 
+# An unfinished purchase untouched for this long is abandoned: steps and the
+# chat no longer pick it up.
+PURCHASE_SESSION_TTL_SECONDS = float(os.getenv("PURCHASE_SESSION_TTL_SECONDS", "3600"))
+
+# Built once and bound per call; served by the (user_id, id) index.
+LATEST_PURCHASE_QUERY = (
+    select(PurchaseSession)
+    .where(PurchaseSession.user_id == bindparam("user_id"))
+    .order_by(PurchaseSession.id.desc())
+    .limit(1)
+)
+
+
+# Steps a purchase may be at when its quantity is (re)set
+QUANTITY_FROM_STEPS = ("OFFERED", "KYC", "QUANTITY")
+
 
 # ---------------- Request Schemas ----------------
+# The user comes from the bearer token. ``session_id`` (returned by every
+# step) addresses a purchase directly; without it the user's open purchase
+# is used. Every step also accepts an ``Idempotency-Key`` header: retries
+# with the same key replay the first response instead of running again.
 class KYCRequest(BaseModel):
-    user_id: int
     kyc_details: str  # basic details: name, email, phone
 
 
 class QuantityRequest(BaseModel):
-    user_id: int
     grams: Optional[float] = None
     amount: Optional[float] = None
+    session_id: Optional[int] = None
 
 
 class PaymentRequest(BaseModel):
-    user_id: int
     payment_method: str
     amount: float
+    session_id: Optional[int] = None
 
 
 class VaultRequest(BaseModel):
-    user_id: int
     confirm: bool
+    session_id: Optional[int] = None
 
 
 class ReceiptRequest(BaseModel):
-    user_id: int
+    session_id: Optional[int] = None
+
+
+# ---------------- Purchase session helpers ----------------
+async def get_open_purchase(
+    session: AsyncSession, user_id: int, session_id: Optional[int] = None
+) -> Optional[PurchaseSession]:
+    """The user's purchase in progress: a primary-key read when ``session_id``
+    is known, else the user's latest purchase, unless it is already complete
+    or has been idle for ``PURCHASE_SESSION_TTL_SECONDS``."""
+    if session_id is not None:
+        purchase = await session.get(PurchaseSession, session_id)
+        if purchase is None or purchase.user_id != user_id:
+            return None
+    else:
+        result = await session.exec(LATEST_PURCHASE_QUERY, params={"user_id": user_id})
+        purchase = result.first()
+    if purchase is None or purchase.step == "POST_BUY":
+        return None
+    idle = datetime.now(timezone.utc) - _as_utc(purchase.updated_at)
+    if idle.total_seconds() > PURCHASE_SESSION_TTL_SECONDS:
+        return None
+    return purchase
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite drops the offset of stored datetimes
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def quote_expired(purchase: PurchaseSession) -> bool:
+    """Whether the quantity-step quote on ``purchase`` is missing or stale."""
+    if purchase.quote_expires_at is None or purchase.amount is None:
+        return True
+    return datetime.now(timezone.utc) >= _as_utc(purchase.quote_expires_at)
+
+
+async def _record_step(
+    session: AsyncSession, purchase: PurchaseSession, order: GoldOrder
+) -> GoldOrder:
+    """
+    Advance ``purchase`` to ``order.step`` and append the audit row, in one
+    commit. Ids are assigned at flush; sessions do not expire on commit, so
+    no refresh round trip is needed to read them.
+    """
+    purchase.step = order.step
+    purchase.updated_at = datetime.now(timezone.utc)
+    session.add(purchase)
+    session.add(order)
+    await session.commit()
+    return order
 
 
 # ---------------- Step 1: KYC ----------------
 @router.post("/kyc")
-def kyc_step(req: KYCRequest, session: Session = Depends(get_session)):
+@idempotent("kyc")
+async def kyc_step(
+    req: KYCRequest,
+    session: AsyncSession = Depends(get_session),
+    user: CurrentUser = Depends(get_current_user),
+):
     if not req.kyc_details.strip():
         raise HTTPException(status_code=400, detail="KYC details cannot be empty")
 
-    order = GoldOrder(user_id=req.user_id, step="KYC", kyc_details=req.kyc_details)
-    session.add(order)
-    session.commit()
-    session.refresh(order)
+    # KYC starts a new purchase (taking over one the chat just offered); an
+    # unfinished earlier one is left behind
+    purchase = await get_open_purchase(session, user.id)
+    if purchase is None or purchase.step != "OFFERED":
+        purchase = PurchaseSession(user_id=user.id, step="KYC")
+    purchase.kyc_details = req.kyc_details
+    order = await _record_step(session, purchase, GoldOrder(user_id=user.id, step="KYC"))
     return {
         "message": "KYC completed ✅",
         "next_endpoint": "/api/gold/quantity",
         "order_id": order.id,
+        "session_id": purchase.id,
     }
 
 
 # ---------------- Step 2: Quantity / Amount ----------------
 @router.post("/quantity")
-def quantity_step(req: QuantityRequest, session: Session = Depends(get_session)):
-    gold_price = get_live_gold_price()  # INR per gram
-    if not gold_price:
+@idempotent("quantity")
+async def quantity_step(
+    req: QuantityRequest,
+    session: AsyncSession = Depends(get_session),
+    price: PriceSnapshot = Depends(get_price_snapshot),
+    user: CurrentUser = Depends(get_current_user),
+):
+    gold_price = await price.get()  # INR per gram, shared with the rest of the request
+    if not gold_price or gold_price <= 0:
         raise HTTPException(status_code=500, detail="Gold price unavailable")
 
     if req.grams and not req.amount:
@@ -73,105 +162,142 @@ def quantity_step(req: QuantityRequest, session: Session = Depends(get_session))
     elif not req.amount and not req.grams:
         raise HTTPException(status_code=400, detail="Provide grams or amount")
 
-    order = GoldOrder(
-        user_id=req.user_id,
-        step="QUANTITY",
-        quantity_grams=req.grams,
-        amount=req.amount,
+    purchase = await get_open_purchase(session, user.id, req.session_id)
+    if purchase is None:
+        purchase = PurchaseSession(user_id=user.id, step="QUANTITY")
+    elif purchase.step not in QUANTITY_FROM_STEPS:
+        # Paid for already: re-quoting would replace the paid amount
+        raise HTTPException(
+            status_code=409, detail="Quantity can no longer be changed for this purchase"
+        )
+    # Lock the quoted price on the purchase so payment uses the same figure,
+    # on any worker, without refetching
+    purchase.quantity_grams = req.grams
+    purchase.amount = req.amount
+    purchase.quote_price = gold_price
+    purchase.quote_expires_at = datetime.now(timezone.utc) + timedelta(
+        seconds=QUOTE_LOCK_SECONDS
+    )
+    order = await _record_step(
+        session,
+        purchase,
+        GoldOrder(
+            user_id=user.id,
+            step="QUANTITY",
+            quantity_grams=req.grams,
+            amount=req.amount,
+        ),
     )
-    session.add(order)
-    session.commit()
-    session.refresh(order)
     return {
         "message": f"Quantity set: {req.grams} grams / ₹{req.amount}",
+        "price_per_gram": gold_price,
+        "quote_expires_at": purchase.quote_expires_at.isoformat(),
         "next_endpoint": "/api/gold/payment",
         "order_id": order.id,
+        "session_id": purchase.id,
     }
 
 
 # ---------------- Step 3: Payment ----------------
 @router.post("/payment")
-def payment_step(req: PaymentRequest, session: Session = Depends(get_session)):
-    last_order = session.exec(
-        f"SELECT * FROM goldorder WHERE user_id={req.user_id} ORDER BY id DESC LIMIT 1"
-    ).first()
-
-    if not last_order or last_order.step != "QUANTITY":
+@idempotent("payment")
+async def payment_step(
+    req: PaymentRequest,
+    session: AsyncSession = Depends(get_session),
+    user: CurrentUser = Depends(get_current_user),
+):
+    purchase = await get_open_purchase(session, user.id, req.session_id)
+    if not purchase or purchase.step != "QUANTITY":
         raise HTTPException(
             status_code=400, detail="Quantity step must be completed first"
         )
 
-    if req.amount != last_order.amount:
+    if quote_expired(purchase):
+        raise HTTPException(
+            status_code=409, detail="Price quote expired, please set quantity again"
+        )
+
+    if req.amount != purchase.amount:
         raise HTTPException(status_code=400, detail="Payment amount mismatch")
 
     transaction_id = str(uuid.uuid4())
-    order = GoldOrder(
-        user_id=req.user_id,
-        step="PAYMENT",
-        payment_method=req.payment_method,
-        amount=req.amount,
-        transaction_id=transaction_id,
+    purchase.payment_method = req.payment_method
+    purchase.transaction_id = transaction_id
+    order = await _record_step(
+        session,
+        purchase,
+        GoldOrder(
+            user_id=user.id,
+            step="PAYMENT",
+            payment_method=req.payment_method,
+            amount=req.amount,
+        ),
     )
-    session.add(order)
-    session.commit()
-    session.refresh(order)
     return {
         "message": f"Payment of ₹{req.amount} via {req.payment_method} confirmed ✅",
         "transaction_id": transaction_id,
         "next_endpoint": "/api/gold/vault",
         "order_id": order.id,
+        "session_id": purchase.id,
     }
 
 
 # ---------------- Step 4: Vault / Storage ----------------
 @router.post("/vault")
-def vault_step(req: VaultRequest, session: Session = Depends(get_session)):
+@idempotent("vault")
+async def vault_step(
+    req: VaultRequest,
+    session: AsyncSession = Depends(get_session),
+    user: CurrentUser = Depends(get_current_user),
+):
     if not req.confirm:
         raise HTTPException(status_code=400, detail="Vault confirmation required")
 
+    purchase = await get_open_purchase(session, user.id, req.session_id)
+    if not purchase or purchase.step != "PAYMENT":
+        raise HTTPException(status_code=400, detail="Payment step must be completed first")
     wallet_id = str(uuid.uuid4())
-    order = GoldOrder(user_id=req.user_id, step="VAULT_CONFIRM", wallet_id=wallet_id)
-    session.add(order)
-    session.commit()
-    session.refresh(order)
+    purchase.wallet_id = wallet_id
+    order = await _record_step(
+        session, purchase, GoldOrder(user_id=user.id, step="VAULT_CONFIRM")
+    )
     return {
         "message": "Vault storage confirmed ✅",
         "wallet_id": wallet_id,
         "next_endpoint": "/api/gold/receipt",
         "order_id": order.id,
+        "session_id": purchase.id,
     }
 
 
 # ---------------- Step 5: Receipt ----------------
 @router.post("/receipt")
-def receipt_step(req: ReceiptRequest, session: Session = Depends(get_session)):
-    orders = session.exec(
-        f"SELECT * FROM goldorder WHERE user_id={req.user_id} ORDER BY id ASC"
-    ).all()
-    if not orders:
-        raise HTTPException(status_code=400, detail="No orders found for user")
-
-    kyc_order = next((o for o in orders if o.step == "KYC"), None)
-    quantity_order = next((o for o in orders if o.step == "QUANTITY"), None)
-    payment_order = next((o for o in orders if o.step == "PAYMENT"), None)
-    vault_order = next((o for o in orders if o.step == "VAULT_CONFIRM"), None)
+@idempotent("receipt")
+async def receipt_step(
+    req: ReceiptRequest,
+    session: AsyncSession = Depends(get_session),
+    user: CurrentUser = Depends(get_current_user),
+):
+    purchase = await get_open_purchase(session, user.id, req.session_id)
+    if not purchase or purchase.step != "VAULT_CONFIRM":
+        raise HTTPException(status_code=400, detail="Vault step must be confirmed first")
 
     receipt = {
-        "user_id": req.user_id,
-        "kyc_details": kyc_order.kyc_details if kyc_order else "",
-        "quantity_grams": quantity_order.quantity_grams if quantity_order else 0,
-        "amount": quantity_order.amount if quantity_order else 0,
-        "payment_method": payment_order.payment_method if payment_order else "",
-        "transaction_id": payment_order.transaction_id if payment_order else "",
-        "wallet_id": vault_order.wallet_id if vault_order else "",
+        "user_id": user.id,
+        "session_id": purchase.id,
+        "kyc_details": purchase.kyc_details or "",
+        "quantity_grams": purchase.quantity_grams or 0,
+        "amount": purchase.amount or 0,
+        "payment_method": purchase.payment_method or "",
+        "transaction_id": purchase.transaction_id or "",
+        "wallet_id": purchase.wallet_id or "",
         "purchase_time": datetime.now(timezone.utc).isoformat(),
         "message": "Purchase complete 🎉",
     }
 
-    # Save final POST_BUY step
-    order = GoldOrder(user_id=req.user_id, step="POST_BUY")
-    session.add(order)
-    session.commit()
-    session.refresh(order)
+    # Save final POST_BUY step; this closes the purchase
+    order = await _record_step(
+        session, purchase, GoldOrder(user_id=user.id, step="POST_BUY")
+    )
 
     return {"receipt": receipt, "order_id": order.id}
@@ -1,41 +1,535 @@
-import json
+# services/gemini_client.py
+import asyncio
+import copy
+import functools
+import hashlib
 import logging
-import google.generativeai as genai
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from core import metrics, structured_output
+from services.resilience import CircuitBreaker, CircuitOpen, Resilience
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Max LLM calls in flight per worker; extra callers wait on the semaphore.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+# Admission control: callers allowed to wait for a slot, and for how long,
+# before a call is shed with GeminiOverloaded (429 to the client).
+GEMINI_MAX_WAITING = int(os.getenv("GEMINI_MAX_WAITING", "128"))
+GEMINI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "2"))
+GEMINI_RETRY_AFTER_SECONDS = int(os.getenv("GEMINI_RETRY_AFTER_SECONDS", "1"))
+# Overall deadline of one call, retries and hedges included.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+# Resilience: each attempt gets its own timeout; timeouts and 5xx/429 from
+# the API are retried with jittered exponential back-off.
+GEMINI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "10"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.2"))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "2"))
+# Hedging: send a second request when the first is slower than the recent p95.
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+GEMINI_HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))
+GEMINI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_SECONDS", "0.2"))
+# Circuit breaker: open after this many failures in a row, probe again after the reset.
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+# Last good response per prompt, served while Gemini is failing.
+GEMINI_FALLBACK_CACHE_SIZE = int(os.getenv("GEMINI_FALLBACK_CACHE_SIZE", "1000"))
+GEMINI_UNAVAILABLE_ANSWER = os.getenv(
+    "GEMINI_UNAVAILABLE_ANSWER",
+    "Our assistant is temporarily unavailable. Please try again in a minute.",
+)
+# Only used when the SDK has no async generation path.
+GEMINI_THREAD_POOL_SIZE = int(os.getenv("GEMINI_THREAD_POOL_SIZE", "16"))
+# Ask for bare JSON (response MIME type + per-prompt response schema; streams
+# get the MIME type only, see GeminiClient._generation_config).
+GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1") == "1"
+# Upload static prompt prefixes once as server-side cached contexts.
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+
+class GeminiOverloaded(Exception):
+    """Every LLM slot is busy and the wait queue is full (or too slow)."""
+
+    def __init__(self, message: str, retry_after: int = GEMINI_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = retry_after
+
 
+_RETRYABLE = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.BadGateway,
+    google_exceptions.TooManyRequests,
+)
 
-async def call_gemini_api(prompt: str) -> dict:
+
+def is_retryable(exc: BaseException) -> bool:
+    """Upstream trouble worth another attempt (and counted by the breaker)."""
+    return isinstance(exc, _RETRYABLE) and not isinstance(exc, GeminiOverloaded)
+
+
+def default_resilience(deadline: float = GEMINI_TIMEOUT_SECONDS) -> Resilience:
+    return Resilience(
+        is_retryable,
+        retries=GEMINI_RETRIES,
+        attempt_timeout=GEMINI_ATTEMPT_TIMEOUT_SECONDS,
+        deadline=deadline,
+        backoff_base=GEMINI_RETRY_BASE_SECONDS,
+        backoff_max=GEMINI_RETRY_MAX_SECONDS,
+        hedge=GEMINI_HEDGE,
+        hedge_quantile=GEMINI_HEDGE_QUANTILE,
+        hedge_min_delay=GEMINI_HEDGE_MIN_DELAY_SECONDS,
+        breaker=CircuitBreaker(
+            GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS, name="gemini"
+        ),
+        name="gemini",
+    )
+
+
+class GeminiClient:
     """
-    Call Gemini API via official SDK and return parsed JSON response.
+    Long-lived Gemini client shared by every request on this worker.
+
+    The SDK is configured and the model built once. Calls go through the
+    SDK's async path (``generate_content_async``) when available, otherwise
+    through a bounded thread pool, so a slow generation never blocks the
+    event loop. A semaphore caps concurrent calls and every call is bounded
+    by ``timeout`` seconds. At most ``max_waiting`` callers queue for a slot,
+    each for at most ``queue_timeout`` seconds; the rest are shed with
+    ``GeminiOverloaded`` so an overload shows up as fast 429s rather than as
+    an ever-growing queue.
+
+    Generations go through ``resilience`` (see ``services.resilience``):
+    per-attempt timeouts inside an overall ``timeout`` deadline, retries with
+    back-off, optional hedging and a circuit breaker.
     """
-    try:
-        genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        logging.info("Gemini AI initialized for enhanced detection")
-        response = model.generate_content(prompt)
 
-        # Modern SDK: response.text gives the text output
-        content = getattr(response, "text", "")
+    def __init__(
+        self,
+        model_name: str = GEMINI_MODEL,
+        api_key: Optional[str] = None,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        timeout: float = GEMINI_TIMEOUT_SECONDS,
+        max_waiting: int = GEMINI_MAX_WAITING,
+        queue_timeout: float = GEMINI_QUEUE_TIMEOUT_SECONDS,
+        thread_pool_size: int = GEMINI_THREAD_POOL_SIZE,
+        context_cache: bool = GEMINI_CONTEXT_CACHE,
+        context_cache_ttl: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+        resilience: Optional[Resilience] = None,
+        structured_output: bool = GEMINI_STRUCTURED_OUTPUT,
+        model=None,
+    ):
+        if model is None:
+            genai.configure(api_key=api_key or os.environ.get("GOOGLE_API_KEY"))
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.resilience = resilience or default_resilience(timeout)
+        self.structured_output = structured_output
+        self._generation_configs = {}
+        self.context_cache = context_cache
+        self.context_cache_ttl = context_cache_ttl
+        # prefix -> (model bound to the cached context, refresh deadline) or
+        # None when the backend refused to cache it (e.g. below minimum size)
+        self._context_models = {}
+        self._context_pending = {}
+
+        self._use_async = hasattr(self.model, "generate_content_async")
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if not self._use_async:
+            self._executor = ThreadPoolExecutor(
+                max_workers=thread_pool_size, thread_name_prefix="gemini"
+            )
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._in_flight = 0
+        self._waiting = 0
+        self.shed = 0
+        logger.info(
+            f"Gemini client ready: model={model_name}, async={self._use_async}, "
+            f"max_concurrency={max_concurrency}, timeout={timeout}s"
+        )
 
-        # Try parsing JSON from the LLM
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore is bound to the loop it first waits on; rebuild it if the
+        # client is reused from a different loop (e.g. separate test clients).
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _shed(self, reason: str) -> GeminiOverloaded:
+        self.shed += 1
+        metrics.incr("gemini_admission_total", outcome=reason)
+        return GeminiOverloaded(f"LLM capacity exhausted ({reason}), please retry shortly")
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the ``max_concurrency`` call slots, or shed the call."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self._waiting >= self.max_waiting:
+                raise self._shed("queue_full")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._shed("queue_timeout")
+            finally:
+                self._waiting -= 1
+        else:
+            await semaphore.acquire()
+        metrics.incr("gemini_admission_total", outcome="admitted")
+        self._in_flight += 1
         try:
-            parsed = json.loads(content)
-            return parsed
-        except json.JSONDecodeError:
-            # Fallback minimal JSON
-            return {
-                "query": "",
-                "source": "gemini",
-                "category": "irrelevant",
-                "answer": content,
-                "meta": {"confidence": 0.0},
-            }
+            yield
+        finally:
+            self._in_flight -= 1
+            semaphore.release()
 
-    except Exception as e:
+    def stats(self) -> dict:
         return {
-            "query": "",
-            "source": "gemini",
-            "category": "irrelevant",
-            "answer": f"Error contacting Gemini SDK: {str(e)}",
-            "meta": {"confidence": 0.0},
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            "shed": self.shed,
+            **self.resilience.stats(),
         }
+
+    def _generation_config(self, schema: Optional[str], stream: bool = False) -> dict:
+        """
+        SDK keyword arguments requesting JSON for prompt ``schema``, if any.
+
+        Streams get the JSON MIME type but no response schema: the SDK's
+        schema cannot order properties, and stream readers rely on the field
+        order of the prompt's examples (``intent`` before ``answer``). The
+        streamed text is still validated against ``schema`` once complete.
+        """
+        if not self.structured_output or not schema:
+            return {}
+        key = (schema, stream)
+        if key not in self._generation_configs:
+            response_schema = None if stream else structured_output.response_schema(schema)
+            self._generation_configs[key] = {
+                "generation_config": genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    **({"response_schema": response_schema} if response_schema else {}),
+                )
+            }
+        return self._generation_configs[key]
+
+    async def _generate(self, model, contents: str, schema: Optional[str] = None):
+        options = self._generation_config(schema)
+        if self._use_async:
+            return await model.generate_content_async(contents, **options)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(model.generate_content, contents, **options)
+        )
+
+    def _create_cached_model(self, prefix: str):
+        cached = genai.caching.CachedContent.create(
+            model=self.model_name,
+            contents=[prefix],
+            ttl=timedelta(seconds=self.context_cache_ttl),
+        )
+        return genai.GenerativeModel.from_cached_content(cached)
+
+    async def _cached_context_model(self, prefix: str):
+        """Model bound to a server-side cache of ``prefix``, or None."""
+        entry = self._context_models.get(prefix, False)
+        if entry is None:
+            return None
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        pending = self._context_pending.get(prefix)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                asyncio.to_thread(self._create_cached_model, prefix)
+            )
+            self._context_pending[prefix] = pending
+        try:
+            model = await asyncio.shield(pending)
+        except Exception as e:
+            logger.warning(f"Gemini context caching unavailable, sending full prompts: {e}")
+            self._context_models[prefix] = None
+            return None
+        finally:
+            self._context_pending.pop(prefix, None)
+        # Recreate a little before the server-side TTL runs out
+        self._context_models[prefix] = (model, time.monotonic() + self.context_cache_ttl * 0.9)
+        return model
+
+    async def _resolve(self, prompt: str, cache_prefix: Optional[str]):
+        if self.context_cache and cache_prefix and prompt.startswith(cache_prefix):
+            model = await self._cached_context_model(cache_prefix)
+            if model is not None:
+                return model, prompt[len(cache_prefix):]
+        return self.model, prompt
+
+    async def generate_text(
+        self, prompt: str, cache_prefix: Optional[str] = None, schema: Optional[str] = None
+    ) -> str:
+        """
+        Run one generation and return the raw response text.
+
+        When context caching is on and ``prompt`` starts with ``cache_prefix``
+        (a template's static prefix), only the remainder is sent per call.
+        ``schema`` names the prompt's response model (``core.structured_output``)
+        so JSON output can be requested from the API.
+        """
+        model, contents = await self._resolve(prompt, cache_prefix)
+
+        async def attempt(timeout: float) -> str:
+            async with self._slot():
+                response = await asyncio.wait_for(self._generate(model, contents, schema), timeout)
+            _record_usage(response)
+            # Modern SDK: response.text gives the text output
+            return getattr(response, "text", "")
+
+        with metrics.span("span_duration_seconds", span="llm_call"):
+            return await self.resilience.run(attempt)
+
+    async def stream_text(
+        self, prompt: str, cache_prefix: Optional[str] = None, schema: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Run one streaming generation, yielding text chunks as they arrive.
+
+        The concurrency slot is held until the stream ends or is closed, and
+        the whole stream is bounded by ``timeout`` seconds. Without an async
+        SDK path the full text is yielded as a single chunk. The circuit
+        breaker is consulted and informed, but a stream is never retried.
+        """
+        breaker = self.resilience.breaker
+        breaker.check()
+        finished = False
+        try:
+            with metrics.span("span_duration_seconds", span="llm_stream"):
+                async for text in self._stream(prompt, cache_prefix, schema):
+                    yield text
+            finished = True
+        except Exception as e:
+            if is_retryable(e):
+                breaker.record_failure()
+            raise
+        finally:
+            if finished:
+                breaker.record_success()
+            else:
+                breaker.release_probe()
+
+    async def _stream(
+        self, prompt: str, cache_prefix: Optional[str], schema: Optional[str]
+    ) -> AsyncIterator[str]:
+        # Streams are not retried: text may already have reached the user
+        model, contents = await self._resolve(prompt, cache_prefix)
+        deadline = time.monotonic() + self.timeout
+        async with self._slot():
+            if not self._use_async:
+                response = await asyncio.wait_for(
+                    self._generate(model, contents, schema), self.timeout
+                )
+                _record_usage(response)
+                yield getattr(response, "text", "")
+                return
+
+            response = await asyncio.wait_for(
+                model.generate_content_async(
+                    contents, stream=True, **self._generation_config(schema, stream=True)
+                ),
+                self.timeout,
+            )
+            # The SDK's iterator looks one chunk ahead; hand out the first
+            # chunk (already received) straight away rather than after the second.
+            yield _chunk_text(response)
+            chunks = response.__aiter__()
+            first, last = True, response
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        chunks.__anext__(), max(0.0, deadline - time.monotonic())
+                    )
+                except StopAsyncIteration:
+                    break
+                last = chunk
+                if first:
+                    first = False
+                    continue
+                yield _chunk_text(chunk)
+            # Usage totals arrive with the final chunk
+            _record_usage(last)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _record_usage(response):
+    """Count prompt and output tokens reported by the API, if any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    metrics.incr("llm_tokens_total", getattr(usage, "prompt_token_count", 0) or 0, direction="in")
+    metrics.incr(
+        "llm_tokens_total", getattr(usage, "candidates_token_count", 0) or 0, direction="out"
+    )
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return getattr(chunk, "text", "") or ""
+    except ValueError:
+        # No text parts (e.g. a final chunk carrying only the finish reason)
+        return ""
+
+
+_client: Optional[GeminiClient] = None
+
+
+def init_gemini_client(**kwargs) -> GeminiClient:
+    """Create the process-wide client (called once from ``create_app``)."""
+    global _client
+    if _client is None or kwargs:
+        if _client is not None:
+            _client.close()
+        _client = GeminiClient(**kwargs)
+    return _client
+
+
+def get_gemini_client() -> GeminiClient:
+    """Return the process-wide client, creating it on first use."""
+    return _client if _client is not None else init_gemini_client()
+
+
+def close_gemini_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+class _LastGoodAnswers:
+    """Most recent parsed response per prompt, for degraded mode."""
+
+    def __init__(self, max_entries: int = GEMINI_FALLBACK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(prompt: str) -> bytes:
+        return hashlib.sha256(prompt.encode()).digest()
+
+    def put(self, prompt: str, response: dict):
+        if self.max_entries <= 0:
+            return
+        key = self._key(prompt)
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, prompt: str) -> Optional[dict]:
+        with self._lock:
+            response = self._entries.get(self._key(prompt))
+        return copy.deepcopy(response) if response is not None else None
+
+
+last_good_answers = _LastGoodAnswers()
+
+
+def degraded_response(prompt: str) -> dict:
+    """
+    Answer for a failed call or stream: the last good answer to the same
+    prompt if there is one, else ``GEMINI_UNAVAILABLE_ANSWER``. A replayed
+    answer never carries a purchase stage, so it cannot trigger a purchase
+    step.
+    """
+    cached = last_good_answers.get(prompt)
+    if cached is None:
+        metrics.incr("gemini_degraded_total", outcome="fallback")
+        return fallback_response(GEMINI_UNAVAILABLE_ANSWER)
+    metrics.incr("gemini_degraded_total", outcome="cached")
+    cached.pop("stage", None)
+    cached.setdefault("meta", {})["degraded"] = True
+    return cached
+
+
+def fallback_response(answer: str) -> dict:
+    """Minimal response carrying only ``answer`` (no intent, so never cached)."""
+    return {
+        "query": "",
+        "source": "gemini",
+        "category": "irrelevant",
+        "answer": answer,
+        "meta": {"confidence": 0.0},
+    }
+
+
+async def call_gemini_api(
+    prompt: str, cache_prefix: Optional[str] = None, schema: Optional[str] = None
+) -> dict:
+    """
+    Call Gemini API via the shared client and return parsed JSON response,
+    validated against the ``schema`` prompt model when one is named.
+    """
+    try:
+        content = await get_gemini_client().generate_text(prompt, cache_prefix, schema)
+    except GeminiOverloaded:
+        raise  # shed, not failed: the client is told to retry
+    except CircuitOpen:
+        return degraded_response(prompt)
+    except Exception:
+        # Timeouts and SDK errors are logged, never shown to the user
+        logging.warning("Gemini call failed", exc_info=True)
+        return degraded_response(prompt)
+
+    # Try parsing JSON from the LLM
+    try:
+        parsed = structured_output.parse(content, schema)
+    except ValueError:
+        # Fallback minimal JSON
+        return fallback_response(content)
+    last_good_answers.put(prompt, parsed)
+    return parsed
+
+
+async def stream_gemini_api(
+    prompt: str, cache_prefix: Optional[str] = None, schema: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream raw response text from the shared client. Errors (including
+    ``GeminiOverloaded``) propagate to the caller, which decides how much of
+    a partial answer to keep.
+    """
+    async for text in get_gemini_client().stream_text(prompt, cache_prefix, schema):
+        if text:
+            yield text
@@ -1,40 +1,191 @@
 # services/gold_price.py
 
+import asyncio
+import logging
 import os
+import time
+from typing import Optional
+
 import httpx
 
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
 # Ideally load from ENV, not hardcode
 GOLD_API_KEY = os.getenv("GOLD_API_KEY")
-GOLD_API_URL = "https://www.goldapi.io/api/XAU/INR"  # Gold price in INR
+GOLD_API_URL = os.getenv(
+    "GOLD_API_URL", "https://www.goldapi.io/api/XAU/INR"
+)  # Gold price in INR
 
-async def get_live_gold_price() -> float:
+# A price younger than the TTL is served as-is; up to MAX_STALE it is served
+# immediately while a refresh runs in the background (stale-while-revalidate).
+GOLD_PRICE_TTL_SECONDS = float(os.getenv("GOLD_PRICE_TTL_SECONDS", "10"))
+GOLD_PRICE_MAX_STALE_SECONDS = float(os.getenv("GOLD_PRICE_MAX_STALE_SECONDS", "300"))
+# After a failed fetch, wait this long before hitting GoldAPI again.
+GOLD_PRICE_ERROR_BACKOFF_SECONDS = float(os.getenv("GOLD_PRICE_ERROR_BACKOFF_SECONDS", "5"))
+# Background refresh period; 0 disables the refresher task.
+GOLD_PRICE_REFRESH_SECONDS = float(os.getenv("GOLD_PRICE_REFRESH_SECONDS", "0"))
+GOLD_API_TIMEOUT_SECONDS = float(os.getenv("GOLD_API_TIMEOUT_SECONDS", "10"))
+
+
+class GoldPriceService:
     """
-    Fetch live gold price in USD per ounce from GoldAPI.io
+    Cached GoldAPI client shared by every request on this worker.
 
-    Returns:
-        float: Current gold price in USD, or -1.0 on failure.
+    One pooled ``httpx.AsyncClient`` keeps the TLS connection warm, concurrent
+    callers share a single in-flight fetch, and an optional background task
+    keeps the cache fresh so request handlers never wait on the network.
     """
-    headers = {
-        "x-access-token": GOLD_API_KEY,
-        "Content-Type": "application/json"
-    }
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            response = await client.get(GOLD_API_URL, headers=headers)
-            response.raise_for_status()
+    def __init__(
+        self,
+        url: str = GOLD_API_URL,
+        api_key: Optional[str] = GOLD_API_KEY,
+        ttl: float = GOLD_PRICE_TTL_SECONDS,
+        max_stale: float = GOLD_PRICE_MAX_STALE_SECONDS,
+        error_backoff: float = GOLD_PRICE_ERROR_BACKOFF_SECONDS,
+        refresh_interval: float = GOLD_PRICE_REFRESH_SECONDS,
+        timeout: float = GOLD_API_TIMEOUT_SECONDS,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.error_backoff = error_backoff
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+
+        self._price: Optional[float] = None
+        self._fetched_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.fetches = 0
 
-            # ✅ Must await JSON
-            data = response.json()
-            if callable(data):  # sanity check
-                data = await response.json()
+    def _bind_loop(self):
+        # The pooled client and in-flight task belong to one event loop; start
+        # over if we are called from another (e.g. a separate test client).
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={
+                    "x-access-token": self.api_key or "",
+                    "Content-Type": "application/json",
+                },
+            )
+            self._inflight = None
 
-            price = data.get("price_gram_24k")  # Price per gram in INR
+    async def get_price(self) -> float:
+        """
+        Current gold price in INR per gram, or -1.0 if none is available.
+        """
+        self._bind_loop()
+        now = time.monotonic()
+        age = now - self._fetched_at
 
-            if price:
-                return float(round(price, 2))  # Round to 2 decimal places
-            else:
-                return -1.0
+        if self._price is not None and age < self.ttl:
+            metrics.incr("cache_lookups_total", cache="gold_price", outcome="hit")
+            return self._price
+        if self._price is not None and age < self.max_stale:
+            metrics.incr("cache_lookups_total", cache="gold_price", outcome="stale")
+            self._revalidate()  # serve stale, refresh in the background
+            return self._price
+        metrics.incr("cache_lookups_total", cache="gold_price", outcome="miss")
+        if self._failed_at is not None and now - self._failed_at < self.error_backoff:
+            return -1.0
+        return await self.refresh()
+
+    async def refresh(self) -> float:
+        """Fetch now, sharing one request between concurrent callers."""
+        self._bind_loop()
+        return await asyncio.shield(self._revalidate())
+
+    def _revalidate(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    async def _fetch(self) -> float:
+        self.fetches += 1
+        try:
+            response = await self._client.get(self.url)
+            response.raise_for_status()
+            price = response.json().get("price_gram_24k")  # Price per gram in INR
         except Exception as e:
-            print(f"[Gold Price API Error]: {e}")
+            logger.error(f"[Gold Price API Error]: {e}")
+            price = None
+
+        if not price:
+            self._failed_at = time.monotonic()
+            if self._price is not None and self._failed_at - self._fetched_at < self.max_stale:
+                return self._price
             return -1.0
+
+        self._price = float(round(price, 2))  # Round to 2 decimal places
+        self._fetched_at = time.monotonic()
+        self._failed_at = None
+        return self._price
+
+    async def _refresh_forever(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self):
+        """Start the background refresher (no-op when refresh_interval is 0)."""
+        self._bind_loop()
+        if self.refresh_interval > 0 and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+gold_price_service = GoldPriceService()
+
+
+async def get_live_gold_price() -> float:
+    """
+    Fetch live gold price in INR per gram from GoldAPI.io (cached).
+
+    Returns:
+        float: Current gold price in INR per gram, or -1.0 on failure.
+    """
+    return await gold_price_service.get_price()
+
+
+class PriceSnapshot:
+    """
+    The gold price as seen by one request: resolved lazily on first use and
+    then reused, so the chat flow and purchase steps share a single figure.
+    """
+
+    def __init__(self, service: GoldPriceService = None):
+        self._service = service or gold_price_service
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> float:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._service.get_price())
+        return await asyncio.shield(self._task)
+
+
+async def get_price_snapshot() -> PriceSnapshot:
+    """FastAPI dependency: one PriceSnapshot per request."""
+    return PriceSnapshot()
+
+
+# ---------------- Quote locks ----------------
+# How long a price quoted at the quantity step stays valid for payment.
+QUOTE_LOCK_SECONDS = float(os.getenv("QUOTE_LOCK_SECONDS", "300"))
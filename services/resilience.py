@@ -0,0 +1,222 @@
+# services/resilience.py
+"""
+Retry, hedging and circuit breaking for calls to a flaky upstream.
+
+``Resilience.run(attempt)`` calls ``attempt(timeout)`` until it succeeds, the
+error is not retryable, the retries are used up or the overall deadline
+passes. Between attempts it sleeps a jittered exponential back-off. With
+hedging on, an attempt still running after the recent p95 latency gets a
+twin request and the first success wins. A circuit breaker counts
+retryable failures and, once open, rejects calls at once with
+``CircuitOpen`` until a probe call succeeds.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional
+
+from core import metrics
+
+
+class CircuitOpen(Exception):
+    """The upstream is considered unhealthy; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    closed -> (``failure_threshold`` consecutive failures) -> open ->
+    (``reset_seconds``) -> half-open: one probe call is let through; its
+    success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0, name: str = ""):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.name = name
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        """Raise ``CircuitOpen`` unless a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+        metrics.incr("circuit_breaker_total", upstream=self.name, outcome="rejected")
+        raise CircuitOpen(f"{self.name or 'upstream'} circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                metrics.incr("circuit_breaker_total", upstream=self.name, outcome="closed")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (
+                self._opened_at is None and self._failures >= self.failure_threshold
+            ):
+                metrics.incr("circuit_breaker_total", upstream=self.name, outcome="opened")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """The probe ended without a verdict (e.g. cancelled): allow another."""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyWindow:
+    """Durations of the last ``size`` successful attempts, for quantiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """Full-jitter exponential back-off before retry number ``retry`` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** retry)))
+
+
+Attempt = Callable[[float], Awaitable]
+
+
+class Resilience:
+    def __init__(
+        self,
+        is_retryable: Callable[[BaseException], bool],
+        retries: int = 2,
+        attempt_timeout: float = 10.0,
+        deadline: float = 30.0,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay: float = 0.2,
+        breaker: Optional[CircuitBreaker] = None,
+        name: str = "",
+    ):
+        self.is_retryable = is_retryable
+        self.retries = retries
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(name=name)
+        self.latency = LatencyWindow()
+        self.name = name
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        p = self.latency.quantile(self.hedge_quantile)
+        return None if p is None else max(self.hedge_min_delay, p)
+
+    async def run(self, attempt: Attempt):
+        self.breaker.check()
+        deadline = time.monotonic() + self.deadline
+        retry = 0
+        verdict = False
+        try:
+            while True:
+                timeout = min(self.attempt_timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise asyncio.TimeoutError(f"{self.name} deadline exceeded")
+                try:
+                    result = await self._hedged(attempt, timeout)
+                except Exception as e:
+                    if not self.is_retryable(e):
+                        raise
+                    self.breaker.record_failure()
+                    verdict = True
+                    pause = backoff_delay(retry, self.backoff_base, self.backoff_max)
+                    if retry >= self.retries or time.monotonic() + pause >= deadline:
+                        metrics.incr("upstream_calls_total", upstream=self.name, outcome="failed")
+                        raise
+                    metrics.incr("upstream_retries_total", upstream=self.name)
+                    retry += 1
+                    await asyncio.sleep(pause)
+                    self.breaker.check()
+                    verdict = False
+                    continue
+                self.breaker.record_success()
+                verdict = True
+                metrics.incr("upstream_calls_total", upstream=self.name, outcome="ok")
+                return result
+        finally:
+            if not verdict:
+                self.breaker.release_probe()
+
+    async def _timed(self, attempt: Attempt, timeout: float):
+        started = time.monotonic()
+        result = await attempt(timeout)
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, attempt: Attempt, timeout: float):
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self._timed(attempt, timeout)
+
+        primary = asyncio.ensure_future(self._timed(attempt, timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            metrics.incr("upstream_hedges_total", upstream=self.name, outcome="sent")
+            tasks.append(asyncio.ensure_future(self._timed(attempt, timeout - delay)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            metrics.incr("upstream_hedges_total", upstream=self.name, outcome="won")
+                        return task.result()
+            # Both failed: report the primary's error
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # retrieved; the losing twin's error is moot
+
+    def stats(self) -> dict:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "breaker": self.breaker.state,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1) if self.hedge_delay() else None,
+        }
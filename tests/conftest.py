@@ -0,0 +1,67 @@
+# tests/conftest.py
+import itertools
+import os
+import shutil
+import tempfile
+
+# Before anything imports database.db: the suite runs on its own throwaway
+# database instead of the developer's ./dev.db
+_DB_DIR = tempfile.mkdtemp(prefix="gold-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from benchmarks.fakes import GoldApiStub, Latency
+from core.auth import CurrentUser, get_current_user
+from database.db import init_db
+from services.gold_price import PriceSnapshot, get_price_snapshot
+
+_user_ids = itertools.count(1)
+
+
+class FixedPrice:
+    """Gold price service returning ``price``, counting the fetches."""
+
+    def __init__(self, price: float = 5000.0):
+        self.price = price
+        self.calls = 0
+
+    async def get_price(self):
+        self.calls += 1
+        return self.price
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+    yield
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def user_id():
+    """A user id no other test in the session has used."""
+    return next(_user_ids)
+
+
+@pytest.fixture
+def price():
+    return FixedPrice()
+
+
+@pytest.fixture
+def client(user_id, price):
+    """API client signed in as ``user_id`` and pricing gold with ``price``."""
+    app = create_app()
+    app.dependency_overrides[get_price_snapshot] = lambda: PriceSnapshot(price)
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(user_id, "buyer@example.com")
+    return TestClient(app)
+
+
+@pytest.fixture
+def gold_api_stub():
+    stub = GoldApiStub(latency=Latency("fixed", 0))
+    yield stub
+    stub.close()
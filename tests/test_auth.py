@@ -9,9 +9,6 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = TestClient(create_app())
-
-
 @pytest.fixture(name="client")
 def client_fixture(tmp_path):
     # Ensure fresh DB by dropping and recreating tables
@@ -37,32 +34,29 @@ def test_signup_and_login(client):
     data = resp.json()
     assert "access_token" in data
 
+    # Duplicate signup
+    resp2 = client.post(
+        "/auth/signup",
+        json={
+            "name": "Test User 2",
+            "email": "assignment@example.com",
+            "password": "strongpass",
+        },
+    )
+    logger.debug(f"Duplicate signup response: {resp2.status_code}, {resp2.json()}")
+    assert resp2.status_code == 400
 
-# Duplicate signup
-resp2 = client.post(
-    "/auth/signup",
-    json={
-        "name": "Test User 2",
-        "email": "assignment@example.com",
-        "password": "strongpass",
-    },
-)
-logger.debug(f"Duplicate signup response: {resp2.status_code}, {resp2.json()}")
-assert resp2.status_code == 400
-
-
-# Login success
-resp3 = client.post(
-    "/auth/login", json={"email": "assignment@example.com", "password": "strongpass"}
-)
-logger.debug(f"Login success response: {resp3.status_code}, {resp3.json()}")
-assert resp3.status_code == 200
-assert "access_token" in resp3.json()
-
+    # Login success
+    resp3 = client.post(
+        "/auth/login", json={"email": "assignment@example.com", "password": "strongpass"}
+    )
+    logger.debug(f"Login success response: {resp3.status_code}, {resp3.json()}")
+    assert resp3.status_code == 200
+    assert "access_token" in resp3.json()
 
-# Login failure
-resp4 = client.post(
-    "/auth/login", json={"email": "assignment@example.com", "password": "wrongpass"}
-)
-logger.debug(f"Login failure response: {resp4.status_code}, {resp4.json()}")
-assert resp4.status_code == 401
+    # Login failure
+    resp4 = client.post(
+        "/auth/login", json={"email": "assignment@example.com", "password": "wrongpass"}
+    )
+    logger.debug(f"Login failure response: {resp4.status_code}, {resp4.json()}")
+    assert resp4.status_code == 401
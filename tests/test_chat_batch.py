@@ -0,0 +1,89 @@
+# tests/test_chat_batch.py
+import asyncio
+import time
+
+import core.chat_flow as chat_flow
+from core import purchase_fsm
+from core.chat_manager import get_history
+from core.intent_cache import IntentCache
+from database.db import async_session_maker
+
+
+def _setup(monkeypatch, calls):
+    async def fake_gemini(prompt, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.1)
+        if "explode" in prompt:
+            raise RuntimeError("boom")
+        return {"intent": "irrelevant", "answer": prompt.rsplit("User Query:", 1)[-1]}
+
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fake_gemini)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "CHAT_PROMPT_MODE", "two_call")
+
+
+def test_batch_runs_concurrently_and_keeps_order(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    items = [(f"batch-{i}", f"question {i}") for i in range(10)]
+
+    start = time.perf_counter()
+    results = asyncio.run(chat_flow.process_batch(items, concurrency=10))
+    assert time.perf_counter() - start < 0.5  # not ten serial round trips
+    assert all(r["ok"] for r in results)
+    assert [f"question {i}" in r["response"]["answer"] for i, r in enumerate(results)] == [True] * 10
+
+
+def test_duplicates_are_answered_once(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    items = [("dup", "Tell me a joke"), ("dup", "tell me a joke!"), ("dup", "other")]
+
+    results = asyncio.run(chat_flow.process_batch(items))
+    assert len(calls) == 2
+    assert results[1]["duplicate_of"] == 0
+    assert results[1]["response"] == results[0]["response"]
+
+
+def test_failed_item_does_not_fail_the_batch(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    items = [("err", "fine"), ("err", "explode please"), ("err", "also fine")]
+
+    results = asyncio.run(chat_flow.process_batch(items))
+    assert [r["ok"] for r in results] == [True, False, True]
+    assert "boom" in results[1]["error"]
+
+
+def test_batch_items_are_independent_and_never_buy(monkeypatch, user_id):
+    calls = []
+    _setup(monkeypatch, calls)
+    user = str(user_id)
+
+    async def run():
+        async with async_session_maker() as session:
+            await purchase_fsm.offer(session, user_id)
+        results = await chat_flow.process_batch(
+            [(user, "ok"), (user, "question a"), (user, "question b")], concurrency=3
+        )
+        async with async_session_maker() as session:
+            return results, await purchase_fsm.next_stage(session, user_id)
+
+    start = time.perf_counter()
+    results, stage = asyncio.run(run())
+    assert time.perf_counter() - start < 0.5  # one user's items still run at once
+    assert all(r["ok"] and r["response"].get("source") != "fsm" for r in results)
+    assert stage == "buy_step_1"  # the "ok" did not start KYC
+    assert get_history(user) == []
+
+
+def test_repeated_turns_in_a_conversation_all_run(monkeypatch):
+    calls = []
+    _setup(monkeypatch, calls)
+    items = [("conv-user", "tell me more", "c1"), ("conv-user", "Tell me more!", "c1")]
+
+    results = asyncio.run(chat_flow.process_batch(items))
+    assert not any("duplicate_of" in r for r in results)
+    user_turns = [t for t in get_history("conv-user:c1") if t["role"] == "user"]
+    assert [t["content"] for t in user_turns][-2:] == ["tell me more", "Tell me more!"]
@@ -0,0 +1,70 @@
+# tests/test_chat_history.py
+import asyncio
+
+from core import chat_manager
+from core.chat_manager import InMemoryHistoryStore, SQLiteHistoryStore
+
+
+def test_ring_buffer_keeps_last_turns():
+    store = InMemoryHistoryStore(max_turns=3)
+    for i in range(5):
+        store.add("u1", "user", f"msg {i}")
+    assert [t["content"] for t in store.get_history("u1")] == ["msg 2", "msg 3", "msg 4"]
+    assert [t["content"] for t in store.get_history("u1", limit=2)] == ["msg 3", "msg 4"]
+
+
+def test_idle_users_are_evicted_first():
+    store = InMemoryHistoryStore(max_users=2)
+    store.add("a", "user", "hi")
+    store.add("b", "user", "hi")
+    store.get_history("a")  # a is now the most recently active
+    store.add("c", "user", "hi")
+    assert store.get_history("b") == []
+    assert store.get_history("a") and store.get_history("c")
+    assert store.stats()["evicted_users"] == 1
+
+
+def test_memory_cap_bounds_total_size():
+    store = InMemoryHistoryStore(max_turns=100, max_bytes=10_000)
+    for user in range(50):
+        store.add(str(user), "user", "x" * 1000)
+    assert store.stats()["approx_bytes"] <= 10_000
+    assert store.stats()["users"] < 50
+
+
+def test_sqlite_store_is_shared_and_tail_reads(tmp_path):
+    path = str(tmp_path / "history.db")
+    writer, reader = SQLiteHistoryStore(path, max_turns=2), SQLiteHistoryStore(path)
+    writer.add("u1", "user", "buy gold")
+    writer.add("u1", "assistant", "Step 1", stage="buy_step_1")
+    writer.add("u1", "user", "ok")
+
+    assert reader.get_history("u1", limit=2) == [
+        {"role": "assistant", "content": "Step 1", "stage": "buy_step_1"},
+        {"role": "user", "content": "ok"},
+    ]
+    assert len(writer.get_history("u1")) == 2
+    reader.clear("u1")
+    assert writer.get_history("u1") == []
+
+
+def test_async_access_runs_sqlite_store_in_a_thread(tmp_path, monkeypatch):
+    on_loop = []
+
+    class RecordingStore(SQLiteHistoryStore):
+        def add(self, *args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            super().add(*args)
+
+    monkeypatch.setattr(chat_manager, "history_store", RecordingStore(str(tmp_path / "h.db")))
+
+    async def run():
+        await chat_manager.add_to_history_async("u1", "user", "hello")
+        return await chat_manager.get_history_async("u1")
+
+    assert asyncio.run(run()) == [{"role": "user", "content": "hello"}]
+    assert on_loop == [False]
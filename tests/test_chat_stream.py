@@ -0,0 +1,159 @@
+# tests/test_chat_stream.py
+import asyncio
+import json
+import time
+
+import core.chat_flow as chat_flow
+from core.intent_cache import IntentCache
+from core.json_stream import JsonFieldStream
+from services.gemini_client import GEMINI_UNAVAILABLE_ANSWER, GeminiClient
+from services.resilience import CircuitOpen
+
+
+def _feed_in_pieces(text, size):
+    parser = JsonFieldStream()
+    answer = ""
+    for i in range(0, len(text), size):
+        answer += "".join(d for key, d in parser.feed(text[i : i + size]) if key == "answer")
+    return parser, answer
+
+
+def test_answer_is_decoded_across_chunk_boundaries():
+    payload = {
+        "intent": "gold_related",
+        "meta": {"confidence": 0.9, "note": "a \"quoted\" } brace"},
+        "answer": 'Gold ₹6,500/g — "safe" 😀\nline two',
+    }
+    text = "```json\n" + json.dumps(payload) + "\n```"
+    for size in (1, 3, 7, len(text)):
+        parser, answer = _feed_in_pieces(text, size)
+        assert answer == payload["answer"]
+        assert parser.fields["intent"] == "gold_related"
+        assert parser.done
+
+
+def test_partial_answer_is_available_before_the_object_closes():
+    parser = JsonFieldStream()
+    parser.feed('{"intent": "irrelevant", "answer": "Hel')
+    assert parser.partial("answer") == "Hel" and not parser.done
+
+
+class StreamingModel:
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    async def generate_content_async(self, prompt, stream=False):
+        model = self
+
+        class Response:
+            text = model.chunks[0]
+
+            async def __aiter__(self):
+                for chunk in model.chunks:
+                    yield type("Chunk", (), {"text": chunk})()
+                    await asyncio.sleep(model.delay)
+
+        await asyncio.sleep(model.delay)
+        return Response()
+
+
+def test_client_yields_first_chunk_before_the_stream_ends():
+    client = GeminiClient(model=StreamingModel(["a", "b", "c"], delay=0.05))
+
+    async def run():
+        start = time.perf_counter()
+        seen = []
+        async for text in client.stream_text("q"):
+            seen.append((text, time.perf_counter() - start))
+        return seen
+
+    seen = asyncio.run(run())
+    assert [text for text, _ in seen] == ["a", "b", "c"]
+    assert seen[0][1] < 0.09  # one round trip, not the whole stream
+
+
+def _collect(user_id, query):
+    async def run():
+        return [event async for event in chat_flow.stream_user_query(user_id, query, None)]
+
+    return asyncio.run(run())
+
+
+def test_stream_emits_tokens_then_final(monkeypatch):
+    response = json.dumps(
+        {"query": "q", "intent": "general_finance", "category": "finance", "answer": "Save first, then invest."}
+    )
+
+    async def fake_stream(prompt, **kwargs):
+        for i in range(0, len(response), 8):
+            yield response[i : i + 8]
+
+    monkeypatch.setattr(chat_flow, "stream_gemini_api", fake_stream)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "CHAT_PROMPT_MODE", "two_call")
+
+    events = _collect("streamer", "how should I plan my money")
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Save first, then invest."
+    event, final = events[-1]
+    assert event == "final"
+    assert final["intent"] == "general_finance"
+    assert final["ttft_ms"] is not None
+
+
+def test_answer_before_intent_is_released_once_the_intent_arrives(monkeypatch):
+    async def fake_stream(prompt, **kwargs):
+        for piece in ('{"answer": "Spend less ', 'than you earn.", ', '"intent": "general_finance"}'):
+            yield piece
+
+    monkeypatch.setattr(chat_flow, "stream_gemini_api", fake_stream)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "CHAT_PROMPT_MODE", "two_call")
+
+    parser, answer = _feed_in_pieces('{"answer": "a", "intent": "irrelevant"}', 4)
+    assert (answer, parser.fields["intent"]) == ("a", "irrelevant")
+
+    events = _collect("streamer", "what is a budget")
+    assert "".join(d["text"] for e, d in events if e == "token") == "Spend less than you earn."
+    assert events[-1][1]["intent"] == "general_finance"
+
+
+def test_ready_to_invest_switches_to_the_chatbot_stream(monkeypatch):
+    prompts = []
+
+    async def fake_stream(prompt, **kwargs):
+        prompts.append(prompt)
+        if "Classify the user query" in prompt:
+            yield '{"intent": "ready_to_invest", "answer": "intent ans'
+            raise AssertionError("intent stream should have been dropped")
+        for piece in ('{"stage": "exploration", ', '"answer": "Let us ', 'start.", "buy_link": ""}'):
+            yield piece
+
+    monkeypatch.setattr(chat_flow, "stream_gemini_api", fake_stream)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "CHAT_PROMPT_MODE", "two_call")
+
+    events = _collect("streamer", "hmm, maybe")
+    assert "".join(d["text"] for e, d in events if e == "token") == "Let us start."
+    assert events[-1][1]["stage"] == "exploration"
+    assert len(prompts) == 2
+
+
+def test_open_circuit_streams_the_unavailable_answer(monkeypatch):
+    async def fake_stream(prompt, **kwargs):
+        raise CircuitOpen("gemini circuit is open")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(chat_flow, "stream_gemini_api", fake_stream)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+
+    event, final = _collect("streamer", "is it a good month for a gold SIP")[-1]
+    assert event == "final"
+    assert final["answer"] == GEMINI_UNAVAILABLE_ANSWER
+    assert "circuit" not in json.dumps(final)
@@ -0,0 +1,61 @@
+# tests/test_current_user.py
+import time
+import uuid
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+
+import core.auth as auth
+from app import create_app
+from core.auth import CurrentUser, VerifiedTokenCache
+from core.security import create_access_token
+
+
+def _signup(client):
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    resp = client.post(
+        "/auth/signup", json={"name": "Token User", "email": email, "password": "strongpass"}
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()["access_token"]
+
+
+def test_bearer_token_identifies_the_user_and_is_cached(monkeypatch):
+    auth.token_cache.clear()
+    client = TestClient(create_app())
+    headers = {"Authorization": f"Bearer {_signup(client)}"}
+
+    first = client.post("/chat/clear", headers=headers)
+    assert first.status_code == 200
+
+    def no_decode(token):
+        raise AssertionError("cached token was decoded again")
+
+    monkeypatch.setattr(auth, "decode_access_token", no_decode)
+    second = client.post("/chat/clear", headers=headers)
+    assert second.json() == first.json()
+
+
+def test_missing_invalid_and_expired_tokens_are_rejected():
+    client = TestClient(create_app())
+    expired = create_access_token({"sub": "1"}, expires_delta=timedelta(seconds=-5))
+
+    assert client.post("/chat/clear").status_code == 401
+    for token in ("not-a-jwt", expired):
+        resp = client.post("/chat/clear", headers={"Authorization": f"Bearer {token}"})
+        assert resp.status_code == 401
+        assert resp.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_cache_entry_never_outlives_the_token():
+    cache = VerifiedTokenCache(max_entries=2, ttl_seconds=60)
+    user = CurrentUser(id=1, email="a@example.com")
+
+    cache.put("expired", user, exp=time.time() - 1)
+    cache.put("live", user, exp=time.time() + 3600)
+    assert cache.get("expired") is None
+    assert cache.get("live") == user
+
+    cache.put("b", user, exp=time.time() + 3600)
+    cache.put("c", user, exp=time.time() + 3600)
+    assert len(cache) == 2 and cache.get("live") is None
@@ -0,0 +1,93 @@
+# tests/test_db.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.auth import CurrentUser
+from database.db import create_async_db_engine, create_db_engine, migrate_db
+from database.models import GoldOrder
+from routers.gold_purchase import (
+    LATEST_PURCHASE_QUERY,
+    KYCRequest,
+    VaultRequest,
+    kyc_step,
+    vault_step,
+)
+
+
+def test_sqlite_engine_applies_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/t.db")
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") > 0
+    engine.dispose()
+
+
+def test_in_memory_sqlite_uses_a_single_connection():
+    engine = create_db_engine("sqlite://")
+    assert isinstance(engine.pool, StaticPool)
+
+
+def test_purchase_steps_run_on_the_async_session():
+    async def run():
+        engine = create_async_db_engine("sqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            user = CurrentUser(id=1, email="jane@example.com")
+            await kyc_step(KYCRequest(kyc_details="Jane"), session, user)
+            with pytest.raises(HTTPException) as refused:  # payment not done yet
+                await vault_step(VaultRequest(confirm=True), session, user)
+            steps = (await session.exec(select(GoldOrder.step))).all()
+        await engine.dispose()
+        return steps, refused.value.status_code
+
+    assert asyncio.run(run()) == (["KYC"], 400)
+
+
+def test_migration_adds_indexes_to_existing_tables(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE goldorder (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "step VARCHAR NOT NULL, payment_method VARCHAR, amount FLOAT, "
+            "quantity_grams FLOAT, created_at DATETIME)"
+        )
+        conn.exec_driver_sql(
+            "CREATE TABLE purchasesession (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "step VARCHAR NOT NULL, created_at DATETIME, updated_at DATETIME)"
+        )
+    migrate_db(engine)
+    migrate_db(engine)  # idempotent
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes("goldorder")}
+    assert {"ix_goldorder_user_id_id", "ix_goldorder_user_id_step"} <= names
+
+    sql = str(LATEST_PURCHASE_QUERY.compile(engine, compile_kwargs={"render_postcompile": True}))
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", (1, 1, 0)).fetchall()
+    assert "ix_purchasesession_user_id_id" in str(plan)
+    engine.dispose()
+
+
+def test_migration_adds_new_nullable_columns_to_an_existing_table(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE purchasesession (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "step VARCHAR NOT NULL, amount FLOAT)"
+        )
+    migrate_db(engine)
+    migrate_db(engine)  # idempotent
+
+    columns = {column["name"] for column in inspect(engine).get_columns("purchasesession")}
+    assert {"quote_price", "quote_expires_at", "transaction_id"} <= columns
+    engine.dispose()
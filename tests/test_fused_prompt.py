@@ -0,0 +1,66 @@
+# tests/test_fused_prompt.py
+import asyncio
+
+import pytest
+
+import core.chat_flow as chat_flow
+from core import metrics, structured_output
+from core.intent_cache import IntentCache
+from core.prompts import CHATBOT_TEMPLATE, build_chatbot_prompt, build_fused_prompt
+
+
+def test_validator_normalizes_non_purchase_intents():
+    data = structured_output.validate(
+        {"intent": "gold_related", "stage": "buy_step_2", "answer": "Gold!", "buy_link": "x"},
+        "fused",
+    )
+    assert data["stage"] == "exploration"
+    assert data["buy_link"] == ""
+    assert data["category"] == "gold"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"intent": "shopping", "answer": "hi"},
+        {"intent": "ready_to_invest", "answer": ""},
+        {"intent": "ready_to_invest", "answer": "ok", "stage": "buy_step_9"},
+    ],
+)
+def test_validator_rejects_bad_payloads(payload):
+    with pytest.raises(ValueError):
+        structured_output.validate(payload, "fused")
+
+
+def test_fused_prompt_includes_history_and_query():
+    prompt = build_fused_prompt("OK", [{"role": "user", "content": "buy gold"}])
+    assert "User: buy gold" in prompt
+    assert '"stage"' in prompt and '"intent"' in prompt
+    assert prompt.endswith('User Query: "OK"\nResponse:')
+
+
+def test_fused_mode_uses_one_llm_call(monkeypatch):
+    calls = []
+
+    async def fake_gemini(prompt, **kwargs):
+        calls.append(prompt)
+        return {"intent": "gold_related", "stage": "exploration", "answer": "Gold is great."}
+
+    metrics.reset()
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fake_gemini)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "CHAT_PROMPT_MODE", "fused")
+
+    result = asyncio.run(chat_flow.process_user_query("ab-user", "Tell me something", None))
+    assert result["answer"] == "Gold is great."
+    assert len(calls) == 1
+    assert chat_flow.prompt_ab_summary()["fused"]["llm_calls_per_turn"] == 1.0
+
+
+def test_templates_share_a_static_prefix():
+    first = build_chatbot_prompt("hi", [])
+    second = build_chatbot_prompt("OK", [{"role": "user", "content": "buy gold"}])
+    assert first.startswith(CHATBOT_TEMPLATE.prefix)
+    assert second.startswith(CHATBOT_TEMPLATE.prefix)
+    assert "Conversation History:" not in CHATBOT_TEMPLATE.prefix
@@ -0,0 +1,108 @@
+# tests/test_gemini_client.py
+import asyncio
+import time
+
+import services.gemini_client as gemini_client
+from core.prompts import INTENT_TEMPLATE, build_gemini_prompt
+from services.gemini_client import GeminiClient
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class AsyncModel:
+    def __init__(self, delay=0.1, text='{"intent": "gold_related", "answer": "ok"}'):
+        self.delay = delay
+        self.text = text
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return FakeResponse(self.text)
+
+
+class SyncModel:
+    def generate_content(self, prompt):
+        time.sleep(0.1)
+        return FakeResponse('{"answer": "sync"}')
+
+
+def test_calls_run_concurrently_up_to_limit():
+    model = AsyncModel(delay=0.1)
+    client = GeminiClient(model=model, max_concurrency=8)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(client.generate_text("q") for _ in range(16)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    assert model.peak == 8
+    assert elapsed < 0.5  # two waves of 0.1s, not sixteen
+
+
+def test_sync_model_uses_thread_pool():
+    client = GeminiClient(model=SyncModel(), thread_pool_size=10)
+
+    async def run():
+        start = time.perf_counter()
+        texts = await asyncio.gather(*(client.generate_text("q") for _ in range(10)))
+        return texts, time.perf_counter() - start
+
+    texts, elapsed = asyncio.run(run())
+    client.close()
+    assert texts == ['{"answer": "sync"}'] * 10
+    assert elapsed < 0.5
+
+
+def test_call_gemini_api_times_out(monkeypatch):
+    client = GeminiClient(model=AsyncModel(delay=1.0), timeout=0.05)
+    monkeypatch.setattr(gemini_client, "_client", client)
+
+    result = asyncio.run(gemini_client.call_gemini_api("q"))
+    assert result["category"] == "irrelevant"
+    assert result["answer"] == gemini_client.GEMINI_UNAVAILABLE_ANSWER
+
+
+def test_call_gemini_api_parses_json(monkeypatch):
+    client = GeminiClient(model=AsyncModel(delay=0))
+    monkeypatch.setattr(gemini_client, "_client", client)
+
+    result = asyncio.run(gemini_client.call_gemini_api("q"))
+    assert result == {"intent": "gold_related", "answer": "ok"}
+
+
+def test_context_cache_sends_only_the_dynamic_suffix():
+    sent = []
+
+    class RecordingModel(AsyncModel):
+        async def generate_content_async(self, contents):
+            sent.append(contents)
+            return await super().generate_content_async(contents)
+
+    cached_model = RecordingModel(delay=0)
+    client = GeminiClient(model=AsyncModel(delay=0), context_cache=True)
+    client._create_cached_model = lambda prefix: cached_model
+
+    prompt = build_gemini_prompt("Should I buy gold?")
+    asyncio.run(client.generate_text(prompt, cache_prefix=INTENT_TEMPLATE.prefix))
+    assert sent == ['User Query: "Should I buy gold?"\nResponse:']
+
+
+def test_context_cache_failure_falls_back_to_full_prompt():
+    model = AsyncModel(delay=0)
+    client = GeminiClient(model=model, context_cache=True)
+
+    def refuse(prefix):
+        raise RuntimeError("cached content too small")
+
+    client._create_cached_model = refuse
+    text = asyncio.run(client.generate_text("static dynamic", cache_prefix="static "))
+    assert text == model.text
+    assert client._context_models["static "] is None
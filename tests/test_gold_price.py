@@ -0,0 +1,80 @@
+# tests/test_gold_price.py
+import asyncio
+
+from benchmarks.fakes import Latency
+from services.gold_price import GoldPriceService
+
+
+def _service(stub, **kwargs):
+    return GoldPriceService(url=stub.url, api_key="test", **kwargs)
+
+
+def test_price_is_cached_within_ttl(gold_api_stub):
+    service = _service(gold_api_stub, ttl=60)
+
+    async def run():
+        first = await service.get_price()
+        second = await service.get_price()
+        await service.close()
+        return first, second
+
+    assert asyncio.run(run()) == (6512.4, 6512.4)
+    assert gold_api_stub.requests == 1
+
+
+def test_concurrent_misses_share_one_fetch(gold_api_stub):
+    gold_api_stub.latency = Latency("fixed", 100)
+    service = _service(gold_api_stub)
+
+    async def run():
+        prices = await asyncio.gather(*(service.get_price() for _ in range(20)))
+        await service.close()
+        return prices
+
+    assert asyncio.run(run()) == [6512.4] * 20
+    assert gold_api_stub.requests == 1
+
+
+def test_stale_price_is_served_while_revalidating(gold_api_stub):
+    service = _service(gold_api_stub, ttl=0, max_stale=60)
+
+    async def run():
+        await service.get_price()
+        gold_api_stub.price = 6600.0
+        gold_api_stub.latency = Latency("fixed", 200)
+        stale = await service.get_price()  # must not wait on the slow refresh
+        await asyncio.sleep(0.3)
+        service.ttl = 60
+        fresh = await service.get_price()
+        await service.close()
+        return stale, fresh
+
+    assert asyncio.run(run()) == (6512.4, 6600.0)
+
+
+def test_failure_returns_sentinel_and_backs_off(gold_api_stub):
+    gold_api_stub.status = 500
+    service = _service(gold_api_stub, error_backoff=60)
+
+    async def run():
+        prices = [await service.get_price() for _ in range(3)]
+        await service.close()
+        return prices
+
+    assert asyncio.run(run()) == [-1.0, -1.0, -1.0]
+    assert gold_api_stub.requests == 1
+
+
+def test_background_refresher_keeps_cache_warm(gold_api_stub):
+    service = _service(gold_api_stub, refresh_interval=0.05)
+
+    async def run():
+        await service.start()
+        await asyncio.sleep(0.2)
+        fetches = service.fetches
+        price = await service.get_price()
+        await service.close()
+        return fetches, price
+
+    fetches, price = asyncio.run(run())
+    assert fetches >= 2 and price == 6512.4
@@ -0,0 +1,48 @@
+# tests/test_history_window.py
+from core.history_window import (
+    ConversationSummaries,
+    HistoryWindow,
+    estimate_tokens,
+)
+from core.prompts import build_chatbot_prompt
+
+
+def _turns(*contents):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": c}
+        for i, c in enumerate(contents)
+    ]
+
+
+def test_long_turn_is_truncated_to_its_cap():
+    window = HistoryWindow(budget_tokens=1000, turn_max_tokens=50, max_turns=5)
+    packed = window.pack(_turns("x" * 10_000))
+    assert estimate_tokens(packed[0]["content"]) <= 50
+    assert packed[0]["content"].endswith("…")
+
+
+def test_window_respects_budget_and_keeps_newest():
+    window = HistoryWindow(budget_tokens=30, turn_max_tokens=20, max_turns=10)
+    dropped, packed = window.split(_turns("a" * 80, "b" * 80, "c" * 40, "d" * 40))
+    # c and d fit whole; b is cut down to the remaining budget; a is dropped
+    assert [t["content"][0] for t in packed] == ["b", "c", "d"]
+    assert packed[0]["content"].endswith("…")
+    assert [t["content"][0] for t in dropped] == ["a"]
+    assert sum(estimate_tokens(t["content"]) for t in packed) <= 30
+
+
+def test_prompt_size_is_bounded_whatever_the_paste():
+    small = build_chatbot_prompt("OK", _turns("hi"))
+    huge = build_chatbot_prompt("OK", _turns("y" * 200_000, "ok"))
+    assert len(huge) - len(small) < 1000 * 4
+
+
+def test_summary_is_incremental_and_capped():
+    summaries = ConversationSummaries(max_tokens=20)
+    first = summaries.update("u", _turns("I want gold. Lots of it.", "Sure."))
+    assert first == "User: I want gold. | Bot: Sure."
+    # Already-summarized turns are not added twice
+    assert summaries.update("u", _turns("I want gold. Lots of it.", "Sure.")) == first
+
+    capped = summaries.update("u", _turns("z" * 200))
+    assert estimate_tokens(capped) <= 20 + 5
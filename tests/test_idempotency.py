@@ -0,0 +1,111 @@
+# tests/test_idempotency.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.idempotency import IdempotencyStore
+from database.db import create_async_db_engine, engine
+from database.models import GoldOrder
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    db = create_async_db_engine(f"sqlite:///{tmp_path}/idempotency.db")
+
+    async def create():
+        async with db.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+    asyncio.run(create())
+    yield async_sessionmaker(db, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(db.dispose())
+
+
+def _orders(user_id):
+    with Session(engine) as session:
+        query = select(GoldOrder).where(GoldOrder.user_id == user_id).order_by(GoldOrder.id)
+        return [order.step for order in session.exec(query)]
+
+
+def test_retried_steps_replay_without_writing_or_fetching(client, user_id, price):
+    def post(path, body, key):
+        resp = client.post(f"/api/gold/{path}", json=body, headers={"Idempotency-Key": key})
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    kyc = [post("kyc", {"kyc_details": "Jane"}, "k1") for _ in range(3)]
+    qty = [post("quantity", {"grams": 1}, "q1") for _ in range(3)]
+    pay = [post("payment", {"payment_method": "UPI", "amount": 5000.0}, "p1") for _ in range(3)]
+
+    assert kyc[0] == kyc[1] == kyc[2]
+    assert qty[0] == qty[2] and price.calls == 1
+    assert len({p["transaction_id"] for p in pay}) == 1
+    assert _orders(user_id) == ["KYC", "QUANTITY", "PAYMENT"]
+
+    reused = client.post(
+        "/api/gold/kyc", json={"kyc_details": "Someone else"}, headers={"Idempotency-Key": "k1"}
+    )
+    assert reused.status_code == 422
+
+
+def test_concurrent_duplicates_share_one_execution(session_factory):
+    store = IdempotencyStore(session_factory=session_factory)
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"transaction_id": len(calls)}
+
+    async def run():
+        return await asyncio.gather(*(store.run(1, "key", "fp", execute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{"transaction_id": 1}] * 5
+
+
+def test_failures_are_not_stored(session_factory):
+    store = IdempotencyStore(session_factory=session_factory)
+    attempts = []
+
+    async def execute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise HTTPException(status_code=409, detail="quote expired")
+        return {"ok": True}
+
+    async def run():
+        with pytest.raises(HTTPException):
+            await store.run(1, "key", "fp", execute)
+        return await store.run(1, "key", "fp", execute)
+
+    assert asyncio.run(run()) == {"ok": True}
+    assert len(attempts) == 2
+
+
+def test_retries_on_another_worker_replay_or_wait(session_factory):
+    first, second = (IdempotencyStore(session_factory=session_factory) for _ in range(2))
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"transaction_id": "t-1"}
+
+    async def run():
+        running = asyncio.ensure_future(first.run(1, "key", "fp", execute))
+        await asyncio.sleep(0.02)
+        with pytest.raises(HTTPException) as busy:  # claimed by the other worker
+            await second.run(1, "key", "fp", execute)
+        response = await running
+        return busy.value, response, await second.run(1, "key", "fp", execute)
+
+    busy, response, replayed = asyncio.run(run())
+    assert busy.status_code == 409 and busy.headers["Retry-After"] == "1"
+    assert replayed == response == {"transaction_id": "t-1"}
+    assert len(calls) == 1
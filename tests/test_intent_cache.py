@@ -0,0 +1,67 @@
+# tests/test_intent_cache.py
+from core.intent_cache import IntentCache, normalize_query
+
+RESPONSE = {
+    "query": "What is gold price today?",
+    "source": "gemini",
+    "intent": "gold_related",
+    "category": "gold",
+    "answer": "Gold is at 6,512.40 INR per gram today.",
+    "meta": {"confidence": 0.9, "gold_price": 6512.4},
+}
+
+
+def test_normalized_queries_share_an_entry():
+    assert normalize_query("  What is GOLD price today?? ") == "what is gold price today"
+
+    cache = IntentCache(db_path=None)
+    assert cache.get("what is gold price today") is None
+    cache.put("What is gold price today?", RESPONSE)
+    hit = cache.get("what is gold price   today", live_price=6512.4)
+    assert hit["intent"] == "gold_related"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_cached_price_is_refreshed_or_not_served():
+    cache = IntentCache(db_path=None)
+    cache.put(RESPONSE["query"], RESPONSE)
+
+    fresh = cache.get(RESPONSE["query"], live_price=6600.0)
+    assert fresh["meta"]["gold_price"] == 6600.0
+    assert "6,600.00" in fresh["answer"] and "6,512.40" not in fresh["answer"]
+
+    # No live price: the cached answer would quote 6,512.40 as today's price
+    assert cache.get(RESPONSE["query"], live_price=-1.0) is None
+    assert cache.get(RESPONSE["query"]) is None
+
+    unquoted = {**RESPONSE, "answer": "Gold prices move daily.", "meta": {"gold_price": 6512.4}}
+    cache.put("gold price trend", unquoted)
+    served = cache.get("gold price trend")
+    assert served["answer"] == "Gold prices move daily." and "gold_price" not in served["meta"]
+
+
+def test_lru_and_ttl_eviction():
+    cache = IntentCache(max_entries=2, db_path=None)
+    for q in ("a", "b", "c"):
+        cache.put(q, {"intent": "irrelevant", "answer": q})
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+    expired = IntentCache(ttl_seconds=0, db_path=None)
+    expired.put("a", {"intent": "irrelevant"})
+    assert expired.get("a") is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_error_fallbacks_are_not_cached():
+    cache = IntentCache(db_path=None)
+    cache.put("q", {"category": "irrelevant", "answer": "Error contacting Gemini SDK"})
+    assert cache.get("q") is None
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    db_path = str(tmp_path / "intent_cache.db")
+    IntentCache(db_path=db_path).put("should I buy gold", RESPONSE)
+
+    restarted = IntentCache(db_path=db_path)
+    assert restarted.get("Should I buy gold?", live_price=6512.4)["intent"] == "gold_related"
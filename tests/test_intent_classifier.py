@@ -0,0 +1,72 @@
+# tests/test_intent_classifier.py
+import asyncio
+
+import core.chat_flow as chat_flow
+from core.intent_cache import IntentCache
+from core.intent_classifier import (
+    PreClassifier,
+    RuleClassifier,
+    build_local_response,
+    default_pre_classifier,
+    train_tfidf_model,
+    TfidfClassifier,
+)
+
+
+def test_rules_cover_obvious_queries():
+    rules = RuleClassifier()
+    assert rules.classify("I want to buy 2 grams of gold today").intent == "ready_to_invest"
+    assert rules.classify("What is gold price today?").intent == "gold_related"
+    assert rules.classify("I want to invest in crypto").intent == "other_investments"
+    assert rules.classify("Golden retriever dog price?") is None
+
+
+def test_purchase_and_brush_off_intents_need_more_than_tfidf():
+    classifier = default_pre_classifier()
+    assert RuleClassifier().classify("buy 2 grams of silver") is None
+    for query in ("I want to sell my gold", "I want to buy a house", "hello can you help me"):
+        prediction = classifier.classify(query)
+        assert prediction is None or prediction.intent not in ("ready_to_invest", "irrelevant")
+    assert classifier.classify("buy 2 grams of gold").intent == "ready_to_invest"
+
+
+def test_low_confidence_falls_back():
+    classifier = PreClassifier([RuleClassifier()], threshold=0.99)
+    assert classifier.classify("What is gold price today?") is None
+    assert classifier.predict("What is gold price today?").intent == "gold_related"
+
+
+def test_tfidf_model_learns_from_samples():
+    samples = [
+        ("tell me a joke", "irrelevant"),
+        ("what is the weather", "irrelevant"),
+        ("how do i save money", "general_finance"),
+        ("how to make a budget", "general_finance"),
+    ] * 3
+    model = TfidfClassifier(train_tfidf_model(samples, epochs=30), excluded=())
+    assert model.classify("another joke please").intent == "irrelevant"
+    assert model.classify("save money on a budget").intent == "general_finance"
+
+
+def test_local_response_matches_intent_format():
+    prediction = RuleClassifier().classify("gold rate today")
+    response = build_local_response("gold rate today", prediction, live_price=6500.0)
+    assert response["intent"] == "gold_related"
+    assert response["category"] == "gold"
+    assert response["meta"]["gold_price"] == 6500.0
+    assert "6500.0" in response["answer"]
+
+
+def test_fast_path_skips_gemini(monkeypatch):
+    async def fail(prompt, **kwargs):
+        raise AssertionError("Gemini should not be called")
+
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fail)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", default_pre_classifier())
+
+    result = asyncio.run(
+        chat_flow.process_user_query("fastpath", "Should I buy bitcoin?", None)
+    )
+    assert result["intent"] == "other_investments"
+    assert result["source"] == "local:rules"
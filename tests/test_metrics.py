@@ -0,0 +1,55 @@
+# tests/test_metrics.py
+import pytest
+
+import core.chat_flow as chat_flow
+from core import metrics
+from core.intent_cache import IntentCache
+
+
+def test_histograms_report_quantiles_and_spans_record_failures():
+    metrics.reset()
+    for ms in range(1, 101):
+        metrics.observe("latency_seconds", ms / 1000, route="/x")
+    stats = metrics.get_histogram("latency_seconds", route="/x")
+    assert stats["count"] == 100 and stats["sum"] == pytest.approx(5.05)
+    assert (stats["p50"], stats["p95"], stats["p99"]) == (0.051, 0.096, 0.1)
+
+    with pytest.raises(ValueError):
+        with metrics.span("span_duration_seconds", span="boom"):
+            raise ValueError
+    assert metrics.get_histogram("span_duration_seconds", span="boom")["count"] == 1
+    assert metrics.get_histogram("latency_seconds", route="/y") == {}
+
+
+def test_prometheus_text_format():
+    metrics.reset()
+    metrics.incr("things_total", 2, kind='say "hi"')
+    metrics.observe("latency_seconds", 0.5, route="/x")
+    text = metrics.render_prometheus()
+    assert "# TYPE things_total counter\n" in text
+    assert 'things_total{kind="say \\"hi\\""} 2\n' in text
+    assert "# TYPE latency_seconds summary\n" in text
+    assert 'latency_seconds{route="/x",quantile="0.99"} 0.5\n' in text
+    assert 'latency_seconds_count{route="/x"} 1\n' in text
+
+
+def test_chat_turn_is_timed_and_exposed_on_metrics_endpoint(monkeypatch, client, price):
+    async def fake_gemini(prompt, **kwargs):
+        return {"intent": "irrelevant", "answer": "llm answer"}
+
+    metrics.reset()
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fake_gemini)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    price.price = None  # no live price to quote
+
+    assert client.post("/chat", params={"query": "tell me a joke"}).status_code == 200
+    assert metrics.get_histogram("chat_llm_calls_per_turn")["p50"] >= 1
+    for span in ("history", "prompt_build", "turn"):
+        assert metrics.get_histogram("span_duration_seconds", span=span)["count"] >= 1
+
+    resp = client.get("/metrics")
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="POST",route="/chat",status="200"} 1' in resp.text
+    assert 'http_request_duration_seconds_count{method="POST",route="/chat"} 1' in resp.text
+    assert 'cache_lookups_total{cache="intent",outcome="miss"} 1' in resp.text
@@ -0,0 +1,45 @@
+# tests/test_password_hasher.py
+import asyncio
+
+import pytest
+
+from core.password_hasher import HasherSaturated, PasswordHasher
+from core.security import bcrypt_cost, hash_password
+
+
+def test_process_pool_hashes_and_verifies():
+    hasher = PasswordHasher(workers=2, rounds=4)
+
+    async def run():
+        hashed = await hasher.hash("s3cret")
+        return hashed, await hasher.verify("s3cret", hashed), await hasher.verify("nope", hashed)
+
+    try:
+        hashed, good, bad = asyncio.run(run())
+    finally:
+        hasher.close()
+    assert bcrypt_cost(hashed) == 4
+    assert good == (True, None)
+    assert bad == (False, None)
+    assert hasher.stats()["pending"] == 0
+
+
+def test_saturated_queue_rejects_fast():
+    hasher = PasswordHasher(workers=0, max_queue=0, rounds=10)
+
+    async def run():
+        slow = asyncio.ensure_future(hasher.hash("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(HasherSaturated):
+            await hasher.hash("b")
+        await slow
+
+    asyncio.run(run())
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_login_rehashes_when_cost_changes():
+    old_hash = hash_password("s3cret", rounds=4)
+    hasher = PasswordHasher(workers=0, rounds=5)
+    valid, new_hash = asyncio.run(hasher.verify("s3cret", old_hash))
+    assert valid and bcrypt_cost(new_hash) == 5
@@ -0,0 +1,37 @@
+# tests/test_price_snapshot.py
+import asyncio
+
+from database.db import async_session_maker
+from database.models import PurchaseSession
+from routers.gold_purchase import quote_expired
+from services.gold_price import PriceSnapshot
+
+
+def test_snapshot_resolves_price_once(price):
+    price.price = 6500.0
+    snapshot = PriceSnapshot(price)
+
+    async def run():
+        return await asyncio.gather(*(snapshot.get() for _ in range(5)))
+
+    assert asyncio.run(run()) == [6500.0] * 5
+    assert price.calls == 1
+
+
+def test_quantity_step_locks_the_quoted_price_on_the_purchase(client, price):
+    resp = client.post("/api/gold/quantity", json={"grams": 2})
+    assert resp.status_code == 200
+    assert resp.json()["price_per_gram"] == 5000.0
+    assert price.calls == 1
+
+    async def load():
+        async with async_session_maker() as session:
+            return await session.get(PurchaseSession, resp.json()["session_id"])
+
+    # Stored on the row, so any worker (or a restarted one) honours it
+    purchase = asyncio.run(load())
+    assert (purchase.quote_price, purchase.quantity_grams, purchase.amount) == (5000.0, 2.0, 10000.0)
+    assert not quote_expired(purchase)
+
+    pay = client.post("/api/gold/payment", json={"payment_method": "UPI", "amount": 10000.0})
+    assert pay.status_code == 200, pay.text
@@ -0,0 +1,117 @@
+# tests/test_purchase_fsm.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+
+import core.chat_flow as chat_flow
+from core import metrics, purchase_fsm
+from core.intent_cache import IntentCache
+from database.db import async_session_maker
+from routers import gold_purchase
+from routers.gold_purchase import get_open_purchase
+from services.gold_price import PriceSnapshot
+
+
+def test_confirmations_are_recognised():
+    for query in ("ok", "Yes!", "done", "OK, done with payment", "yes please go ahead", "vault confirmed"):
+        assert purchase_fsm.is_confirmation(query), query
+    for query in ("no", "wait", "ok but what is the gold price?", "", "thanks"):
+        assert not purchase_fsm.is_confirmation(query), query
+
+
+def test_confirmations_walk_the_journey_without_gemini(monkeypatch, user_id, price):
+    llm_calls = []
+
+    async def fake_gemini(prompt, **kwargs):
+        llm_calls.append(prompt)
+        return {"intent": "irrelevant", "answer": "llm answer"}
+
+    metrics.reset()
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fake_gemini)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+
+    async def run():
+        async with async_session_maker() as session:
+            await purchase_fsm.offer(session, user_id)  # the chat offered to start
+            snapshot = PriceSnapshot(price)
+            turns = [
+                await chat_flow.process_user_query(str(user_id), query, session, snapshot)
+                for query in ("ok", "yes", "done", "ok", "done")
+            ]
+            after = await chat_flow.process_user_query(str(user_id), "ok", session, snapshot)
+            return turns, after
+
+    turns, after = asyncio.run(run())
+    assert [t["stage"] for t in turns] == [
+        "buy_step_1", "buy_step_2", "buy_step_3", "buy_step_4", "buy_step_5"
+    ]
+    assert all(t["source"] == "fsm" for t in turns)
+    assert "Purchase complete" in turns[-1]["answer"]
+    assert metrics.get_counter("chat_fsm_total", outcome="advanced") == 5
+    # Journey over: a bare "ok" is a free-form turn again
+    assert after["answer"] == "llm answer" and len(llm_calls) == 1
+
+
+def test_model_stage_is_corrected_to_the_next_step(user_id):
+    metrics.reset()
+
+    async def run():
+        async with async_session_maker() as session:
+            fresh = await purchase_fsm.resolve_stage(session, user_id, "buy_step_3", "fused")
+            await purchase_fsm.offer(session, user_id)
+            offered = await purchase_fsm.resolve_stage(session, user_id, "buy_step_4", "fused")
+            other = await purchase_fsm.resolve_stage(session, user_id, "exploration", "fused")
+            return fresh, offered, other
+
+    assert asyncio.run(run()) == ("buy_step_1", "buy_step_1", "exploration")
+    summary = chat_flow.prompt_ab_summary()
+    assert (summary["fused"]["stages_corrected"], summary["two_call"]["stages_corrected"]) == (2, 0)
+
+
+def test_expired_quote_is_requoted_instead_of_failing_payment(monkeypatch, user_id, price):
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+
+    async def run():
+        async with async_session_maker() as session:
+            await purchase_fsm.offer(session, user_id)
+            snapshot = PriceSnapshot(price)
+            for query in ("ok", "ok"):  # KYC, quantity
+                await chat_flow.process_user_query(str(user_id), query, session, snapshot)
+            purchase = await get_open_purchase(session, user_id)
+            purchase.quote_expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            session.add(purchase)
+            await session.commit()
+            requoted = await chat_flow.process_user_query(str(user_id), "ok", session, snapshot)
+            paid = await chat_flow.process_user_query(str(user_id), "ok", session, snapshot)
+
+            purchase.updated_at = datetime.now(timezone.utc) - timedelta(
+                seconds=gold_purchase.PURCHASE_SESSION_TTL_SECONDS + 1
+            )
+            session.add(purchase)
+            await session.commit()
+            abandoned = await purchase_fsm.next_stage(session, user_id)
+            return requoted, paid, abandoned
+
+    requoted, paid, abandoned = asyncio.run(run())
+    assert requoted["stage"] == "buy_step_2" and "Quantity set" in requoted["answer"]
+    assert paid["stage"] == "buy_step_3" and "Payment confirmed" in paid["answer"]
+    assert abandoned is None
+
+
+def test_refused_step_is_answered_not_raised(monkeypatch, user_id, price):
+    async def refuse(*args):
+        raise HTTPException(status_code=409, detail="Price quote expired")
+
+    monkeypatch.setattr(chat_flow, "_apply_purchase_stage", refuse)
+
+    async def run():
+        async with async_session_maker() as session:
+            return await chat_flow._finish_turn(
+                {"stage": "buy_step_1", "answer": "Let us start."}, "ready_to_invest",
+                str(user_id), str(user_id), session, PriceSnapshot(price), "two_call",
+            )
+
+    result = asyncio.run(run())
+    assert result["answer"] == "Let us start. ⚠️ Price quote expired"
+    assert result["buy_link"] == ""
@@ -0,0 +1,58 @@
+# tests/test_purchase_session.py
+
+
+def qty_amount(grams):
+    return round(grams * 5000.0, 2)
+
+
+def _buy(client, grams, kyc):
+    kyc_resp = client.post("/api/gold/kyc", json={"kyc_details": kyc}).json()
+    session_id = kyc_resp["session_id"]
+    qty = client.post("/api/gold/quantity", json={"grams": grams}).json()
+    assert qty["session_id"] == session_id
+    pay = client.post(
+        "/api/gold/payment", json={"payment_method": "UPI", "amount": qty_amount(grams)}
+    )
+    assert pay.status_code == 200, pay.text
+    # Each step needs the previous one done
+    assert client.post("/api/gold/receipt", json={"session_id": session_id}).status_code == 400
+    assert client.post("/api/gold/vault", json={"confirm": True}).status_code == 200
+    receipt = client.post("/api/gold/receipt", json={"session_id": session_id})
+    assert receipt.status_code == 200, receipt.text
+    return pay.json(), receipt.json()["receipt"]
+
+
+def test_receipt_is_built_from_the_purchase_session(client):
+    pay, receipt = _buy(client, 2, "Jane, jane@example.com")
+    assert receipt["kyc_details"] == "Jane, jane@example.com"
+    assert receipt["quantity_grams"] == 2
+    assert receipt["amount"] == 10000.0
+    assert receipt["transaction_id"] == pay["transaction_id"]
+    assert receipt["wallet_id"]
+
+    # A second purchase does not pick up the first one's fields
+    _, second = _buy(client, 1, "Jane again")
+    assert second["session_id"] != receipt["session_id"]
+    assert (second["kyc_details"], second["amount"]) == ("Jane again", 5000.0)
+
+    # Closed: nothing left to pay for or receipt
+    resp = client.post("/api/gold/payment", json={"payment_method": "UPI", "amount": 1})
+    assert resp.status_code == 400
+    assert client.post("/api/gold/receipt", json={}).status_code == 400
+
+
+def test_quantity_after_payment_leaves_the_paid_purchase_alone(client):
+    session_id = client.post("/api/gold/kyc", json={"kyc_details": "Jane"}).json()["session_id"]
+    client.post("/api/gold/quantity", json={"grams": 2})
+    pay = client.post("/api/gold/payment", json={"payment_method": "UPI", "amount": 10000.0})
+    assert pay.status_code == 200, pay.text
+
+    requote = client.post("/api/gold/quantity", json={"grams": 0.1, "session_id": session_id})
+    assert requote.status_code == 409
+    again = client.post("/api/gold/payment", json={"payment_method": "UPI", "amount": 500.0})
+    assert again.status_code == 400
+
+    client.post("/api/gold/vault", json={"confirm": True})
+    receipt = client.post("/api/gold/receipt", json={"session_id": session_id}).json()["receipt"]
+    assert (receipt["quantity_grams"], receipt["amount"]) == (2, 10000.0)
+    assert receipt["transaction_id"] == pay.json()["transaction_id"]
@@ -0,0 +1,145 @@
+# tests/test_rate_limit.py
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.rate_limit import (
+    InMemoryBuckets,
+    Limit,
+    RateLimitMiddleware,
+    SQLiteBuckets,
+    gemini_overloaded_handler,
+    parse_limit,
+)
+from core.security import create_access_token
+from services.gemini_client import GeminiClient, GeminiOverloaded
+
+
+class SlowModel:
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.delay)
+        return type("Response", (), {"text": "{}"})()
+
+
+def test_parse_limit():
+    assert parse_limit("30/60:10") == Limit(rate=0.5, burst=10)
+    assert parse_limit("5/1") == Limit(rate=5, burst=5)
+    assert parse_limit("") is None and parse_limit("0/60") is None
+
+
+def test_token_bucket_refills_at_rate():
+    buckets = InMemoryBuckets()
+    limit = Limit(rate=1, burst=2)
+    assert buckets.take("u", limit, now=100.0) == 0
+    assert buckets.take("u", limit, now=100.0) == 0
+    assert buckets.take("u", limit, now=100.0) == pytest.approx(1.0)
+    assert buckets.take("u", limit, now=100.5) == pytest.approx(0.5)
+    assert buckets.take("u", limit, now=101.0) == 0
+    assert buckets.take("other", limit, now=101.0) == 0
+
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    first, second = SQLiteBuckets(path), SQLiteBuckets(path)
+    limit = Limit(rate=0.01, burst=2)
+    assert first.take("chat:user:1", limit) == 0
+    assert second.take("chat:user:1", limit) == 0
+    assert first.take("chat:user:1", limit) > 0
+
+
+def _limited_app(buckets=None):
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat():
+        return {"ok": True}
+
+    @app.post("/auth/login")
+    async def login():
+        return {"ok": True}
+
+    rules = {
+        "/chat": ("chat", Limit(rate=0.01, burst=2)),
+        "/auth/login": ("login", Limit(rate=0.01, burst=1)),
+    }
+    buckets = buckets if buckets is not None else InMemoryBuckets()
+    app.add_middleware(RateLimitMiddleware, rules=rules, buckets=buckets, enabled=True)
+    return TestClient(app)
+
+
+def test_middleware_limits_each_user_and_sets_retry_after():
+    client = _limited_app()
+    alice = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
+    bob = {"Authorization": f"Bearer {create_access_token({'sub': '2'})}"}
+
+    assert [client.post("/chat", headers=alice).status_code for _ in range(2)] == [200, 200]
+    limited = client.post("/chat", headers=alice)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert client.post("/chat", headers=bob).status_code == 200
+
+    # Login is keyed by client address, whatever token is sent
+    assert client.post("/auth/login", headers=alice).status_code == 200
+    assert client.post("/auth/login", headers=bob).status_code == 429
+
+
+def test_sqlite_buckets_are_taken_off_the_event_loop(tmp_path):
+    on_loop = []
+
+    class RecordingBuckets(SQLiteBuckets):
+        def take(self, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return super().take(*args, **kwargs)
+
+    client = _limited_app(RecordingBuckets(str(tmp_path / "buckets.db")))
+    assert client.post("/auth/login").status_code == 200
+    assert client.post("/auth/login").status_code == 429
+    assert on_loop == [False, False]
+
+
+def test_llm_admission_sheds_instead_of_queueing():
+    client = GeminiClient(
+        model=SlowModel(0.2), max_concurrency=1, max_waiting=1, queue_timeout=5
+    )
+
+    async def run():
+        return await asyncio.gather(
+            *(client.generate_text("q") for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, GeminiOverloaded) for r in results) == 1
+    assert client.stats()["shed"] == 1 and client.stats()["in_flight"] == 0
+
+
+def test_llm_queue_timeout_sheds_slow_waiters():
+    client = GeminiClient(model=SlowModel(0.3), max_concurrency=1, queue_timeout=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            client.generate_text("q"), client.generate_text("q"), return_exceptions=True
+        )
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, str) and isinstance(second, GeminiOverloaded)
+
+
+def test_overloaded_llm_maps_to_429():
+    app = FastAPI()
+    app.add_exception_handler(GeminiOverloaded, gemini_overloaded_handler)
+
+    @app.post("/chat")
+    async def chat():
+        raise GeminiOverloaded("busy", retry_after=3)
+
+    resp = TestClient(app).post("/chat")
+    assert resp.status_code == 429 and resp.headers["Retry-After"] == "3"
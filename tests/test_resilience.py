@@ -0,0 +1,109 @@
+# tests/test_resilience.py
+import asyncio
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import services.gemini_client as gemini_client
+from services.gemini_client import GeminiClient, is_retryable
+from services.resilience import CircuitBreaker, CircuitOpen, Resilience
+
+
+def _resilience(**kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("backoff_max", 0.001)
+    return Resilience(is_retryable, **kwargs)
+
+
+def _flaky(failures, exc=google_exceptions.ServiceUnavailable("503")):
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        if len(calls) <= failures:
+            raise exc
+        return "ok"
+
+    return attempt, calls
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    attempt, calls = _flaky(2)
+    assert asyncio.run(_resilience(retries=2).run(attempt)) == "ok"
+    assert len(calls) == 3
+
+
+def test_other_errors_and_exhausted_retries_propagate():
+    attempt, calls = _flaky(1, ValueError("blocked"))
+    with pytest.raises(ValueError):
+        asyncio.run(_resilience().run(attempt))
+    assert len(calls) == 1
+
+    attempt, calls = _flaky(5)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        asyncio.run(_resilience(retries=1).run(attempt))
+    assert len(calls) == 2
+
+
+def test_breaker_fails_fast_then_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    resilience = _resilience(retries=0, breaker=breaker)
+    attempt, calls = _flaky(2)
+
+    for _ in range(2):
+        with pytest.raises(google_exceptions.ServiceUnavailable):
+            asyncio.run(resilience.run(attempt))
+    with pytest.raises(CircuitOpen):
+        asyncio.run(resilience.run(attempt))
+    assert len(calls) == 2 and breaker.state == "open"
+
+    time.sleep(0.06)
+    assert asyncio.run(resilience.run(attempt)) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_slow_attempt_is_hedged_at_p95():
+    resilience = _resilience(hedge=True, hedge_min_delay=0.01)
+    for _ in range(20):
+        resilience.latency.record(0.02)
+    calls = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    start = time.perf_counter()
+    assert asyncio.run(resilience.run(attempt)) == 2
+    assert time.perf_counter() - start < 0.3
+
+
+_ANSWER = '{"intent": "ready_to_invest", "stage": "buy_step_3", "answer": "a"}'
+
+
+class FailingModel:
+    def __init__(self):
+        self.fail = False
+
+    async def generate_content_async(self, prompt):
+        if self.fail:
+            raise google_exceptions.ServiceUnavailable("503")
+        return type("Response", (), {"text": _ANSWER})()
+
+
+def test_open_breaker_serves_last_good_answer_or_canned(monkeypatch):
+    model = FailingModel()
+    resilience = _resilience(retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    monkeypatch.setattr(gemini_client, "_client", GeminiClient(model=model, resilience=resilience))
+    monkeypatch.setattr(gemini_client, "last_good_answers", gemini_client._LastGoodAnswers())
+
+    assert asyncio.run(gemini_client.call_gemini_api("seen"))["stage"] == "buy_step_3"
+    model.fail = True
+    asyncio.run(gemini_client.call_gemini_api("seen"))  # opens the breaker
+
+    replayed = asyncio.run(gemini_client.call_gemini_api("seen"))
+    assert replayed["answer"] == "a" and "stage" not in replayed
+    assert replayed["meta"]["degraded"] is True
+    canned = asyncio.run(gemini_client.call_gemini_api("new"))
+    assert canned["answer"] == gemini_client.GEMINI_UNAVAILABLE_ANSWER
@@ -0,0 +1,44 @@
+# tests/test_speculative.py
+import asyncio
+import time
+
+import core.chat_flow as chat_flow
+from core import metrics
+from core.chat_manager import add_to_history, clear_history
+from core.intent_cache import IntentCache
+
+
+def _setup(monkeypatch, intent):
+    async def fake_gemini(prompt, **kwargs):
+        await asyncio.sleep(0.1)
+        if "Classify the user query" in prompt:
+            return {"intent": intent, "answer": "intent answer"}
+        return {"stage": "exploration", "answer": "chatbot answer"}
+
+    metrics.reset()
+    monkeypatch.setattr(chat_flow, "call_gemini_api", fake_gemini)
+    monkeypatch.setattr(chat_flow, "intent_cache", IntentCache(db_path=None))
+    monkeypatch.setattr(chat_flow, "pre_classifier", None)
+    monkeypatch.setattr(chat_flow, "SPECULATIVE_MODE", "in_journey")
+    clear_history("journey")
+    add_to_history("journey", "assistant", "Step 1 done", stage="buy_step_1")
+
+
+def test_in_journey_turn_takes_one_round_trip(monkeypatch):
+    _setup(monkeypatch, "ready_to_invest")
+    start = time.perf_counter()
+    result = asyncio.run(chat_flow.process_user_query("journey", "hmm, what next", None))
+    assert time.perf_counter() - start < 0.18
+    assert result["answer"] == "chatbot answer"
+    assert metrics.get_counter("chat_speculative_total", outcome="used") == 1
+
+
+def test_wrong_guess_is_cancelled_and_counted(monkeypatch):
+    _setup(monkeypatch, "irrelevant")
+    result = asyncio.run(chat_flow.process_user_query("journey", "tell me a joke", None))
+    assert result["answer"] == "intent answer"
+    assert chat_flow.prompt_ab_summary()["speculative"]["wasted"] == 1
+
+
+def test_no_speculation_outside_journey():
+    assert not chat_flow.should_speculate([{"role": "user", "content": "hi"}])
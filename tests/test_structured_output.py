@@ -0,0 +1,76 @@
+# tests/test_structured_output.py
+import asyncio
+
+import pytest
+
+import services.gemini_client as gemini_client
+from core import metrics, structured_output
+from services.gemini_client import GeminiClient
+
+
+def test_json_is_found_in_fences_and_prose():
+    plain = '{"intent": "gold_related", "answer": "a"}'
+    assert structured_output.extract_json(plain) == (
+        {"intent": "gold_related", "answer": "a"}, "direct"
+    )
+    assert structured_output.extract_json(f"```json\n{plain}\n```")[1] == "fenced"
+    data, how = structured_output.extract_json(f"Sure! Here it is: {plain} Hope it helps {{")
+    assert how == "scanned" and data["answer"] == "a"
+    with pytest.raises(ValueError):
+        structured_output.extract_json("no json at all")
+
+
+def test_responses_are_validated_and_normalised():
+    metrics.reset()
+    intent = structured_output.parse('{"category": "Gold", "answer": "a"}', "intent")
+    assert intent["intent"] == "gold_related" and intent["category"] == "gold"
+
+    chatbot = structured_output.parse(
+        '{"stage": "", "answer": "a", "buy_link": null, "extra": 1}', "chatbot"
+    )
+    assert chatbot["stage"] == "exploration" and chatbot["buy_link"] == ""
+    assert chatbot["extra"] == 1
+
+    # Fails its model: returned as extracted, counted as invalid
+    assert structured_output.parse('{"stage": "buy_step_9", "answer": "a"}', "chatbot")[
+        "stage"
+    ] == "buy_step_9"
+    with pytest.raises(ValueError):
+        structured_output.parse("[1, 2]", "fused")
+
+    stats = structured_output.parse_stats()
+    assert stats["intent"]["direct"] == 1
+    assert stats["chatbot"]["invalid"] == 1 and stats["chatbot"]["failure_rate"] == 0.5
+    assert stats["fused"]["failed"] == 1
+
+
+class JsonModel:
+    def __init__(self, text):
+        self.text = text
+        self.options = []
+
+    async def generate_content_async(self, prompt, **options):
+        self.options.append(options)
+        return type("Response", (), {"text": self.text})()
+
+
+def test_schema_requests_json_and_fenced_answers_parse(monkeypatch):
+    model = JsonModel('```json\n{"intent": "Irrelevant", "answer": "a"}\n```')
+    monkeypatch.setattr(gemini_client, "_client", GeminiClient(model=model))
+
+    parsed = asyncio.run(gemini_client.call_gemini_api("q", schema="intent"))
+    assert parsed["intent"] == "irrelevant" and parsed["answer"] == "a"
+    config = model.options[0]["generation_config"]
+    assert config.response_mime_type == "application/json"
+
+    asyncio.run(gemini_client.call_gemini_api("q"))
+    assert model.options[1] == {}
+
+
+def test_streams_get_json_without_an_unordered_schema():
+    client = GeminiClient(model=JsonModel("{}"))
+    config = client._generation_config("intent")["generation_config"]
+    streamed = client._generation_config("intent", stream=True)["generation_config"]
+    assert config.response_schema is not None
+    assert streamed.response_mime_type == "application/json"
+    assert streamed.response_schema is None